@@ -0,0 +1,83 @@
+"""
+Resume os spans gravados pelos serviços (TRACE_SPANS_FILE) e mostra qual hop
+domina a cauda de latência de cada rota de entrada.
+
+    python analisar_spans.py traces/*.jsonl
+    python analisar_spans.py traces/*.jsonl --rota "POST /rent" --percentil 99
+"""
+import argparse
+import json
+import re
+from collections import defaultdict
+
+IDS_NA_URL = re.compile(r'/\d+(?=/|$)')
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def carregar(caminhos):
+    traces = defaultdict(list)
+    for caminho in caminhos:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            for linha in f:
+                if linha.strip():
+                    span = json.loads(linha)
+                    traces[span['trace_id']].append(span)
+    return traces
+
+
+def hops(spans, raiz):
+    # Hops da requisição de entrada: chamadas feitas pelo serviço raiz, com ids normalizados
+    # (GET records-service/records/3 -> GET records-service/records/<id>), mais o tempo local
+    por_hop = defaultdict(float)
+    for span in spans:
+        if span['tipo'] == 'cliente' and span['span_pai'] == raiz['span_id']:
+            por_hop[IDS_NA_URL.sub('/<id>', span['nome'])] += span['duracao_ms']
+    por_hop[f"local ({raiz['servico']})"] = raiz['duracao_ms'] - raiz.get('downstream_ms', 0)
+    return por_hop
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência por hop a partir dos spans em JSON lines")
+    parser.add_argument('arquivos', nargs='+')
+    parser.add_argument('--rota', help="Só a rota de entrada indicada (ex.: 'POST /rent')")
+    parser.add_argument('--percentil', type=float, default=99, help="Corte da cauda (padrão: p99)")
+    args = parser.parse_args()
+
+    por_rota = defaultdict(list)
+    for trace_id, spans in carregar(args.arquivos).items():
+        raizes = [s for s in spans if s['tipo'] == 'servidor' and s['span_pai'] is None]
+        for raiz in raizes:
+            if not args.rota or raiz['nome'] == args.rota:
+                por_rota[raiz['nome']].append((raiz, hops(spans, raiz)))
+
+    for rota, amostras in sorted(por_rota.items(), key=lambda item: -len(item[1])):
+        totais = [raiz['duracao_ms'] for raiz, _ in amostras]
+        corte = percentil(totais, args.percentil)
+        cauda = [hop for raiz, hop in amostras if raiz['duracao_ms'] >= corte]
+
+        print(f"\n{'='*78}")
+        print(f"{rota} - {len(amostras)} traces | p50 {percentil(totais, 50):.1f} ms | "
+              f"p{args.percentil:g} {corte:.1f} ms | cauda: {len(cauda)} traces")
+        print(f"{'='*78}")
+        print(f"{'hop':<48} {'p50 (ms)':>9} {'p99 (ms)':>9} {'% da cauda':>10}")
+
+        nomes = sorted({nome for _, hop in amostras for nome in hop})
+        tempo_cauda = sum(sum(hop.values()) for hop in cauda) or 1
+        linhas = []
+        for nome in nomes:
+            valores = [hop.get(nome, 0.0) for _, hop in amostras]
+            na_cauda = sum(hop.get(nome, 0.0) for hop in cauda)
+            linhas.append((na_cauda / tempo_cauda * 100, nome, percentil(valores, 50), percentil(valores, 99)))
+        for participacao, nome, p50, p99 in sorted(linhas, reverse=True):
+            print(f"{nome[:48]:<48} {p50:>9.1f} {p99:>9.1f} {participacao:>9.1f}%")
+
+
+if __name__ == '__main__':
+    main()
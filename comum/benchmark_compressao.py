@@ -0,0 +1,104 @@
+"""
+Benchmark de banda x CPU das codificações de `compressao.py` em catálogos grandes.
+
+Replica o catálogo do records-service até N discos (ids e títulos únicos),
+serializa como o jsonify faz e, para cada codificação e nível, mede o tamanho,
+o tempo de compressão e de descompressão e o tempo total para entregar a
+resposta em um link com a banda indicada (comprimir + transmitir + descomprimir).
+
+    python benchmark_compressao.py --discos 50000 --banda 100 1000
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import statistics
+import time
+
+import compressao
+
+CATALOGO = os.path.join(os.path.dirname(__file__), '..', 'desafio5', 'records-service', 'records_data.json')
+
+NIVEIS = {
+    'gzip': (1, 6, 9),
+    # br 11 e zstd 19 levam dezenas de segundos em catálogos grandes: não servem para compressão por requisição
+    'br': (1, 4, 6, 9),
+    'zstd': (1, 3, 6, 12),
+}
+
+
+def descompressor(codificacao):
+    if codificacao == 'gzip':
+        return gzip.decompress
+    if codificacao == 'br':
+        return compressao.brotli.decompress
+    return compressao.zstandard.ZstdDecompressor().decompress
+
+
+def gerar_registros(caminho, discos):
+    with open(caminho, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    # Campos variados com semente fixa, para o JSON não ser só o mesmo bloco repetido
+    sorteio = random.Random(42)
+    registros = []
+    for i in range(discos):
+        registro = dict(base[i % len(base)])
+        registro['id'] = i + 1
+        registro['title'] = f"{registro['title']} ({sorteio.getrandbits(32):08x})"
+        registro['year'] = sorteio.randint(1960, 2024)
+        registro['daily_rental_price'] = round(sorteio.uniform(5, 40), 2)
+        registro['total_copies'] = sorteio.randint(1, 9)
+        registro['available_copies'] = sorteio.randint(0, registro['total_copies'])
+        registro['tracks'] = sorteio.sample(registro['tracks'], len(registro['tracks']))
+        registros.append(registro)
+    return registros
+
+
+def gerar_catalogo(caminho, discos):
+    # Mesmo formato compacto e ordenado do provider JSON do Flask
+    registros = gerar_registros(caminho, discos)
+    return json.dumps({'total': discos, 'records': registros}, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+def cronometrar(funcao, corpo, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao(corpo)
+        tempos.append(time.perf_counter() - inicio)
+    return resultado, statistics.median(tempos) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tamanho e custo de CPU de gzip/br/zstd em catálogos grandes")
+    parser.add_argument('--discos', type=int, default=50000)
+    parser.add_argument('--catalogo', default=CATALOGO)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--banda', type=float, nargs='+', default=[100, 1000], help="Banda do link em Mbit/s")
+    args = parser.parse_args()
+
+    corpo = gerar_catalogo(args.catalogo, args.discos)
+    print(f"\n{args.discos:,} discos, JSON de {len(corpo) / 1024:,.0f} KiB "
+          f"(codificações disponíveis: {', '.join(compressao.COMPRESSORES)})\n")
+
+    colunas_banda = ''.join(f"{f'{banda:g} Mbit/s (ms)':>18}" for banda in args.banda)
+    print(f"{'codificação':>12} {'nível':>6} {'KiB':>9} {'razão':>7} {'comprimir (ms)':>15} {'descomprimir (ms)':>18}{colunas_banda}")
+    print("-" * (72 + 18 * len(args.banda)))
+
+    identidade = ''.join(f"{len(corpo) * 8 / (banda * 1e3):>18,.1f}" for banda in args.banda)
+    print(f"{'identity':>12} {'-':>6} {len(corpo) / 1024:>9,.0f} {1:>7.1f} {0:>15.1f} {0:>18.1f}{identidade}")
+
+    for codificacao, (funcao, _) in compressao.COMPRESSORES.items():
+        descomprimir = descompressor(codificacao)
+        for nivel in NIVEIS[codificacao]:
+            comprimido, ms_comprimir = cronometrar(lambda c: funcao(c, nivel), corpo, args.repeticoes)
+            _, ms_descomprimir = cronometrar(descomprimir, comprimido, args.repeticoes)
+            totais = ''.join(f"{ms_comprimir + len(comprimido) * 8 / (banda * 1e3) + ms_descomprimir:>18,.1f}"
+                             for banda in args.banda)
+            print(f"{codificacao:>12} {nivel:>6} {len(comprimido) / 1024:>9,.0f} {len(corpo) / len(comprimido):>7.1f} "
+                  f"{ms_comprimir:>15.1f} {ms_descomprimir:>18.1f}{totais}")
+
+
+if __name__ == '__main__':
+    main()
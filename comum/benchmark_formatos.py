@@ -0,0 +1,75 @@
+"""
+Benchmark de JSON x MessagePack no caminho real entre os serviços.
+
+Monta um catálogo de N discos (o mesmo de `benchmark_compressao.py`) e mede:
+- codificação: `jsonify()` de um app com `configurar_formatos`, com
+  `Accept: application/json` e com `Accept: application/msgpack`;
+- decodificação: `decodificar()` sobre uma `requests.Response` com cada corpo,
+  que para JSON é exatamente o `response.json()` usado antes.
+
+    python benchmark_formatos.py --discos 50000 --repeticoes 5
+"""
+import argparse
+import statistics
+import time
+
+import requests
+from flask import Flask, jsonify
+
+import compressao
+import formatos
+from benchmark_compressao import CATALOGO, gerar_registros
+
+ACCEPT = {'json': formatos.MIMETYPE_JSON, 'msgpack': formatos.MIMETYPE_MSGPACK}
+
+
+def cronometrar(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return resultado, statistics.median(tempos) * 1000
+
+
+def resposta_requests(corpo, mimetype):
+    resposta = requests.models.Response()
+    resposta.status_code = 200
+    resposta.headers['Content-Type'] = mimetype
+    resposta._content = corpo
+    return resposta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de codificação/decodificação e tamanho: JSON x MessagePack")
+    parser.add_argument('--discos', type=int, default=50000)
+    parser.add_argument('--catalogo', default=CATALOGO)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    if formatos.msgpack is None:
+        parser.error("o pacote msgpack não está instalado")
+
+    app = Flask('benchmark-formatos')
+    formatos.configurar_formatos(app)
+    dados = {'total': args.discos, 'records': gerar_registros(args.catalogo, args.discos)}
+
+    print(f"\n{args.discos:,} discos\n")
+    print(f"{'formato':>8} {'KiB':>9} {'KiB (zstd 1)':>13} {'codificar (ms)':>15} {'decodificar (ms)':>17} {'total (ms)':>11}")
+    print("-" * 78)
+
+    for formato, accept in ACCEPT.items():
+        with app.test_request_context(headers={'Accept': accept}):
+            resposta, ms_codificar = cronometrar(lambda: jsonify(dados).get_data(), args.repeticoes)
+            mimetype = jsonify({}).mimetype
+        decodificado, ms_decodificar = cronometrar(
+            lambda: formatos.decodificar(resposta_requests(resposta, mimetype)), args.repeticoes)
+        assert decodificado == dados
+
+        comprimido = compressao.comprimir('zstd', resposta) if 'zstd' in compressao.COMPRESSORES else b''
+        print(f"{formato:>8} {len(resposta) / 1024:>9,.0f} {len(comprimido) / 1024:>13,.0f} "
+              f"{ms_codificar:>15.1f} {ms_decodificar:>17.1f} {ms_codificar + ms_decodificar:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark de vazão de requisições com diferentes modos de log.
+
+Um app Flask mínimo faz N chamadas de log por requisição (como as rotas do
+gateway) e é exercitado por várias threads via test client. Compara o antigo
+`log_info` (print + flush síncronos) com o logger assíncrono de `logs.py`,
+em texto, em JSON e desligado pelo nível.
+
+    python benchmark_logs.py --requisicoes 20000 --threads 8 --logs-por-requisicao 5
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+from flask import Flask, jsonify
+
+import logs
+
+MODOS = ('print', 'texto', 'json', 'desligado')
+
+
+def criar_app(modo, logs_por_requisicao):
+    app = Flask(f"benchmark-{modo}")
+
+    if modo == 'print':
+        def registrar(mensagem, *args):
+            # Equivalente ao log_info antigo dos serviços
+            print(mensagem % args, flush=True)
+            sys.stdout.flush()
+        logger = None
+    else:
+        nivel = 'WARNING' if modo == 'desligado' else 'INFO'
+        formato = 'json' if modo == 'json' else 'texto'
+        logger = logs.configurar_logs(f"benchmark-{modo}", nivel=nivel, formato=formato)
+        registrar = logger.info
+
+    @app.route('/records/<int:record_id>')
+    def get_record(record_id):
+        for passo in range(logs_por_requisicao):
+            registrar("[GATEWAY] → GET %s/records/%s (passo %s)", 'http://records-service:5001', record_id, passo)
+        return jsonify({'id': record_id, 'title': 'Abbey Road'})
+
+    return app, logger
+
+
+def medir(modo, requisicoes, threads, logs_por_requisicao):
+    app, logger = criar_app(modo, logs_por_requisicao)
+    por_thread = requisicoes // threads
+
+    def trabalhar():
+        cliente = app.test_client()
+        for i in range(por_thread):
+            cliente.get(f'/records/{i}')
+
+    inicio = time.perf_counter()
+    workers = [threading.Thread(target=trabalhar) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    respondido = time.perf_counter() - inicio
+
+    # Inclui o tempo para o escritor esvaziar a fila: a vazão não pode depender de acumular backlog
+    if logger is not None:
+        logger.handlers[0].flush()
+    total = time.perf_counter() - inicio
+
+    return por_thread * threads, respondido, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vazão de requisições por modo de log")
+    parser.add_argument('--requisicoes', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--logs-por-requisicao', type=int, default=5)
+    parser.add_argument('--saida', default=os.devnull,
+                        help="Destino do stdout dos logs (padrão: /dev/null; use um arquivo ou pipe para simular o Docker)")
+    parser.add_argument('--modos', nargs='+', choices=MODOS, default=list(MODOS))
+    args = parser.parse_args()
+
+    terminal = sys.stdout
+    resultados = []
+    with open(args.saida, 'w', encoding='utf-8') as saida:
+        sys.stdout = saida
+        try:
+            for modo in args.modos:
+                resultados.append((modo, *medir(modo, args.requisicoes, args.threads, args.logs_por_requisicao)))
+        finally:
+            sys.stdout = terminal
+
+    print(f"\n{args.threads} threads, {args.logs_por_requisicao} logs por requisição, saída: {args.saida}\n")
+    print(f"{'modo':>10} {'requisições':>12} {'req/s':>10} {'req/s (c/ fila vazia)':>22}")
+    print("-" * 58)
+    for modo, quantidade, respondido, total in resultados:
+        print(f"{modo:>10} {quantidade:>12,} {quantidade / respondido:>10,.0f} {quantidade / total:>22,.0f}")
+
+
+if __name__ == '__main__':
+    main()
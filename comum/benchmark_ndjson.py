@@ -0,0 +1,75 @@
+"""
+Benchmark de tempo até o primeiro byte e pico de memória: JSON x NDJSON.
+
+Para cada tamanho de catálogo, um processo novo carrega N discos (os mesmos de
+`benchmark_compressao.py`) em um app Flask com a rota de listagem dos
+serviços e consome a resposta pelo test client, bloco a bloco. O pico de
+memória é o aumento do RSS máximo durante a requisição, descontada a base.
+
+    python benchmark_ndjson.py --discos 10000 50000 200000
+"""
+import argparse
+import multiprocessing
+import resource
+import time
+
+from flask import Flask, jsonify
+
+from benchmark_compressao import CATALOGO, gerar_registros
+from ndjson import MIMETYPE_NDJSON, responder_ndjson
+
+ACCEPT = {'json': 'application/json', 'ndjson': MIMETYPE_NDJSON}
+
+
+def pico_rss_mib():
+    # ru_maxrss vem em KiB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def medir(catalogo, discos, formato, fila):
+    registros = gerar_registros(catalogo, discos)
+    app = Flask('benchmark-ndjson')
+
+    @app.route('/records')
+    def list_records():
+        if formato == 'ndjson':
+            return responder_ndjson(registros)
+        return jsonify({'total': len(registros), 'records': registros})
+
+    cliente = app.test_client()
+    base = pico_rss_mib()
+
+    inicio = time.perf_counter()
+    resposta = cliente.get('/records', headers={'Accept': ACCEPT[formato]}, buffered=False)
+    blocos = iter(resposta.response)
+    tamanho = len(next(blocos))
+    primeiro_byte = time.perf_counter() - inicio
+    for bloco in blocos:
+        tamanho += len(bloco)
+    total = time.perf_counter() - inicio
+    resposta.close()
+
+    fila.put((primeiro_byte * 1000, total * 1000, pico_rss_mib() - base, tamanho))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TTFB e pico de RSS da listagem em JSON e em NDJSON")
+    parser.add_argument('--discos', type=int, nargs='+', default=[10000, 50000, 200000])
+    parser.add_argument('--catalogo', default=CATALOGO)
+    args = parser.parse_args()
+
+    print(f"\n{'discos':>9} {'formato':>8} {'MiB':>8} {'1º byte (ms)':>13} {'total (ms)':>11} {'pico RSS (+MiB)':>16}")
+    print("-" * 70)
+    contexto = multiprocessing.get_context('spawn')
+    for discos in args.discos:
+        for formato in ACCEPT:
+            fila = contexto.Queue()
+            processo = contexto.Process(target=medir, args=(args.catalogo, discos, formato, fila))
+            processo.start()
+            primeiro_byte, total, pico, tamanho = fila.get()
+            processo.join()
+            print(f"{discos:>9,} {formato:>8} {tamanho / 2**20:>8,.1f} {primeiro_byte:>13,.1f} {total:>11,.1f} {pico:>16,.1f}")
+
+
+if __name__ == '__main__':
+    main()
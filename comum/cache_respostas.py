@@ -0,0 +1,95 @@
+"""
+Cache de respostas pré-serializadas para as listagens de leitura frequente.
+
+`CacheRespostas` guarda o corpo JSON já codificado de cada listagem, junto com
+um ETag forte e as variantes comprimidas (gzip, br e zstd, veja
+`compressao.py`), tudo associado à versão dos dados do serviço. As rotas que
+alteram os dados chamam `invalidar()`, que só incrementa a versão: a próxima
+leitura serializa de novo, e as seguintes reutilizam os mesmos bytes.
+
+    cache = CacheRespostas()
+
+    @app.route('/records')
+    def list_records():
+        return cache.responder('records', lambda: {'total': len(records_db), 'records': records_db})
+
+    # em decrease_copies / increase_copies
+    cache.invalidar()
+
+Clientes que mandam `If-None-Match` com o ETag atual recebem 304 sem corpo.
+Cada variante é comprimida uma vez por versão, e não a cada requisição.
+"""
+import hashlib
+import threading
+
+from flask import Response, request
+
+from compressao import COMPRESSAO_MINIMO, comprimir, escolher_codificacao
+from formatos import formato_resposta, serializar
+
+
+class EntradaCache:
+    def __init__(self, versao, corpo, mimetype):
+        self.versao = versao
+        self.corpo = corpo
+        self.mimetype = mimetype
+        self.etag = hashlib.blake2b(corpo, digest_size=16).hexdigest()
+        # codificação -> bytes comprimidos, preenchido na primeira requisição que pedir
+        self.variantes = {}
+
+    def variante(self, codificacao):
+        comprimido = self.variantes.get(codificacao)
+        if comprimido is None:
+            comprimido = comprimir(codificacao, self.corpo)
+            self.variantes[codificacao] = comprimido
+        return comprimido
+
+
+class CacheRespostas:
+    def __init__(self):
+        self.versao = 0
+        self._entradas = {}
+        self._trava = threading.Lock()
+
+    def invalidar(self):
+        with self._trava:
+            self.versao += 1
+
+    def _entrada(self, chave, gerar, versionado):
+        versao = self.versao if versionado else 0
+        # Uma entrada por formato negociado no Accept (JSON ou MessagePack)
+        formato = formato_resposta()
+        entrada = self._entradas.get((chave, formato))
+        if entrada is not None and entrada.versao == versao:
+            return entrada
+
+        # A versão é lida antes de serializar: se uma escrita acontecer no meio,
+        # a entrada nasce com a versão antiga e a próxima leitura refaz. O corpo
+        # tem os mesmos bytes que o jsonify() geraria
+        corpo, mimetype = serializar(gerar(), formato)
+        entrada = EntradaCache(versao, corpo, mimetype)
+        self._entradas[(chave, formato)] = entrada
+        return entrada
+
+    def responder(self, chave, gerar, versionado=True):
+        # `gerar` monta o objeto da resposta e só é chamado quando a versão mudou;
+        # com versionado=False (ex.: a listagem de endpoints do `/`) a entrada nunca expira
+        entrada = self._entrada(chave, gerar, versionado)
+
+        codificacao = None
+        if len(entrada.corpo) >= COMPRESSAO_MINIMO:
+            codificacao = escolher_codificacao(request.accept_encodings)
+
+        # ETag forte por representação: a versão comprimida tem bytes diferentes
+        etag = f'{entrada.etag}-{codificacao}' if codificacao else entrada.etag
+        cabecalhos = {'ETag': f'"{etag}"', 'Vary': 'Accept, Accept-Encoding', 'Cache-Control': 'no-cache'}
+
+        if request.if_none_match.contains_weak(etag) or request.if_none_match.contains_weak(entrada.etag):
+            return Response(status=304, headers=cabecalhos)
+
+        if codificacao:
+            cabecalhos['Content-Encoding'] = codificacao
+            corpo = entrada.variante(codificacao)
+        else:
+            corpo = entrada.corpo
+        return Response(corpo, mimetype=entrada.mimetype, headers=cabecalhos)
@@ -0,0 +1,149 @@
+"""
+Compressão negociada das respostas (gzip, brotli e zstd).
+
+`configurar_compressao(app)` comprime, em um after_request, as respostas JSON e
+de texto acima de COMPRESSAO_MINIMO bytes com a melhor codificação que o
+cliente aceita no `Accept-Encoding`. brotli e zstd só entram quando os pacotes
+`brotli` e `zstandard` estão instalados; gzip está sempre disponível.
+
+Respostas que já saem com `Content-Encoding` (o cache de `cache_respostas.py`
+e os repasses do gateway feitos com `repassar`) não são tocadas.
+"""
+import gzip
+import os
+
+from flask import Response, request
+
+from ndjson import MIMETYPE_NDJSON, NDJSON_TAMANHO_BLOCO
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSAO_MINIMO = int(os.getenv('COMPRESSAO_MINIMO', 1024))
+# Níveis baixos: a compressão roda na thread da requisição, e acima do nível 1 cada
+# codificação gasta de 3 a 10x mais CPU para 20-40% a menos de bytes (benchmark_compressao.py)
+COMPRESSAO_NIVEL_GZIP = int(os.getenv('COMPRESSAO_NIVEL_GZIP', 1))
+COMPRESSAO_NIVEL_BROTLI = int(os.getenv('COMPRESSAO_NIVEL_BROTLI', 1))
+COMPRESSAO_NIVEL_ZSTD = int(os.getenv('COMPRESSAO_NIVEL_ZSTD', 1))
+# Ordem de preferência do servidor quando o cliente aceita várias com o mesmo q
+COMPRESSAO_ALGORITMOS = os.getenv('COMPRESSAO_ALGORITMOS', 'zstd,br,gzip')
+
+# Codificações que o requests (urllib3) deste processo sabe descomprimir; é o que
+# os clientes entre serviços pedem no Accept-Encoding
+try:
+    from urllib3.util.request import ACCEPT_ENCODING as ACEITA_CODIFICACAO
+except ImportError:
+    # Serviço sem o requests instalado, que não chama outros serviços
+    ACEITA_CODIFICACAO = 'gzip'
+
+TIPOS_COMPRESSIVEIS = ('application/json', 'application/msgpack', 'application/x-ndjson', 'application/xml',
+                       'application/javascript')
+
+# Cabeçalhos da resposta de um serviço que o gateway repassa ao cliente
+CABECALHOS_REPASSE = ('Content-Type', 'Content-Encoding', 'ETag', 'Vary', 'Cache-Control', 'X-Total-Count')
+
+
+def _gzip(corpo, nivel):
+    # mtime=0 para que os mesmos bytes gerem sempre o mesmo gzip (e o mesmo ETag)
+    return gzip.compress(corpo, compresslevel=nivel, mtime=0)
+
+
+def _brotli(corpo, nivel):
+    return brotli.compress(corpo, quality=nivel)
+
+
+def _zstd(corpo, nivel):
+    return zstandard.ZstdCompressor(level=nivel).compress(corpo)
+
+
+# codificação -> (função, nível), só com os pacotes instalados
+COMPRESSORES = {'gzip': (_gzip, COMPRESSAO_NIVEL_GZIP)}
+if brotli is not None:
+    COMPRESSORES['br'] = (_brotli, COMPRESSAO_NIVEL_BROTLI)
+if zstandard is not None:
+    COMPRESSORES['zstd'] = (_zstd, COMPRESSAO_NIVEL_ZSTD)
+
+PREFERENCIA = [c.strip() for c in COMPRESSAO_ALGORITMOS.split(',') if c.strip() in COMPRESSORES]
+
+
+def escolher_codificacao(accept_encodings):
+    # Maior q do cliente; empate resolvido pela ordem de COMPRESSAO_ALGORITMOS.
+    # None quando o cliente não aceita nenhuma (identity)
+    melhor, melhor_q = None, 0
+    for codificacao in PREFERENCIA:
+        q = accept_encodings[codificacao]
+        if q > melhor_q:
+            melhor, melhor_q = codificacao, q
+    return melhor
+
+
+def comprimir(codificacao, corpo):
+    funcao, nivel = COMPRESSORES[codificacao]
+    return funcao(corpo, nivel)
+
+
+def _compressivel(response):
+    if request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if response.direct_passthrough or response.is_streamed:
+        return False
+    if 'Content-Encoding' in response.headers or 'no-transform' in response.headers.get('Cache-Control', ''):
+        return False
+    mimetype = response.mimetype or ''
+    return mimetype.startswith('text/') or mimetype in TIPOS_COMPRESSIVEIS
+
+
+def _comprimir_resposta(response):
+    if not _compressivel(response):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    corpo = response.get_data()
+    if len(corpo) < COMPRESSAO_MINIMO:
+        return response
+    codificacao = escolher_codificacao(request.accept_encodings)
+    if codificacao is None:
+        return response
+
+    response.set_data(comprimir(codificacao, corpo))
+    response.headers['Content-Encoding'] = codificacao
+    # ETag forte vale para uma representação: a comprimida ganha o seu
+    etag, fraco = response.get_etag()
+    if etag and not fraco:
+        response.set_etag(f'{etag}-{codificacao}')
+    return response
+
+
+def cabecalhos_repasse():
+    # Cabeçalhos da requisição do cliente que o gateway envia ao serviço, para que
+    # ele já responda no formato e na compressão que o cliente aceita (ou 304)
+    cabecalhos = {
+        'Accept': request.headers.get('Accept', '*/*'),
+        'Accept-Encoding': request.headers.get('Accept-Encoding', 'identity'),
+    }
+    if 'If-None-Match' in request.headers:
+        cabecalhos['If-None-Match'] = request.headers['If-None-Match']
+    return cabecalhos
+
+
+def repassar(resposta):
+    # Devolve a resposta de um serviço (pedida com stream=True) com os bytes como
+    # vieram, sem descomprimir e comprimir de novo. NDJSON segue em streaming,
+    # bloco a bloco, sem esperar o serviço terminar
+    cabecalhos = {nome: resposta.headers[nome] for nome in CABECALHOS_REPASSE if nome in resposta.headers}
+    if cabecalhos.get('Content-Type', '').startswith(MIMETYPE_NDJSON):
+        corpo = resposta.raw.stream(NDJSON_TAMANHO_BLOCO, decode_content=False)
+    else:
+        corpo = resposta.raw.read(decode_content=False)
+    return Response(corpo, status=resposta.status_code, headers=cabecalhos)
+
+
+def configurar_compressao(app):
+    app.after_request(_comprimir_resposta)
@@ -0,0 +1,75 @@
+"""
+Formato das respostas negociado pelo cabeçalho `Accept`: JSON ou MessagePack.
+
+`configurar_formatos(app)` troca o provider JSON do app por um que, quando o
+cliente prefere `application/msgpack` no `Accept`, responde em MessagePack.
+Como o `jsonify()` passa pelo provider, as rotas não mudam. Clientes externos
+(navegador, curl, `Accept: */*`) continuam recebendo JSON.
+
+Do lado de quem chama, as sessões pedem o formato binário com
+`ACEITA_FORMATO` e leem a resposta com `decodificar(resposta)` no lugar de
+`resposta.json()`:
+
+    http.headers['Accept'] = ACEITA_FORMATO
+    record = decodificar(http.get(f"{RECORDS_SERVICE_URL}/records/1", timeout=5))
+
+Sem o pacote `msgpack` instalado tudo continua em JSON.
+"""
+from flask import Response, current_app, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MIMETYPE_JSON = 'application/json'
+MIMETYPE_MSGPACK = 'application/msgpack'
+# Nome usado por parte das bibliotecas antes do registro na IANA
+MIMETYPES_MSGPACK = (MIMETYPE_MSGPACK, 'application/x-msgpack')
+
+if msgpack is not None:
+    ACEITA_FORMATO = f'{MIMETYPE_MSGPACK}, {MIMETYPE_JSON};q=0.9'
+else:
+    ACEITA_FORMATO = MIMETYPE_JSON
+
+
+def formato_resposta():
+    # 'msgpack' só quando o cliente o prefere explicitamente; empate e */* ficam com JSON
+    if msgpack is None or not has_request_context():
+        return 'json'
+    melhor = request.accept_mimetypes.best_match((MIMETYPE_JSON,) + MIMETYPES_MSGPACK, default=MIMETYPE_JSON)
+    return 'msgpack' if melhor in MIMETYPES_MSGPACK else 'json'
+
+
+def serializar(dados, formato):
+    # Corpo e mimetype no formato indicado, com os mesmos bytes que o jsonify() daria
+    provedor = current_app.json
+    if formato == 'msgpack':
+        # Tipos fora do MessagePack (datas, Decimal, UUID...) viram o mesmo valor que teriam no JSON
+        return msgpack.packb(dados, default=provedor.default), MIMETYPE_MSGPACK
+    return DefaultJSONProvider.response(provedor, dados).get_data(), provedor.mimetype
+
+
+class ProvedorNegociado(DefaultJSONProvider):
+    def response(self, *args, **kwargs):
+        formato = formato_resposta()
+        if formato == 'json':
+            resposta = super().response(*args, **kwargs)
+        else:
+            corpo, mimetype = serializar(self._prepare_response_obj(args, kwargs), formato)
+            resposta = Response(corpo, mimetype=mimetype)
+        resposta.vary.add('Accept')
+        return resposta
+
+
+def decodificar(resposta):
+    # resposta.json() que também entende MessagePack, pelo Content-Type
+    tipo = resposta.headers.get('Content-Type', '').split(';')[0].strip()
+    if tipo in MIMETYPES_MSGPACK:
+        return msgpack.unpackb(resposta.content)
+    return resposta.json()
+
+
+def configurar_formatos(app):
+    app.json = ProvedorNegociado(app)
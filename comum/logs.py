@@ -0,0 +1,195 @@
+"""
+Logs assíncronos compartilhados pelos serviços Flask.
+
+`configurar_logs(servico)` devolve um `logging.Logger` com nível definido por
+LOG_LEVEL. Quem chama só enfileira o registro (sem formatar e sem syscall);
+uma thread em segundo plano formata e grava em lote no stdout, em texto ou
+em JSON lines (LOG_FORMAT=json).
+
+A fila guarda no máximo LOG_QUEUE_SIZE registros: se o stdout travar, os
+excedentes são descartados e contados, e o escritor avisa quantos perdeu
+assim que voltar a gravar, em vez de a memória crescer até o processo cair.
+
+Use argumentos no estilo do logging para a mensagem só ser montada se o
+nível estiver ativo:
+
+    logger.info("[GATEWAY] HTTP GET → %s", url)
+
+A mensagem é montada depois, na thread de escrita: argumentos mutáveis (listas,
+dicts, objetos alterados em seguida) podem sair com o valor de quando o
+registro foi gravado, não de quando `logger.info` foi chamado. Passe cópias ou
+valores já convertidos (`len(lista)`, `str(obj)`) quando isso importar.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'texto')
+LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', 512))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+
+# Atributos padrão do LogRecord: o que sobrar veio de `extra=` e vai para o JSON
+_ATRIBUTOS_PADRAO = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+_FIM = object()
+
+# Sem busca de arquivo/linha de origem (sys._getframe) nem nomes de thread/processo
+# em cada registro: otimizações documentadas do módulo logging
+logging._srcfile = None
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+
+class FormatadorJSON(logging.Formatter):
+    def __init__(self, servico):
+        super().__init__()
+        self.servico = servico
+
+    def format(self, record):
+        dados = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'servico': self.servico,
+            'msg': record.getMessage(),
+        }
+        for chave, valor in vars(record).items():
+            if chave not in _ATRIBUTOS_PADRAO:
+                dados[chave] = valor
+        if record.exc_info:
+            dados['exc'] = self.formatException(record.exc_info)
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class FormatadorTexto(logging.Formatter):
+    def format(self, record):
+        mensagem = super().format(record)
+        # trace_id vem do filtro de comum/rastreamento.py, quando ativo
+        trace_id = getattr(record, 'trace_id', None)
+        return f"{mensagem} [trace={trace_id}]" if trace_id else mensagem
+
+
+class HandlerFila(logging.Handler):
+    # Diferente do QueueHandler da stdlib, não formata na thread da requisição:
+    # msg e args seguem crus e a montagem acontece no escritor
+    def __init__(self, fila):
+        super().__init__()
+        self.fila = fila
+        self.descartados = 0
+        self._lock_descartados = threading.Lock()
+
+    def handle(self, record):
+        # Filtros do handler valem como no Handler.handle; a fila dispensa o lock de emit
+        resultado = self.filter(record)
+        if isinstance(resultado, logging.LogRecord):
+            # Python 3.12+: o filtro pode devolver outro registro
+            record = resultado
+        elif not resultado:
+            return False
+        self.emit(record)
+        return record
+
+    def emit(self, record):
+        try:
+            self.fila.put_nowait(record)
+        except queue.Full:
+            with self._lock_descartados:
+                self.descartados += 1
+
+    def flush(self):
+        # Espera o escritor gravar tudo que foi enfileirado até aqui
+        gravado = threading.Event()
+        try:
+            self.fila.put(gravado, timeout=5)
+        except queue.Full:
+            return
+        gravado.wait(timeout=5)
+
+
+class EscritorLogs:
+    def __init__(self, formatador, saida=None, tamanho_lote=LOG_BATCH_SIZE, tamanho_fila=LOG_QUEUE_SIZE):
+        self.formatador = formatador
+        self.saida = saida or sys.stdout
+        self.tamanho_lote = tamanho_lote
+        self.tamanho_fila = tamanho_fila
+        self.handler = HandlerFila(queue.Queue(tamanho_fila))
+        self._iniciar()
+        atexit.register(self.parar)
+        # Com Gunicorn o processo é copiado sem a thread: cada worker sobe a sua
+        os.register_at_fork(after_in_child=self._iniciar)
+
+    def _iniciar(self):
+        self.fila = self.handler.fila = queue.Queue(self.tamanho_fila)
+        self.handler.descartados = 0
+        self._avisados = 0
+        self._thread = threading.Thread(target=self._executar, name='escritor-logs', daemon=True)
+        self._thread.start()
+
+    def _executar(self):
+        while True:
+            # Bloqueia até chegar o primeiro registro e drena o que já estiver na fila:
+            # ocioso, cada linha sai na hora; sob carga, um write + flush por lote
+            lote = [self.fila.get()]
+            while len(lote) < self.tamanho_lote:
+                try:
+                    lote.append(self.fila.get_nowait())
+                except queue.Empty:
+                    break
+
+            fim = False
+            linhas = []
+            avisos = []
+            for record in lote:
+                if record is _FIM:
+                    fim = True
+                    continue
+                if isinstance(record, threading.Event):
+                    avisos.append(record)
+                    continue
+                try:
+                    linhas.append(self.formatador.format(record))
+                except Exception:
+                    linhas.append(f"[LOG] Falha ao formatar registro: {getattr(record, 'msg', record)!r}")
+
+            descartados = self.handler.descartados
+            if descartados > self._avisados:
+                linhas.append(f"[LOG] {descartados - self._avisados} registros descartados com a fila cheia "
+                              f"(LOG_QUEUE_SIZE={self.tamanho_fila}, {descartados} no total)")
+                self._avisados = descartados
+
+            if linhas:
+                self.saida.write('\n'.join(linhas) + '\n')
+                self.saida.flush()
+            for aviso in avisos:
+                aviso.set()
+            if fim:
+                return
+
+    def parar(self):
+        # Na saída do processo: grava o que ainda está na fila
+        if self._thread.is_alive():
+            try:
+                self.fila.put(_FIM, timeout=5)
+            except queue.Full:
+                return
+            self._thread.join(timeout=5)
+
+
+def configurar_logs(servico, nivel=LOG_LEVEL, formato=LOG_FORMAT):
+    if formato == 'json':
+        formatador = FormatadorJSON(servico)
+    else:
+        formatador = FormatadorTexto('%(message)s')
+
+    escritor = EscritorLogs(formatador)
+
+    logger = logging.getLogger(servico)
+    logger.setLevel(nivel)
+    logger.handlers[:] = [escritor.handler]
+    logger.propagate = False
+    return logger
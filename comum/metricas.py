@@ -0,0 +1,187 @@
+"""
+Métricas HTTP compartilhadas pelos serviços Flask.
+
+`instrumentar(app, servico)` envolve o WSGI do app e publica em /metrics, no
+formato texto do Prometheus: requisições por rota e status, requisições em
+andamento e histograma de latência. Os contadores ficam em memória
+compartilhada alocada antes do fork, com uma fatia por processo: com o
+Gunicorn cada worker escreve só na sua fatia e /metrics soma todas.
+
+Cada fatia guarda o PID do dono. Um worker novo pega uma fatia livre ou a de
+um worker que morreu (as contagens dele continuam na soma; as requisições em
+andamento são zeradas). Sem fatia disponível o processo não registra nada, em
+vez de dividir uma fatia com outro processo vivo.
+
+A latência e o fim da requisição em andamento são registrados no `close()` do
+corpo da resposta, depois de ele ser enviado: respostas em streaming (NDJSON,
+exportações) contam o tempo todo da transmissão.
+"""
+import bisect
+import multiprocessing
+import os
+import threading
+import time
+from multiprocessing.sharedctypes import RawArray
+
+from flask import Response, request
+from werkzeug.wsgi import ClosingIterator
+
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATUS_CONHECIDOS = (200, 201, 204, 301, 302, 304, 400, 401, 403, 404, 405, 409, 422, 429, 500, 502, 503, 504)
+MAX_PROCESSOS = int(os.getenv('METRICS_MAX_WORKERS', 64))
+SEM_ROTA = '<sem_rota>'
+
+# Layout de cada rota dentro da fatia: [status...] [outro] [buckets...] [+Inf] [soma]
+N_STATUS = len(STATUS_CONHECIDOS) + 1
+STATUS_OUTRO = len(STATUS_CONHECIDOS)
+N_BUCKETS = len(BUCKETS_LATENCIA) + 1
+SLOT_SOMA = N_STATUS + N_BUCKETS
+TAMANHO_ROTA = SLOT_SOMA + 1
+
+
+class MetricasWSGI:
+    def __init__(self, app, servico):
+        self.app = app
+        self.servico = servico
+        self.wsgi_app = app.wsgi_app
+
+        app.add_url_rule('/metrics', 'metricas', self.exportar)
+        app.after_request(self._marcar)
+
+        # Offsets pré-calculados: no caminho da requisição só há somas em posições fixas
+        self.rotas = sorted({regra.rule for regra in app.url_map.iter_rules()}) + [SEM_ROTA]
+        self._indice_rota = {rota: 1 + i * TAMANHO_ROTA for i, rota in enumerate(self.rotas)}
+        self._sem_rota = self._indice_rota[SEM_ROTA]
+        self._indice_status = {status: i for i, status in enumerate(STATUS_CONHECIDOS)}
+        # Slot 0 da fatia: requisições em andamento
+        self.tamanho_fatia = 1 + len(self.rotas) * TAMANHO_ROTA
+
+        self._valores = RawArray('d', MAX_PROCESSOS * self.tamanho_fatia)
+        # PID dono de cada fatia; 0 = nunca usada
+        self._pids = RawArray('q', MAX_PROCESSOS)
+        self._lock_fatias = multiprocessing.Lock()
+        self._reivindicar_fatia()
+        os.register_at_fork(after_in_child=self._reivindicar_fatia)
+
+        app.wsgi_app = self
+
+    @staticmethod
+    def _vivo(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _reivindicar_fatia(self):
+        # Lock novo no filho: o do pai pode ter sido copiado travado por outra thread
+        self._lock = threading.Lock()
+        self._base = None
+        with self._lock_fatias:
+            for numero, pid in enumerate(self._pids):
+                if pid and self._vivo(pid):
+                    continue
+                self._pids[numero] = os.getpid()
+                self._base = numero * self.tamanho_fatia
+                # Requisições que o processo morto deixou "em andamento" nunca vão terminar
+                self._valores[self._base] = 0
+                return
+        print(f"[AVISO] Mais de {MAX_PROCESSOS} processos vivos: processo {os.getpid()} sem fatia de "
+              f"métricas, requisições dele não serão contadas (aumente METRICS_MAX_WORKERS)", flush=True)
+
+    def _marcar(self, response):
+        # Roda dentro do Flask, onde a rota já foi resolvida; o middleware lê do environ
+        regra = request.url_rule
+        request.environ['metricas.rota'] = (
+            self._indice_rota.get(regra.rule, self._sem_rota) if regra is not None else self._sem_rota
+        )
+        request.environ['metricas.status'] = response.status_code
+        return response
+
+    def __call__(self, environ, start_response):
+        base = self._base
+        if base is None:
+            return self.wsgi_app(environ, start_response)
+        with self._lock:
+            self._valores[base] += 1
+
+        inicio = time.perf_counter()
+        try:
+            corpo = self.wsgi_app(environ, start_response)
+        except BaseException:
+            self._registrar(environ, base, inicio)
+            raise
+        # O servidor chama close() depois de enviar o corpo inteiro (ou de desistir dele)
+        return ClosingIterator(corpo, lambda: self._registrar(environ, base, inicio))
+
+    def _registrar(self, environ, base, inicio):
+        duracao = time.perf_counter() - inicio
+        valores = self._valores
+        rota = base + environ.get('metricas.rota', self._sem_rota)
+        status = self._indice_status.get(environ.get('metricas.status', 500), STATUS_OUTRO)
+        with self._lock:
+            valores[base] -= 1
+            valores[rota + status] += 1
+            valores[rota + N_STATUS + bisect.bisect_left(BUCKETS_LATENCIA, duracao)] += 1
+            valores[rota + SLOT_SOMA] += duracao
+
+    def _somar_fatias(self):
+        # Contadores de processos mortos continuam na soma (counters não podem diminuir);
+        # o gauge de requisições em andamento só conta processos vivos
+        total = [0.0] * self.tamanho_fatia
+        for fatia, pid in enumerate(self._pids):
+            if not pid:
+                continue
+            inicio = fatia * self.tamanho_fatia
+            valores = self._valores[inicio:inicio + self.tamanho_fatia]
+            if not self._vivo(pid):
+                valores[0] = 0.0
+            for i, valor in enumerate(valores):
+                total[i] += valor
+        return total
+
+    def exportar(self):
+        total = self._somar_fatias()
+        servico = f'service="{self.servico}"'
+        requisicoes = []
+        latencias = []
+
+        for rota in self.rotas:
+            inicio = self._indice_rota[rota]
+            rotulos = f'{servico},route="{rota}"'
+
+            for i, contagem in enumerate(total[inicio:inicio + N_STATUS]):
+                if contagem:
+                    status = STATUS_CONHECIDOS[i] if i < STATUS_OUTRO else 'outro'
+                    requisicoes.append(f'http_requests_total{{{rotulos},status="{status}"}} {int(contagem)}')
+
+            buckets = total[inicio + N_STATUS:inicio + SLOT_SOMA]
+            quantidade = sum(buckets)
+            if not quantidade:
+                continue
+            acumulado = 0
+            for limite, contagem in zip(BUCKETS_LATENCIA + ('+Inf',), buckets):
+                acumulado += contagem
+                latencias.append(f'http_request_duration_seconds_bucket{{{rotulos},le="{limite}"}} {int(acumulado)}')
+            latencias.append(f'http_request_duration_seconds_sum{{{rotulos}}} {total[inicio + SLOT_SOMA]:.6f}')
+            latencias.append(f'http_request_duration_seconds_count{{{rotulos}}} {int(quantidade)}')
+
+        linhas = [
+            '# HELP http_requests_total Requisições HTTP concluídas, por rota e status.',
+            '# TYPE http_requests_total counter',
+            *requisicoes,
+            '# HELP http_requests_in_flight Requisições HTTP em andamento.',
+            '# TYPE http_requests_in_flight gauge',
+            f'http_requests_in_flight{{{servico}}} {int(total[0])}',
+            '# HELP http_request_duration_seconds Latência das requisições HTTP.',
+            '# TYPE http_request_duration_seconds histogram',
+            *latencias,
+        ]
+        return Response('\n'.join(linhas) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+def instrumentar(app, servico):
+    # Chamar depois de registrar todas as rotas: o layout dos contadores é fixo
+    return MetricasWSGI(app, servico)
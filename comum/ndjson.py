@@ -0,0 +1,62 @@
+"""
+Respostas em streaming no formato NDJSON (`application/x-ndjson`).
+
+Quando o cliente prefere `application/x-ndjson` no `Accept`, as listagens
+devolvem um objeto JSON por linha, gerado item a item: o corpo inteiro nunca
+fica em memória e o primeiro byte sai antes de a coleção ter sido percorrida.
+
+    if ndjson_solicitado():
+        return responder_ndjson(records_db)
+
+Do lado de quem consome, `ler_ndjson(resposta)` percorre uma resposta pedida
+com `stream=True` linha a linha, também sem montar a lista.
+"""
+import json
+import os
+
+from flask import Response, current_app, request, stream_with_context
+
+MIMETYPE_NDJSON = 'application/x-ndjson'
+
+# As linhas são agrupadas em blocos antes de ir para o socket: um write por linha
+# custaria mais que a serialização
+NDJSON_TAMANHO_BLOCO = int(os.getenv('NDJSON_TAMANHO_BLOCO', 64 * 1024))
+
+
+def ndjson_solicitado():
+    melhor = request.accept_mimetypes.best_match(('application/json', MIMETYPE_NDJSON), default='application/json')
+    return melhor == MIMETYPE_NDJSON
+
+
+def _linhas(itens, dumps):
+    bloco, tamanho = [], 0
+    for item in itens:
+        linha = dumps(item, separators=(',', ':')) + '\n'
+        bloco.append(linha)
+        tamanho += len(linha)
+        if tamanho >= NDJSON_TAMANHO_BLOCO:
+            yield ''.join(bloco)
+            bloco, tamanho = [], 0
+    if bloco:
+        yield ''.join(bloco)
+
+
+def responder_ndjson(itens, total=None):
+    # `itens` pode ser uma lista ou um gerador; `total` vai no X-Total-Count quando conhecido
+    if total is None and hasattr(itens, '__len__'):
+        total = len(itens)
+    resposta = Response(stream_with_context(_linhas(itens, current_app.json.dumps)), mimetype=MIMETYPE_NDJSON)
+    resposta.vary.add('Accept')
+    if total is not None:
+        resposta.headers['X-Total-Count'] = str(total)
+    return resposta
+
+
+def ler_ndjson(resposta):
+    # Objetos de uma resposta NDJSON pedida com stream=True, um por vez
+    try:
+        for linha in resposta.iter_lines(chunk_size=NDJSON_TAMANHO_BLOCO):
+            if linha:
+                yield json.loads(linha)
+    finally:
+        resposta.close()
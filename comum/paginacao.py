@@ -0,0 +1,196 @@
+"""
+Paginação por cursor, ordenação e projeção de campos para as listagens.
+
+Um `Paginador` por coleção mantém, para cada campo indexado, uma lista
+ordenada de (valor, id); a página começa com uma busca binária a partir do
+cursor e percorre só os itens que vai devolver. Parâmetros aceitos:
+
+    limit=20            tamanho da página (padrão PAGINACAO_LIMITE_PADRAO quando há `after`)
+    after=<cursor>      continua de onde a página anterior parou (`next` da resposta)
+    sort=title|-year    campo indexado, `-` para ordem decrescente (padrão: id)
+    fields=id,title     só os campos pedidos em cada item
+
+    records_paginados = Paginador(records_db, ('id', 'title', 'artist', 'genre', 'year'))
+
+    @app.route('/records')
+    def list_records():
+        if paginacao_solicitada():
+            return records_paginados.responder('records')
+        return cache.responder('records', ...)
+
+Só campos que não mudam depois da criação do registro são indexados; novos
+registros entram com `adicionar()`. Registros sem valor (None) no campo
+ordenado vêm depois dos demais na ordem crescente.
+
+Com `filtro`, o `total` da coleção filtrada exige olhar todos os registros:
+ele só é calculado na primeira página (sem `after`) e as seguintes devolvem
+`total: null`.
+"""
+import base64
+import bisect
+import json
+import os
+import threading
+
+from flask import jsonify, request
+
+PAGINACAO_LIMITE_PADRAO = int(os.getenv('PAGINACAO_LIMITE_PADRAO', 50))
+PAGINACAO_LIMITE_MAXIMO = int(os.getenv('PAGINACAO_LIMITE_MAXIMO', 1000))
+
+PARAMETROS = ('limit', 'after', 'sort', 'fields')
+
+
+class ParametroInvalido(ValueError):
+    pass
+
+
+def paginacao_solicitada():
+    return any(parametro in request.args for parametro in PARAMETROS)
+
+
+def _chave(valor):
+    # Textos ordenados sem diferenciar maiúsculas ("abbey road" junto de "Abbey Road")
+    return valor.casefold() if isinstance(valor, str) else valor
+
+
+def _entrada(chave, registro_id):
+    # Posição no índice: None não se compara com os demais valores, então vai para o fim
+    return (chave is None, chave, registro_id)
+
+
+def _tipo(valor):
+    # Tipos que se comparam entre si no bisect (int e float juntos, bool à parte)
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return 'numero'
+    return type(valor).__name__
+
+
+def codificar_cursor(campo, decrescente, chave, registro_id):
+    bruto = json.dumps([campo, decrescente, chave, registro_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(bruto.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        campo, decrescente, chave, registro_id = json.loads(bruto)
+    except (ValueError, TypeError):
+        raise ParametroInvalido('Cursor inválido')
+    return campo, decrescente, chave, registro_id
+
+
+class Paginador:
+    def __init__(self, registros, campos_indexados):
+        self.campos_indexados = tuple(campos_indexados)
+        self.por_id = {}
+        self.indices = {campo: [] for campo in self.campos_indexados}
+        self.campos = set()
+        # Tipo dos valores de cada campo indexado (e do id), para validar cursores
+        self.tipos = {}
+        self._trava = threading.Lock()
+        for registro in registros:
+            self._registrar(registro)
+        for campo, indice in self.indices.items():
+            indice.extend(sorted(_entrada(_chave(r[campo]), r['id']) for r in self.por_id.values()))
+
+    def _registrar(self, registro):
+        self.por_id[registro['id']] = registro
+        self.campos.update(registro)
+        for campo in self.campos_indexados + ('id',):
+            if registro[campo] is not None:
+                self.tipos.setdefault(campo, _tipo(registro[campo]))
+
+    def adicionar(self, registro):
+        with self._trava:
+            self._registrar(registro)
+            for campo, indice in self.indices.items():
+                bisect.insort(indice, _entrada(_chave(registro[campo]), registro['id']))
+
+    def _validar_cursor(self, campo, chave, registro_id):
+        # Um cursor adulterado com outro tipo quebraria a comparação no bisect
+        if chave is not None and _tipo(chave) != self.tipos.get(campo, _tipo(chave)):
+            raise ParametroInvalido('Cursor inválido')
+        if registro_id is None or _tipo(registro_id) != self.tipos.get('id', _tipo(registro_id)):
+            raise ParametroInvalido('Cursor inválido')
+        return _entrada(chave, registro_id)
+
+    def _parametros(self, args):
+        ordem = args.get('sort', 'id')
+        decrescente = ordem.startswith('-')
+        campo = ordem.lstrip('-')
+        if campo not in self.indices:
+            raise ParametroInvalido(f"Ordenação só por campos indexados: {', '.join(self.campos_indexados)}")
+
+        limite = None
+        if 'limit' in args or 'after' in args:
+            try:
+                limite = int(args.get('limit', PAGINACAO_LIMITE_PADRAO))
+            except ValueError:
+                raise ParametroInvalido('limit deve ser um número inteiro')
+            if not 1 <= limite <= PAGINACAO_LIMITE_MAXIMO:
+                raise ParametroInvalido(f'limit deve estar entre 1 e {PAGINACAO_LIMITE_MAXIMO}')
+
+        cursor = None
+        if args.get('after'):
+            campo_cursor, decrescente_cursor, chave, registro_id = decodificar_cursor(args['after'])
+            if (campo_cursor, decrescente_cursor) != (campo, decrescente):
+                raise ParametroInvalido('Cursor gerado com outra ordenação')
+            cursor = self._validar_cursor(campo, chave, registro_id)
+
+        campos = None
+        if args.get('fields'):
+            campos = [c.strip() for c in args['fields'].split(',') if c.strip()]
+            desconhecidos = [c for c in campos if c not in self.campos]
+            if desconhecidos:
+                raise ParametroInvalido(f"Campos desconhecidos: {', '.join(desconhecidos)}")
+
+        return campo, decrescente, limite, cursor, campos
+
+    def pagina(self, args, filtro=None):
+        # Itens da página, total da coleção (filtrada, só na primeira página) e o cursor da próxima
+        campo, decrescente, limite, cursor, campos = self._parametros(args)
+
+        with self._trava:
+            indice = self.indices[campo]
+            if decrescente:
+                inicio = bisect.bisect_left(indice, cursor) - 1 if cursor else len(indice) - 1
+                posicoes = range(inicio, -1, -1)
+            else:
+                inicio = bisect.bisect_right(indice, cursor) if cursor else 0
+                posicoes = range(inicio, len(indice))
+
+            itens, proximo = [], None
+            for posicao in posicoes:
+                registro_id = indice[posicao][2]
+                registro = self.por_id[registro_id]
+                if filtro is not None and not filtro(registro):
+                    continue
+                if limite is not None and len(itens) == limite:
+                    # Há pelo menos mais um item: a próxima página começa depois do último devolvido
+                    ultimo = itens[-1]
+                    proximo = codificar_cursor(campo, decrescente, _chave(ultimo[campo]), ultimo['id'])
+                    break
+                itens.append(registro)
+
+            if filtro is None:
+                total = len(self.por_id)
+            elif cursor is None:
+                total = sum(1 for r in self.por_id.values() if filtro(r))
+            else:
+                total = None
+
+        if campos is not None:
+            itens = [{c: r[c] for c in campos if c in r} for r in itens]
+        return itens, total, limite, proximo
+
+    def responder(self, chave_lista, filtro=None):
+        try:
+            itens, total, limite, proximo = self.pagina(request.args, filtro)
+        except ParametroInvalido as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({
+            'total': total,
+            chave_lista: itens,
+            'limit': limite,
+            'next': proximo
+        })
@@ -0,0 +1,196 @@
+"""
+Profiling sob demanda para os serviços Flask.
+
+Com PROFILE_TOKEN definido, uma requisição com o cabeçalho `X-Profile: <token>`
+é executada sob o profiler; com PROFILE_SAMPLE_RATE > 0, uma fração aleatória
+das requisições também. Cada perfil vira um arquivo em PROFILE_DIR (pstats do
+cProfile ou pilhas colapsadas do amostrador, prontas para flamegraph), que
+guarda só os PROFILE_MAX_FILES mais recentes. GET /debug/profiles lista os
+arquivos e GET /debug/profiles/<nome> baixa um deles, sempre com o mesmo
+cabeçalho `X-Profile`: os perfis expõem caminhos do código e argumentos. Só
+com PROFILE_SAMPLE_RATE, sem token, os perfis são gravados em disco mas essas
+rotas não são registradas.
+
+Sem token e sem taxa de amostragem nada é instalado: nenhum wrapper, nenhuma rota.
+"""
+import cProfile
+import hmac
+import itertools
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import abort, jsonify, request, send_from_directory
+from werkzeug.wsgi import ClosingIterator
+
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_MODE = os.getenv('PROFILE_MODE', 'cprofile')
+PROFILE_DIR = os.getenv('PROFILE_DIR', '/tmp/profiles')
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', 50))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.005))
+
+CABECALHO = 'HTTP_X_PROFILE'
+PREFIXO_ROTAS = '/debug/profiles'
+EXTENSOES = {'cprofile': '.prof', 'amostragem': '.collapsed'}
+
+
+class AmostradorPilha:
+    # Lê a pilha da thread da requisição a cada `intervalo` segundos, sem tracing:
+    # o custo fica na thread do amostrador, não em cada chamada de função
+    def __init__(self, thread_id, intervalo=PROFILE_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.intervalo = intervalo
+        self.pilhas = Counter()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name='amostrador-pilha', daemon=True)
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self.thread_id)
+            quadros = []
+            while frame is not None:
+                codigo = frame.f_code
+                quadros.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+                frame = frame.f_back
+            if quadros:
+                self.pilhas[';'.join(reversed(quadros))] += 1
+
+    def iniciar(self):
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        self._thread.join()
+
+    def salvar(self, caminho):
+        with open(caminho, 'w', encoding='utf-8') as f:
+            for pilha, amostras in self.pilhas.most_common():
+                f.write(f"{pilha} {amostras}\n")
+
+
+class ProfilingWSGI:
+    def __init__(self, app, servico, diretorio=PROFILE_DIR, modo=PROFILE_MODE,
+                 token=PROFILE_TOKEN, taxa=PROFILE_SAMPLE_RATE, max_arquivos=PROFILE_MAX_FILES):
+        self.servico = servico
+        self.diretorio = diretorio
+        self.modo = modo
+        self.token = token
+        self.taxa = taxa
+        self.max_arquivos = max_arquivos
+        self._sequencia = itertools.count()
+        self._lock_anel = threading.Lock()
+        os.makedirs(diretorio, exist_ok=True)
+
+        if token:
+            app.add_url_rule(PREFIXO_ROTAS, 'listar_profiles', self.listar)
+            app.add_url_rule(f'{PREFIXO_ROTAS}/<nome>', 'baixar_profile', self.baixar)
+        else:
+            logging.getLogger(servico).warning(
+                "[PROFILING] PROFILE_TOKEN não definido: %s desativado, perfis só em %s", PREFIXO_ROTAS, diretorio)
+
+        self.wsgi_app = app.wsgi_app
+        app.wsgi_app = self
+
+    def _autorizado(self, environ):
+        valor = environ.get(CABECALHO)
+        return bool(self.token and valor and hmac.compare_digest(valor, self.token))
+
+    def __call__(self, environ, start_response):
+        caminho = environ.get('PATH_INFO', '/')
+        if (not (self._autorizado(environ) or (self.taxa and random.random() < self.taxa))
+                or caminho.startswith(PREFIXO_ROTAS)):
+            return self.wsgi_app(environ, start_response)
+
+        # Só letras, números, '-' e '_' no nome do arquivo
+        rota = re.sub(r'[^A-Za-z0-9_-]+', '_', caminho.strip('/'))[:60] or 'raiz'
+        nome = (f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{self.servico}_{rota}_"
+                f"{os.getpid()}-{next(self._sequencia)}{EXTENSOES[self.modo]}")
+
+        def start_response_com_nome(status, headers, exc_info=None):
+            return start_response(status, headers + [('X-Profile-File', nome)], exc_info)
+
+        inicio = time.perf_counter()
+        if self.modo == 'amostragem':
+            amostrador = AmostradorPilha(threading.get_ident())
+            amostrador.iniciar()
+
+            def finalizar():
+                amostrador.parar()
+                self._guardar(nome, amostrador.salvar, inicio)
+        else:
+            perfil = cProfile.Profile()
+            perfil.enable()
+
+            def finalizar():
+                perfil.disable()
+                self._guardar(nome, perfil.dump_stats, inicio)
+
+        try:
+            corpo = self.wsgi_app(environ, start_response_com_nome)
+        except BaseException:
+            finalizar()
+            raise
+        # Respostas em streaming geram o corpo depois do return: o perfil só para no close()
+        return ClosingIterator(corpo, finalizar)
+
+    def _guardar(self, nome, salvar, inicio):
+        salvar(os.path.join(self.diretorio, nome))
+        # Mesmo logger configurado por configurar_logs(servico)
+        logging.getLogger(self.servico).info("[PROFILING] %s (%.1f ms)", nome, (time.perf_counter() - inicio) * 1000)
+
+        # Anel em disco: mantém só os arquivos mais recentes
+        with self._lock_anel:
+            arquivos = sorted(self._arquivos(), key=lambda caminho: os.path.getmtime(caminho))
+            for antigo in arquivos[:-self.max_arquivos]:
+                try:
+                    os.remove(antigo)
+                except FileNotFoundError:
+                    # Outro worker já removeu
+                    pass
+
+    def _arquivos(self):
+        return [
+            os.path.join(self.diretorio, nome) for nome in os.listdir(self.diretorio)
+            if nome.endswith(tuple(EXTENSOES.values()))
+        ]
+
+    def _exigir_token(self):
+        # Sem token nunca é "sem autenticação": _autorizado é falso para qualquer cabeçalho
+        if not self._autorizado(request.environ):
+            abort(403)
+
+    def listar(self):
+        self._exigir_token()
+        profiles = []
+        for caminho in self._arquivos():
+            try:
+                info = os.stat(caminho)
+            except FileNotFoundError:
+                continue
+            profiles.append({
+                'nome': os.path.basename(caminho),
+                'bytes': info.st_size,
+                'criado_em': datetime.fromtimestamp(info.st_mtime).isoformat(),
+            })
+        profiles.sort(key=lambda p: p['criado_em'], reverse=True)
+        return jsonify({'total': len(profiles), 'modo': self.modo, 'profiles': profiles})
+
+    def baixar(self, nome):
+        self._exigir_token()
+        return send_from_directory(self.diretorio, nome, as_attachment=True)
+
+
+def configurar_profiling(app, servico):
+    # Chamar antes de `instrumentar` (métricas), para as rotas /debug/profiles entrarem no layout
+    if not PROFILE_TOKEN and not PROFILE_SAMPLE_RATE:
+        return None
+    if PROFILE_MODE not in EXTENSOES:
+        raise ValueError(f"PROFILE_MODE inválido: {PROFILE_MODE} (use 'cprofile' ou 'amostragem')")
+    return ProfilingWSGI(app, servico)
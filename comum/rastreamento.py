@@ -0,0 +1,162 @@
+"""
+Rastreamento distribuído entre os serviços, sem serviço externo.
+
+`configurar_rastreamento(app, servico)` lê o trace id da requisição (cabeçalho
+W3C `traceparent` ou `X-Trace-Id`) ou gera um novo, devolve `X-Trace-Id`,
+`traceparent` e `Server-Timing` em toda resposta e adiciona o trace id aos logs.
+As chamadas feitas com `SessaoRastreada` propagam o trace para o próximo
+serviço e entram no `Server-Timing` como tempo downstream.
+
+Com TRACE_SPANS_FILE definido, cada span (a requisição recebida e cada chamada
+feita) é gravado em JSON lines por uma thread em segundo plano; veja
+`analisar_spans.py`. Como nos logs, a fila é limitada a LOG_QUEUE_SIZE: com o
+arquivo travado os spans excedentes são descartados e contados, e o log do
+serviço avisa quantos se perderam quando a fila volta a aceitar spans.
+"""
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from flask import g, has_request_context, request
+
+from logs import EscritorLogs
+
+TRACE_SPANS_FILE = os.getenv('TRACE_SPANS_FILE', '')
+
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+# X-Trace-Id no mesmo formato do W3C, para poder virar traceparent
+TRACE_ID_VALIDO = re.compile(r'^[0-9a-f]{32}$')
+
+# Um rastreador por processo: a sessão HTTP exporta os spans de cliente por ele
+_rastreador = None
+
+
+class FormatadorSpan:
+    def format(self, span):
+        return json.dumps(span, ensure_ascii=False)
+
+
+class Rastreador:
+    def __init__(self, app, servico, arquivo=TRACE_SPANS_FILE):
+        self.servico = servico
+        self.logger = logging.getLogger(servico)
+        self.escritor = None
+        self.descartados = 0
+        self._avisados = 0
+        self._lock_descartados = threading.Lock()
+        if arquivo:
+            os.makedirs(os.path.dirname(arquivo) or '.', exist_ok=True)
+            self.escritor = EscritorLogs(FormatadorSpan(), saida=open(arquivo, 'a', encoding='utf-8'))
+
+        app.before_request(self._iniciar)
+        app.after_request(self._finalizar)
+        self.logger.addFilter(self._filtrar_log)
+
+    def _iniciar(self):
+        traceparent = TRACEPARENT.match(request.headers.get('traceparent', ''))
+        if traceparent:
+            g.trace_id, g.span_pai = traceparent.groups()
+        else:
+            trace_id = request.headers.get('X-Trace-Id', '')
+            g.trace_id = trace_id if TRACE_ID_VALIDO.match(trace_id) else secrets.token_hex(16)
+            g.span_pai = None
+        g.span_id = secrets.token_hex(8)
+        g.inicio_span = time.time()
+        g.inicio_perf = time.perf_counter()
+        # (servidor, descrição, ms) de cada chamada downstream
+        g.chamadas = []
+
+    def _finalizar(self, response):
+        if 'span_id' not in g:
+            return response
+
+        total_ms = (time.perf_counter() - g.inicio_perf) * 1000
+        downstream_ms = sum(duracao for _, _, duracao in g.chamadas)
+
+        tempos = [f'{servidor};desc="{descricao}";dur={duracao:.1f}' for servidor, descricao, duracao in g.chamadas]
+        tempos.append(f'app;desc="{self.servico}";dur={total_ms - downstream_ms:.1f}')
+        tempos.append(f'total;dur={total_ms:.1f}')
+        response.headers['Server-Timing'] = ', '.join(tempos)
+        response.headers['X-Trace-Id'] = g.trace_id
+        response.headers['traceparent'] = f'00-{g.trace_id}-{g.span_id}-01'
+
+        rota = request.url_rule.rule if request.url_rule is not None else request.path
+        self.exportar(g.span_id, g.span_pai, 'servidor', f'{request.method} {rota}', g.inicio_span,
+                      total_ms, response.status_code, downstream_ms=round(downstream_ms, 3))
+        return response
+
+    def _filtrar_log(self, record):
+        # Roda na thread da requisição, antes do registro ir para a fila
+        if has_request_context():
+            record.trace_id = g.get('trace_id')
+        return True
+
+    def exportar(self, span_id, span_pai, tipo, nome, inicio, duracao_ms, status, **extras):
+        if self.escritor is None:
+            return
+        span = {
+            'trace_id': g.trace_id,
+            'span_id': span_id,
+            'span_pai': span_pai,
+            'servico': self.servico,
+            'tipo': tipo,
+            'nome': nome,
+            'inicio': round(inicio, 6),
+            'duracao_ms': round(duracao_ms, 3),
+            'status': status,
+            **extras,
+        }
+        # Nunca bloqueia a requisição esperando o arquivo de spans
+        try:
+            self.escritor.fila.put_nowait(span)
+        except queue.Full:
+            with self._lock_descartados:
+                self.descartados += 1
+            return
+        if self.descartados > self._avisados:
+            with self._lock_descartados:
+                perdidos, self._avisados = self.descartados - self._avisados, self.descartados
+            if perdidos:
+                self.logger.warning("[TRACE] %s spans descartados com a fila cheia (%s no total)",
+                                    perdidos, self._avisados)
+
+
+class SessaoRastreada(requests.Session):
+    # requests.Session com keep-alive que, dentro de uma requisição rastreada,
+    # propaga o trace, mede a chamada e a registra como span de cliente
+    def request(self, method, url, headers=None, **kwargs):
+        if _rastreador is None or not has_request_context() or 'span_id' not in g:
+            return super().request(method, url, headers=headers, **kwargs)
+
+        span_id = secrets.token_hex(8)
+        headers = dict(headers or {})
+        headers['X-Trace-Id'] = g.trace_id
+        headers['traceparent'] = f'00-{g.trace_id}-{span_id}-01'
+
+        destino = urlsplit(url)
+        servidor = destino.hostname or 'downstream'
+        inicio = time.time()
+        inicio_perf = time.perf_counter()
+        status = 'erro'
+        try:
+            resposta = super().request(method, url, headers=headers, **kwargs)
+            status = resposta.status_code
+            return resposta
+        finally:
+            duracao_ms = (time.perf_counter() - inicio_perf) * 1000
+            g.chamadas.append((servidor, f'{method} {destino.path}', duracao_ms))
+            _rastreador.exportar(span_id, g.span_id, 'cliente', f'{method} {servidor}{destino.path}',
+                                 inicio, duracao_ms, status)
+
+
+def configurar_rastreamento(app, servico):
+    global _rastreador
+    _rastreador = Rastreador(app, servico)
+    return _rastreador
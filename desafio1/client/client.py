@@ -2,13 +2,22 @@ import requests
 import time
 from datetime import datetime
 import sys
+import os
+import json
+import math
+import argparse
+import threading
+from collections import Counter
 
 # URL do servidor (nome do serviço no docker-compose)
-SERVER_URL = "http://flask-server:8080"
+SERVER_URL = os.getenv('SERVER_URL', "http://flask-server:8080")
+
+# Sessão reaproveitada: mantém a conexão aberta (keep-alive) entre as requisições
+sessao = requests.Session()
 
 def make_request(endpoint="/"):
     try:
-        response = requests.get(f"{SERVER_URL}{endpoint}", timeout=5)
+        response = sessao.get(f"{SERVER_URL}{endpoint}", timeout=5)
         
         if response.status_code == 200:
             data = response.json()
@@ -62,8 +71,297 @@ def main():
             print(f"Total de requisições enviadas: {request_counter}")
             sys.exit(0)
 
+# ---------------------------------------------------------------------------
+# Modo benchmark: gerador de carga concorrente
+# ---------------------------------------------------------------------------
+
+# Histograma log-linear no estilo HdrHistogram: abaixo de 2^8 µs cada microssegundo
+# tem seu balde; acima, cada potência de 2 é dividida em 128 baldes (erro < 0,8%)
+SUB_BITS = 8
+SUB_BALDES = 1 << SUB_BITS
+MEIO_BALDES = SUB_BALDES // 2
+MAGNITUDES = 32
+
+PERCENTIS = (50, 75, 90, 95, 99, 99.9, 99.99, 100)
+
+class HistogramaLatencia:
+    def __init__(self):
+        # Lista pré-alocada: registrar não aloca nada no caminho quente
+        self.contagens = [0] * (SUB_BALDES + MAGNITUDES * MEIO_BALDES)
+        self.total = 0
+        self.soma_us = 0
+        self.min_us = None
+        self.max_us = 0
+
+    @staticmethod
+    def _indice(valor_us):
+        if valor_us < SUB_BALDES:
+            return valor_us
+        magnitude = valor_us.bit_length() - SUB_BITS
+        return SUB_BALDES + (magnitude - 1) * MEIO_BALDES + (valor_us >> magnitude) - MEIO_BALDES
+
+    @staticmethod
+    def _limite_superior(indice):
+        if indice < SUB_BALDES:
+            return indice
+        magnitude = (indice - SUB_BALDES) // MEIO_BALDES + 1
+        base = (indice - SUB_BALDES) % MEIO_BALDES + MEIO_BALDES
+        return ((base + 1) << magnitude) - 1
+
+    def registrar(self, segundos):
+        valor_us = int(segundos * 1_000_000)
+        indice = min(self._indice(valor_us), len(self.contagens) - 1)
+        self.contagens[indice] += 1
+        self.total += 1
+        self.soma_us += valor_us
+        if self.min_us is None or valor_us < self.min_us:
+            self.min_us = valor_us
+        if valor_us > self.max_us:
+            self.max_us = valor_us
+
+    def mesclar(self, outro):
+        for indice, contagem in enumerate(outro.contagens):
+            if contagem:
+                self.contagens[indice] += contagem
+        self.total += outro.total
+        self.soma_us += outro.soma_us
+        if outro.min_us is not None and (self.min_us is None or outro.min_us < self.min_us):
+            self.min_us = outro.min_us
+        self.max_us = max(self.max_us, outro.max_us)
+
+    def percentil_ms(self, percentil):
+        if not self.total:
+            return 0.0
+        alvo = max(1, math.ceil(percentil / 100 * self.total))
+        acumulado = 0
+        for indice, contagem in enumerate(self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                # Como no HdrHistogram: maior valor equivalente do balde, limitado ao máximo real
+                return min(self._limite_superior(indice), self.max_us) / 1000
+        return self.max_us / 1000
+
+    def baldes(self):
+        return [
+            [round(self._limite_superior(indice) / 1000, 3), contagem]
+            for indice, contagem in enumerate(self.contagens) if contagem
+        ]
+
+def classificar_erro(erro):
+    if isinstance(erro, requests.exceptions.Timeout):
+        return 'Timeout'
+    if isinstance(erro, requests.exceptions.ConnectionError):
+        return 'ConnectionError'
+    return type(erro).__name__
+
+def trabalhador(indice, config, marcos, parar, resultados):
+    # Uma sessão por worker: conexões keep-alive sem disputa entre threads
+    sessao_worker = requests.Session()
+    histograma = HistogramaLatencia()
+    status = Counter()
+    erros = Counter()
+    url = config.url.rstrip('/') + config.endpoint
+    corpo = json.loads(config.corpo) if config.corpo else None
+    inicio, inicio_medicao, fim = marcos
+    envio = 0
+
+    while not parar.is_set():
+        if config.rps:
+            # Taxa fixa (open loop): cada worker cuida de uma fatia dos horários agendados.
+            # A latência conta a partir do horário agendado, então um servidor lento
+            # não "esconde" a fila que se formou (coordinated omission).
+            agendado = inicio + (indice + envio * config.workers) / config.rps
+            envio += 1
+            if agendado >= fim:
+                break
+            espera = agendado - time.perf_counter()
+            if espera > 0 and parar.wait(espera):
+                break
+        else:
+            # Closed loop: a próxima requisição sai assim que a anterior termina
+            agendado = time.perf_counter()
+            if agendado >= fim:
+                break
+
+        medir = agendado >= inicio_medicao
+        try:
+            resposta = sessao_worker.request(config.metodo, url, json=corpo, timeout=config.timeout)
+            resposta.content
+        except requests.exceptions.RequestException as e:
+            if medir:
+                erros[classificar_erro(e)] += 1
+            continue
+
+        if medir:
+            histograma.registrar(time.perf_counter() - agendado)
+            status[resposta.status_code] += 1
+            if resposta.status_code >= 400:
+                erros[f"HTTP {resposta.status_code}"] += 1
+
+    sessao_worker.close()
+    resultados[indice] = (histograma, status, erros)
+
+def executar_benchmark(config):
+    resultados = [None] * config.workers
+    parar = threading.Event()
+    inicio = time.perf_counter() + 0.1
+    inicio_medicao = inicio + config.aquecimento
+    fim = inicio_medicao + config.duracao
+    marcos = (inicio, inicio_medicao, fim)
+
+    threads = [
+        threading.Thread(target=trabalhador, args=(i, config, marcos, parar, resultados), daemon=True)
+        for i in range(config.workers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+    except KeyboardInterrupt:
+        print("\nBenchmark interrompido, aguardando workers...")
+        parar.set()
+        for thread in threads:
+            thread.join()
+
+    duracao = max(min(time.perf_counter(), fim) - inicio_medicao, 1e-9)
+    histograma = HistogramaLatencia()
+    status = Counter()
+    erros = Counter()
+    for parcial in resultados:
+        if parcial is None:
+            continue
+        histograma.mesclar(parcial[0])
+        status.update(parcial[1])
+        erros.update(parcial[2])
+
+    respostas = sum(status.values())
+    falhas = sum(erros.values())
+    tentativas = respostas + sum(v for k, v in erros.items() if not k.startswith('HTTP '))
+
+    return {
+        'config': {
+            'url': config.url.rstrip('/') + config.endpoint,
+            'metodo': config.metodo,
+            'workers': config.workers,
+            'modo': f"taxa fixa ({config.rps} req/s)" if config.rps else 'closed loop',
+            'rps_alvo': config.rps,
+            'duracao_s': config.duracao,
+            'aquecimento_s': config.aquecimento,
+        },
+        'timestamp': datetime.now().isoformat(),
+        'requisicoes': tentativas,
+        'sucesso': tentativas - falhas,
+        'erros': falhas,
+        'duracao_s': round(duracao, 3),
+        'vazao_rps': round(respostas / duracao, 1),
+        'latencia_ms': {
+            'min': (histograma.min_us or 0) / 1000,
+            'media': round(histograma.soma_us / histograma.total / 1000, 3) if histograma.total else 0.0,
+            'p50': histograma.percentil_ms(50),
+            'p90': histograma.percentil_ms(90),
+            'p99': histograma.percentil_ms(99),
+            'p999': histograma.percentil_ms(99.9),
+            'max': histograma.max_us / 1000,
+        },
+        'distribuicao': [
+            {'percentil': p, 'latencia_ms': histograma.percentil_ms(p)} for p in PERCENTIS
+        ],
+        'status': {str(codigo): total for codigo, total in sorted(status.items())},
+        'erros_por_tipo': dict(erros.most_common()),
+        'histograma': histograma.baldes(),
+    }
+
+def imprimir_relatorio(resultado):
+    config = resultado['config']
+    latencia = resultado['latencia_ms']
+
+    print(f"\n{'='*60}")
+    print(f"BENCHMARK - {config['metodo']} {config['url']}")
+    print(f"{'='*60}")
+    print(f"Workers: {config['workers']} | Modo: {config['modo']} | Duração: {resultado['duracao_s']}s")
+    print(f"Requisições: {resultado['requisicoes']:,} | Sucesso: {resultado['sucesso']:,} | Erros: {resultado['erros']:,}")
+    print(f"Vazão: {resultado['vazao_rps']:,.1f} req/s")
+
+    print(f"\nLatência (ms):")
+    print(f"    min {latencia['min']:.3f} | média {latencia['media']:.3f} | max {latencia['max']:.3f}")
+    print(f"\n    {'percentil':>10} {'latência (ms)':>15}")
+    for linha in resultado['distribuicao']:
+        print(f"    {linha['percentil']:>9}% {linha['latencia_ms']:>15.3f}")
+
+    if resultado['status']:
+        print(f"\nStatus HTTP:")
+        for codigo, total in resultado['status'].items():
+            print(f"    {codigo:<20} {total:,}")
+
+    if resultado['erros_por_tipo']:
+        print(f"\nErros por tipo:")
+        for tipo, total in resultado['erros_por_tipo'].items():
+            print(f"    {tipo:<20} {total:,}")
+
+    print(f"{'='*60}\n")
+
+def comparar(resultado, caminho_base):
+    with open(caminho_base, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+
+    print(f"Comparação com {caminho_base} ({base.get('timestamp', 'N/A')}):")
+    print(f"    {'métrica':<14} {'base':>12} {'atual':>12} {'variação':>10}")
+    metricas = [('vazao_rps', base['vazao_rps'], resultado['vazao_rps'])]
+    metricas += [
+        (f"{nome} (ms)", base['latencia_ms'][nome], resultado['latencia_ms'][nome])
+        for nome in ('p50', 'p90', 'p99', 'p999')
+    ]
+    for nome, antes, depois in metricas:
+        variacao = f"{(depois - antes) / antes * 100:+.1f}%" if antes else 'N/A'
+        print(f"    {nome:<14} {antes:>12.3f} {depois:>12.3f} {variacao:>10}")
+    print()
+
+def main_benchmark(args):
+    if args.workers < 1 or args.duracao <= 0:
+        print("[ERRO] --workers deve ser >= 1 e --duracao > 0")
+        sys.exit(1)
+
+    modo = f"taxa fixa de {args.rps} req/s" if args.rps else "closed loop"
+    print(f"Benchmark: {args.workers} workers, {modo}, {args.duracao}s (+{args.aquecimento}s de aquecimento)")
+    print(f"Alvo: {args.metodo} {args.url.rstrip('/')}{args.endpoint}")
+
+    resultado = executar_benchmark(args)
+    imprimir_relatorio(resultado)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"[OK] Resultado salvo em {args.json}")
+
+    if args.comparar:
+        comparar(resultado, args.comparar)
+
 if __name__ == "__main__":
-    # Aguarda um pouco para garantir que o servidor esteja pronto
-    print("Aguardando servidor inicializar...")
-    time.sleep(3)
-    main()
+    parser = argparse.ArgumentParser(description="Cliente HTTP do desafio 1")
+    subcomandos = parser.add_subparsers(dest='comando')
+
+    p_bench = subcomandos.add_parser('benchmark', help="Gera carga concorrente e mede a latência")
+    p_bench.add_argument('--url', default=SERVER_URL, help="URL base do serviço")
+    p_bench.add_argument('--endpoint', default='/', help="Caminho requisitado (padrão: /)")
+    p_bench.add_argument('--metodo', default='GET', help="Método HTTP (padrão: GET)")
+    p_bench.add_argument('--corpo', help="Corpo JSON enviado em cada requisição")
+    p_bench.add_argument('--workers', type=int, default=8, help="Workers concorrentes (padrão: 8)")
+    p_bench.add_argument('--duracao', type=float, default=10, help="Duração da medição em segundos (padrão: 10)")
+    p_bench.add_argument('--aquecimento', type=float, default=1, help="Segundos iniciais descartados (padrão: 1)")
+    p_bench.add_argument('--rps', type=float, default=0, help="Taxa alvo total; 0 = closed loop (padrão)")
+    p_bench.add_argument('--timeout', type=float, default=5, help="Timeout por requisição em segundos")
+    p_bench.add_argument('--json', help="Salva o resultado completo em JSON")
+    p_bench.add_argument('--comparar', help="JSON de uma execução anterior para comparar")
+
+    args = parser.parse_args()
+
+    if args.comando == 'benchmark':
+        main_benchmark(args)
+    else:
+        # Aguarda um pouco para garantir que o servidor esteja pronto
+        print("Aguardando servidor inicializar...")
+        time.sleep(3)
+        main()
@@ -1,28 +1,42 @@
 from flask import Flask, jsonify
 from datetime import datetime
+import multiprocessing
 import os
+from metricas import instrumentar
+from logs import configurar_logs
+from profiling import configurar_profiling
 
 app = Flask(__name__)
 
-# Contador de requisições
-request_count = 0
+logger = configurar_logs('flask-server')
+
+# Modo de execução: 'dev' (servidor de desenvolvimento do Flask) ou 'producao' (Gunicorn prefork)
+SERVER_MODE = os.getenv('SERVER_MODE', 'dev')
+WEB_WORKERS = int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count()))
+WEB_THREADS = int(os.getenv('WEB_THREADS', 4))
+GRACEFUL_TIMEOUT = int(os.getenv('GRACEFUL_TIMEOUT', 30))
+
+# Contador de requisições em memória compartilhada: criado antes do fork,
+# é o mesmo para todos os workers (o lock garante a numeração sem repetição)
+request_count = multiprocessing.Value('Q', 0)
 
 @app.route('/')
 def home():
-    global request_count
-    request_count += 1
+    with request_count.get_lock():
+        request_count.value += 1
+        request_number = request_count.value
     
     response_data = {
         'message': 'Servidor Flask em andamento!',
         'timestamp': datetime.now().isoformat(),
-        'request_number': request_count,
+        'request_number': request_number,
         'container_name': os.getenv('HOSTNAME', 'unknown'),
         'status': 'running',
         'port': 8080
     }
     
-    # Log no servidor
-    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Requisição #{request_count} recebida")
+    # Log no servidor (formatado e gravado pela thread de logs, fora da requisição)
+    logger.info("Requisição #%s recebida (worker %s)", request_number, os.getpid())
     
     return jsonify(response_data), 200
 
@@ -39,11 +53,47 @@ def health():
 @app.route('/stats')
 def stats():
     return jsonify({
-        'total_requests': request_count,
+        'total_requests': request_count.value,
         'uptime_message': 'Server is running',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': datetime.now().isoformat(),
+        'mode': SERVER_MODE,
+        'worker_pid': os.getpid()
     }), 200
 
+# Profiling sob demanda em /debug/profiles (comum/profiling.py)
+configurar_profiling(app, 'flask-server')
+
+# Métricas HTTP em /metrics (comum/metricas.py)
+instrumentar(app, 'flask-server')
+
+def run_producao():
+    from gunicorn.app.base import BaseApplication
+
+    class ServidorProducao(BaseApplication):
+        # O app é carregado no processo mestre e herdado pelos workers no fork,
+        # junto com o contador em memória compartilhada
+        def load_config(self):
+            for chave, valor in {
+                'bind': '0.0.0.0:8080',
+                'workers': WEB_WORKERS,
+                'worker_class': 'gthread',
+                'threads': WEB_THREADS,
+                # SIGTERM (docker stop): para de aceitar conexões e espera as requisições em andamento
+                'graceful_timeout': GRACEFUL_TIMEOUT,
+                'keepalive': 5,
+                'accesslog': None,
+            }.items():
+                self.cfg.set(chave, valor)
+
+        def load(self):
+            return app
+
+    logger.info("Começando servidor Flask (Gunicorn) na porta 8080 com %s workers x %s threads...", WEB_WORKERS, WEB_THREADS)
+    ServidorProducao().run()
+
 if __name__ == '__main__':
-    print("Começando servidor Flask na porta 8080...")
-    app.run(host='0.0.0.0', port=8080, debug=True)
\ No newline at end of file
+    if SERVER_MODE == 'producao':
+        run_producao()
+    else:
+        logger.info("Começando servidor Flask na porta 8080...")
+        app.run(host='0.0.0.0', port=8080, debug=True)
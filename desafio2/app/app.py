@@ -1,86 +1,274 @@
 import psycopg2
+import argparse
+import csv
+import io
+import json
+import re
 import time
 import sys
 from datetime import datetime
+from itertools import islice
 
-DB_CONFIG = {
-    'host': 'postgres-db',
-    'database': 'rpg_db',
-    'user': 'mestre',
-    'password': 'dado20'
+from db import Banco
+from esquema import garantir_esquema
+
+COLUNAS_PERSONAGEM = ('nome', 'classe', 'raca', 'nivel', 'pontos_vida', 'forca', 'destreza', 'inteligencia')
+VALORES_PADRAO = {'nivel': 1, 'forca': 10, 'destreza': 10, 'inteligencia': 10}
+# NOT NULL sem DEFAULT na tabela: sem elas o COPY falharia com NotNullViolation
+COLUNAS_OBRIGATORIAS = tuple(coluna for coluna in COLUNAS_PERSONAGEM if coluna not in VALORES_PADRAO)
+
+COPY_PERSONAGENS_SQL = f"COPY personagens ({', '.join(COLUNAS_PERSONAGEM)}) FROM STDIN WITH (FORMAT csv)"
+INSERT_PERSONAGENS_SQL = f"INSERT INTO personagens ({', '.join(COLUNAS_PERSONAGEM)}) VALUES %s"
+
+# `nivel` aceita NULL: ordenação e cursor usam COALESCE(nivel, 0), como o índice
+# idx_personagens_listagem, para que personagens sem nível não sumam das páginas
+LISTAR_SQL = "SELECT * FROM personagens ORDER BY COALESCE(nivel, 0) DESC, id"
+
+# Preparadas uma vez por conexão do pool; o plano é reaproveitado em cada EXECUTE
+CONSULTAS_PREPARADAS = {
+    'inserir_personagem': f"""INSERT INTO personagens ({', '.join(COLUNAS_PERSONAGEM)})
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8)""",
+    'listar_personagens': LISTAR_SQL,
+    # Paginação por keyset em (COALESCE(nivel, 0) DESC, id), coberta por idx_personagens_listagem
+    'primeira_pagina_personagens': f"{LISTAR_SQL} LIMIT $1",
+    'pagina_personagens': """SELECT * FROM personagens
+        WHERE COALESCE(nivel, 0) <= $1 AND (COALESCE(nivel, 0) < $1 OR id > $2)
+        ORDER BY COALESCE(nivel, 0) DESC, id
+        LIMIT $3""",
+    'contar_personagens': "SELECT total FROM resumo_personagens WHERE dimensao = 'total' AND valor = ''",
 }
 
-def conectar_banco():
-    tentativas = 0
-    while tentativas < 5:
-        try:
-            conn = psycopg2.connect(**DB_CONFIG)
-            print("[OK] Conectado ao banco de dados RPG!")
-            return conn
-        except psycopg2.OperationalError:
-            tentativas += 1
-            print(f"[AGUARDANDO] Banco inicializando... (tentativa {tentativas}/5)")
-            time.sleep(2)
-    
-    print("[ERRO] Não foi possível conectar ao banco!")
-    sys.exit(1)
-
-def listar_personagens(conn):
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM personagens ORDER BY nivel DESC, id")
-    personagens = cursor.fetchall()
+def criar_banco(migrar=True, **kwargs):
+    banco = Banco(**kwargs)
+    if migrar:
+        # Antes dos PREPARE: as consultas preparadas dependem de resumo_personagens
+        garantir_esquema(banco)
+    for nome, sql in CONSULTAS_PREPARADAS.items():
+        banco.preparar(nome, sql)
+    return banco
+
+def iterar_personagens(banco, itersize=2000):
+    # Cursor nomeado (server-side): o PostgreSQL envia `itersize` linhas por vez,
+    # então a memória do cliente não depende do tamanho da tabela
+    return banco.cursor_servidor('stream_personagens', LISTAR_SQL, itersize=itersize)
+
+def pagina_personagens(banco, limite=50, apos=None):
+    # `apos` é o (nivel, id) do último personagem da página anterior
+    if apos is None:
+        personagens = banco.executar('primeira_pagina_personagens', params=(limite,), buscar='todos')
+    else:
+        nivel, char_id = apos
+        personagens = banco.executar('pagina_personagens', params=(nivel, char_id, limite), buscar='todos')
+    
+    proximo = (personagens[-1][4] or 0, personagens[-1][0]) if len(personagens) == limite else None
+    return personagens, proximo
+
+def _imprimir_personagem(char):
+    print(f"\n[{char[0]}] {char[1]}")
+    print(f"    Classe: {char[2]} | Raça: {char[3]} | Nível: {char[4]}")
+    print(f"    Vida: {char[5]} | FOR: {char[6]} | DES: {char[7]} | INT: {char[8]}")
+
+def listar_personagens(banco, streaming=False, itersize=2000):
+    if streaming:
+        personagens = iterar_personagens(banco, itersize)
+    else:
+        personagens = banco.executar('listar_personagens', buscar='todos')
     
     print("\n" + "="*80)
     print("FICHA DE PERSONAGENS - RPG DE MESA")
     print("="*80)
     
-    if personagens:
-        for char in personagens:
-            print(f"\n[{char[0]}] {char[1]}")
-            print(f"    Classe: {char[2]} | Raça: {char[3]} | Nível: {char[4]}")
-            print(f"    Vida: {char[5]} | FOR: {char[6]} | DES: {char[7]} | INT: {char[8]}")
-    else:
+    encontrados = 0
+    for char in personagens:
+        _imprimir_personagem(char)
+        encontrados += 1
+    
+    if not encontrados:
         print("Nenhum personagem criado ainda.")
     
     print("\n" + "="*80 + "\n")
-    cursor.close()
-
-def criar_personagem(conn, nome, classe, raca, nivel, vida, forca, destreza, inteligencia):
-    cursor = conn.cursor()
-    cursor.execute(
-        """INSERT INTO personagens 
-           (nome, classe, raca, nivel, pontos_vida, forca, destreza, inteligencia) 
-           VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
-        (nome, classe, raca, nivel, vida, forca, destreza, inteligencia)
+
+def listar_pagina(banco, limite, apos=None):
+    personagens, proximo = pagina_personagens(banco, limite, apos)
+    
+    print("\n" + "="*80)
+    print(f"FICHA DE PERSONAGENS - PÁGINA ({len(personagens)} personagens)")
+    print("="*80)
+    for char in personagens:
+        _imprimir_personagem(char)
+    print("\n" + "="*80)
+    if proximo:
+        print(f"Próxima página: --apos {proximo[0]}:{proximo[1]}\n")
+    else:
+        print("Última página.\n")
+
+def criar_personagem(banco, nome, classe, raca, nivel, vida, forca, destreza, inteligencia):
+    banco.executar(
+        'inserir_personagem',
+        params=(nome, classe, raca, nivel, vida, forca, destreza, inteligencia),
+        idempotente=False
     )
-    conn.commit()
     print(f"[SUCESSO] Personagem '{nome}' criado com sucesso!")
-    cursor.close()
 
-def contar_personagens(conn):
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM personagens")
-    total = cursor.fetchone()[0]
-    cursor.close()
+def criar_personagens(banco, personagens, page_size=1000):
+    # Várias linhas por INSERT (execute_values) em uma única transação
+    banco.executar_lote('inserir_personagens_lote', INSERT_PERSONAGENS_SQL, personagens, page_size=page_size)
+
+# Totais reais, usados só na reconciliação (varre a tabela inteira)
+RESUMO_REAL_SQL = """
+    SELECT d.dimensao, d.valor, COUNT(*)
+    FROM personagens,
+         LATERAL (VALUES ('total', ''), ('classe', classe), ('raca', raca),
+                         ('faixa_nivel', faixa_nivel(nivel))) AS d (dimensao, valor)
+    GROUP BY d.dimensao, d.valor
+"""
+
+def contar_personagens(banco):
+    # Lê o contador mantido pelos triggers em vez de COUNT(*) na tabela
+    linha = banco.executar('contar_personagens', buscar='um')
+    return linha[0] if linha else 0
+
+def obter_resumo(banco):
+    linhas = banco.executar('obter_resumo', """
+        SELECT dimensao, valor, total FROM resumo_personagens
+        WHERE dimensao <> 'total' AND total > 0
+        ORDER BY dimensao, total DESC, valor
+    """, buscar='todos')
+    resumo = {}
+    for dimensao, valor, total in linhas:
+        resumo.setdefault(dimensao, {})[valor] = total
+    return resumo
+
+def exibir_resumo(banco):
+    print("\n" + "="*80)
+    print(f"RESUMO DA CAMPANHA - {contar_personagens(banco)} personagens")
+    print("="*80)
+    resumo = obter_resumo(banco)
+    for dimensao, titulo in (('classe', 'Por classe'), ('raca', 'Por raça'), ('faixa_nivel', 'Por faixa de nível')):
+        print(f"\n{titulo}:")
+        for valor, total in resumo.get(dimensao, {}).items():
+            print(f"    {valor:<20} {total}")
+    print("\n" + "="*80 + "\n")
+
+def reconciliar_resumo(banco):
+    with banco.cronometrar('reconciliar_resumo'), banco.conexao() as conn:
+        cursor = conn.cursor()
+        # Bloqueia escritas (leituras continuam) para comparar com uma foto estável da tabela
+        cursor.execute("LOCK TABLE personagens IN SHARE ROW EXCLUSIVE MODE")
+        
+        cursor.execute(RESUMO_REAL_SQL)
+        real = {(dimensao, valor): total for dimensao, valor, total in cursor.fetchall()}
+        cursor.execute("SELECT dimensao, valor, total FROM resumo_personagens")
+        atual = {(dimensao, valor): total for dimensao, valor, total in cursor.fetchall()}
+        
+        divergencias = [
+            (chave, atual.get(chave, 0), real.get(chave, 0))
+            for chave in sorted(set(real) | set(atual))
+            if atual.get(chave, 0) != real.get(chave, 0)
+        ]
+        
+        for (dimensao, valor), antes, depois in divergencias:
+            print(f"[RECONCILIAÇÃO] {dimensao}={valor!r}: {antes} → {depois}")
+            cursor.execute(
+                """INSERT INTO resumo_personagens (dimensao, valor, total) VALUES (%s, %s, %s)
+                   ON CONFLICT (dimensao, valor) DO UPDATE SET total = EXCLUDED.total""",
+                (dimensao, valor, depois)
+            )
+        cursor.execute("DELETE FROM resumo_personagens WHERE total = 0 AND dimensao <> 'total'")
+        cursor.close()
+    
+    if divergencias:
+        print(f"[SUCESSO] {len(divergencias)} contadores corrigidos")
+    else:
+        print("[OK] Resumo consistente com a tabela de personagens")
+    return divergencias
+
+def ler_personagens(caminho):
+    # Gerador: o arquivo é lido linha a linha, nunca carregado inteiro na memória.
+    # ValueError para cabeçalho sem colunas obrigatórias ou registro sem valor nelas.
+    with open(caminho, 'r', encoding='utf-8', newline='') as f:
+        if caminho.endswith(('.jsonl', '.ndjson')):
+            registros = (json.loads(linha) for linha in f if linha.strip())
+        else:
+            registros = csv.DictReader(f)
+            faltando = [coluna for coluna in COLUNAS_OBRIGATORIAS if coluna not in (registros.fieldnames or ())]
+            if faltando:
+                raise ValueError(f"{caminho}: cabeçalho sem as colunas obrigatórias {', '.join(faltando)}")
+        
+        for numero, registro in enumerate(registros, start=1):
+            vazias = [coluna for coluna in COLUNAS_OBRIGATORIAS if registro.get(coluna) in (None, '')]
+            if vazias:
+                raise ValueError(f"{caminho}: registro {numero} sem valor em {', '.join(vazias)}")
+            yield tuple(
+                registro[coluna] if registro.get(coluna) not in (None, '') else VALORES_PADRAO.get(coluna)
+                for coluna in COLUNAS_PERSONAGEM
+            )
+
+def _copiar_lote(banco, lote):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(lote)
+    buffer.seek(0)
+    with banco.cronometrar('copy_personagens'), banco.conexao() as conn:
+        cursor = conn.cursor()
+        cursor.copy_expert(COPY_PERSONAGENS_SQL, buffer)
+        cursor.close()
+
+def _registro_recusado(erro, importados, tamanho_lote):
+    # O COPY informa a linha do lote no contexto do erro ("COPY personagens, line 3, column nivel: ...")
+    linha = re.search(r'line (\d+)', erro.diag.context or '')
+    if linha:
+        return f"registro {importados + int(linha.group(1))} recusado pelo banco"
+    return f"lote dos registros {importados + 1} a {importados + tamanho_lote} recusado pelo banco"
+
+def importar_personagens(banco, caminho, tamanho_lote=10000, usar_copy=True):
+    linhas = ler_personagens(caminho)
+    total = 0
+    inicio = time.monotonic()
+    
+    print(f"[IMPORTAÇÃO] Lendo {caminho} em lotes de {tamanho_lote} ({'COPY' if usar_copy else 'INSERT multi-linha'})")
+    
+    while True:
+        lote = list(islice(linhas, tamanho_lote))
+        if not lote:
+            break
+        
+        try:
+            if usar_copy:
+                try:
+                    _copiar_lote(banco, lote)
+                except (psycopg2.NotSupportedError, psycopg2.errors.InsufficientPrivilege) as e:
+                    # COPY bloqueado (ex.: pooler ou permissões): segue com INSERT em lote
+                    usar_copy = False
+                    print(f"[AVISO] COPY indisponível ({e.pgerror or e}), usando INSERT multi-linha")
+            if not usar_copy:
+                criar_personagens(banco, lote)
+        except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+            # Valor que o banco recusa (ex.: "abc" em nivel): o lote inteiro foi desfeito
+            raise ValueError(f"{caminho}: {_registro_recusado(e, total, len(lote))}: "
+                             f"{e.diag.message_primary or e}") from e
+        
+        total += len(lote)
+        decorrido = time.monotonic() - inicio
+        print(f"[IMPORTAÇÃO] {total} personagens importados ({total / decorrido:,.0f} linhas/s)", flush=True)
+    
+    decorrido = time.monotonic() - inicio
+    print(f"[SUCESSO] {total} personagens importados em {decorrido:.1f}s")
     return total
 
-def main():
+def demonstracao(banco):
     print("\n" + "="*80)
     print("SISTEMA DE GERENCIAMENTO DE PERSONAGENS - RPG DE MESA")
     print("="*80)
     print(f"Data/Hora: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
     
-    # Conecta ao banco
-    conn = conectar_banco()
-    
     # Lista personagens existentes
     print("\nPersonagens cadastrados:")
-    listar_personagens(conn)
+    listar_personagens(banco)
     
     # Cria um novo personagem
     print("Criando novo personagem...\n")
     criar_personagem(
-        conn,
+        banco,
         nome="Kael Brasas Ardentes",
         classe="Paladino",
         raca="Humano",
@@ -93,17 +281,75 @@ def main():
     
     # Lista novamente
     print("\nLista atualizada de personagens:")
-    listar_personagens(conn)
+    listar_personagens(banco)
     
     # Mostra total
-    total = contar_personagens(conn)
+    total = contar_personagens(banco)
     print(f"Total de personagens na campanha: {total}\n")
     
-    # Fecha conexão
-    conn.close()
-    print("[INFO] Conexão com banco encerrada.")
+    # Resumo por classe, raça e nível (tabela mantida por triggers)
+    exibir_resumo(banco)
+    
     print("\nOs personagens foram salvos no volume Docker!")
     print("Mesmo se remover o container, os dados persistem.\n")
 
+def exibir_tempos(banco):
+    print("[INFO] Tempo por consulta:")
+    for nome, t in sorted(banco.estatisticas().items()):
+        print(f"    {nome:<30} {t['chamadas']:>6}x  média {t['media_ms']:8.2f} ms  máx {t['max_ms']:8.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description='Gerenciamento de personagens de RPG de mesa')
+    subcomandos = parser.add_subparsers(dest='comando')
+    
+    importar = subcomandos.add_parser('importar', help='Importa personagens de um arquivo CSV ou JSONL')
+    importar.add_argument('arquivo', help='Arquivo .csv (com cabeçalho) ou .jsonl')
+    importar.add_argument('--lote', type=int, default=10000, help='Linhas por lote (padrão: 10000)')
+    importar.add_argument('--sem-copy', action='store_true', help='Usa INSERT multi-linha em vez de COPY')
+    
+    listar = subcomandos.add_parser('listar', help='Lista personagens')
+    listar.add_argument('--stream', action='store_true', help='Usa cursor do lado do servidor (memória constante)')
+    listar.add_argument('--itersize', type=int, default=2000, help='Linhas por ida ao servidor no modo --stream')
+    listar.add_argument('--limite', type=int, help='Lista só uma página com este tamanho')
+    listar.add_argument('--apos', help='Cursor NIVEL:ID da página anterior')
+    
+    subcomandos.add_parser('resumo', help='Totais por classe, raça e faixa de nível')
+    subcomandos.add_parser('reconciliar', help='Recalcula o resumo a partir da tabela e corrige divergências')
+    
+    args = parser.parse_args()
+    
+    # Conecta ao banco (pool com reconexão por backoff exponencial)
+    try:
+        banco = criar_banco()
+    except psycopg2.OperationalError:
+        print("[ERRO] Não foi possível conectar ao banco!")
+        sys.exit(1)
+    
+    if args.comando == 'importar':
+        try:
+            importar_personagens(banco, args.arquivo, tamanho_lote=args.lote, usar_copy=not args.sem_copy)
+        except ValueError as e:
+            # Lotes anteriores ao registro inválido já foram gravados (um commit por lote)
+            print(f"[ERRO] Importação interrompida: {e}")
+            banco.fechar()
+            sys.exit(1)
+    elif args.comando == 'listar' and args.limite:
+        apos = tuple(int(v) for v in args.apos.split(':')) if args.apos else None
+        listar_pagina(banco, args.limite, apos)
+    elif args.comando == 'listar':
+        listar_personagens(banco, streaming=args.stream, itersize=args.itersize)
+    elif args.comando == 'resumo':
+        exibir_resumo(banco)
+    elif args.comando == 'reconciliar':
+        reconciliar_resumo(banco)
+    else:
+        demonstracao(banco)
+    
+    exibir_tempos(banco)
+    
+    # Fecha as conexões do pool
+    banco.fechar()
+    print("[INFO] Conexão com banco encerrada.")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,140 @@
+"""
+Benchmark da listagem de personagens: pico de memória (RSS) e tempo até a
+primeira linha para fetchall(), cursor do lado do servidor e keyset.
+
+Os dados ficam num schema separado (`benchmark`), então a tabela real de
+personagens não é tocada. Cada medição roda num subprocesso para que o pico
+de RSS de um modo não contamine o próximo.
+
+Uso (dentro do container da aplicação):
+    python benchmark_listagem.py                      # 10k, 1M e 10M linhas
+    python benchmark_listagem.py --tamanhos 10000 100000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from app import criar_banco, iterar_personagens, pagina_personagens
+
+SCHEMA = 'benchmark'
+MODOS = ('fetchall', 'stream', 'keyset')
+
+
+def preparar_schema(banco):
+    with banco.conexao() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+        cursor.execute(f"CREATE TABLE {SCHEMA}.personagens (LIKE public.personagens INCLUDING ALL)")
+        # Só para as consultas preparadas da aplicação compilarem com search_path=benchmark
+        cursor.execute(f"CREATE TABLE {SCHEMA}.resumo_personagens (LIKE public.resumo_personagens INCLUDING ALL)")
+        cursor.close()
+
+
+def popular_ate(banco, atual, alvo):
+    # generate_series roda no servidor: nenhuma linha passa pelo Python.
+    # O id vem explícito para não consumir a sequence da tabela real.
+    with banco.conexao() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            INSERT INTO {SCHEMA}.personagens (id, nome, classe, raca, nivel, pontos_vida, forca, destreza, inteligencia)
+            SELECT g, 'Aventureiro ' || g,
+                   (ARRAY['Guerreiro', 'Mago', 'Ladino', 'Paladino'])[1 + mod(g, 4)],
+                   (ARRAY['Humano', 'Elfo', 'Anão', 'Halfling'])[1 + mod(g, 4)],
+                   1 + mod(g, 20), 10 + mod(g, 90), 8 + mod(g, 11), 8 + mod(g, 11), 8 + mod(g, 11)
+            FROM generate_series(%s, %s) AS g
+        """, (atual + 1, alvo))
+        cursor.execute(f"ANALYZE {SCHEMA}.personagens")
+        cursor.close()
+
+
+def medir(modo, itersize, tamanho_pagina):
+    # Sem migração: com search_path=benchmark ela criaria triggers no schema do benchmark
+    banco = criar_banco(migrar=False, maxconn=1)
+    inicio = time.perf_counter()
+    primeira = None
+    linhas = 0
+
+    if modo == 'fetchall':
+        for _ in banco.executar('listar_personagens', buscar='todos'):
+            if primeira is None:
+                primeira = time.perf_counter() - inicio
+            linhas += 1
+    elif modo == 'stream':
+        for _ in iterar_personagens(banco, itersize):
+            if primeira is None:
+                primeira = time.perf_counter() - inicio
+            linhas += 1
+    else:
+        apos = None
+        while True:
+            pagina, apos = pagina_personagens(banco, tamanho_pagina, apos)
+            if primeira is None and pagina:
+                primeira = time.perf_counter() - inicio
+            linhas += len(pagina)
+            if apos is None:
+                break
+
+    total = time.perf_counter() - inicio
+    banco.fechar()
+    return {
+        'modo': modo,
+        'linhas': linhas,
+        'primeira_linha_ms': round((primeira or 0) * 1000, 1),
+        'total_s': round(total, 2),
+        # ru_maxrss vem em KiB no Linux
+        'pico_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+
+def medir_em_subprocesso(modo, itersize, tamanho_pagina):
+    env = dict(os.environ, PGOPTIONS=f"-c search_path={SCHEMA}")
+    saida = subprocess.run(
+        [sys.executable, __file__, '--medir', modo,
+         '--itersize', str(itersize), '--pagina', str(tamanho_pagina)],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument('--itersize', type=int, default=2000)
+    parser.add_argument('--pagina', type=int, default=1000, help='Tamanho da página no modo keyset')
+    parser.add_argument('--modos', nargs='+', choices=MODOS, default=list(MODOS))
+    parser.add_argument('--medir', choices=MODOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        print(json.dumps(medir(args.medir, args.itersize, args.pagina)))
+        return
+
+    banco = criar_banco()
+    preparar_schema(banco)
+
+    print(f"\n{'linhas':>12} {'modo':>10} {'1ª linha (ms)':>14} {'total (s)':>10} {'pico RSS (MB)':>14}")
+    print("-" * 64)
+    atual = 0
+    resultados = []
+    for tamanho in sorted(args.tamanhos):
+        popular_ate(banco, atual, tamanho)
+        atual = tamanho
+        for modo in args.modos:
+            r = medir_em_subprocesso(modo, args.itersize, args.pagina)
+            resultados.append(r)
+            print(f"{r['linhas']:>12,} {modo:>10} {r['primeira_linha_ms']:>14} {r['total_s']:>10} {r['pico_rss_mb']:>14}")
+
+    with banco.conexao() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+        cursor.close()
+    banco.fechar()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Camada de acesso ao banco de RPG: pool de conexões, reconexão com backoff
+exponencial + jitter, prepared statements, escrita em lote e tempo por consulta.
+"""
+import os
+import random
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'postgres-db'),
+    'database': os.getenv('DB_NAME', 'rpg_db'),
+    'user': os.getenv('DB_USER', 'mestre'),
+    'password': os.getenv('DB_PASSWORD', 'dado20')
+}
+
+POOL_MIN = int(os.getenv('DB_POOL_MIN', 1))
+POOL_MAX = int(os.getenv('DB_POOL_MAX', 10))
+TENTATIVAS_MAX = int(os.getenv('DB_RETRY_MAX', 8))
+BACKOFF_BASE = float(os.getenv('DB_RETRY_BASE', 0.5))
+BACKOFF_TETO = float(os.getenv('DB_RETRY_MAX_DELAY', 15))
+
+# Erros de conexão (banco reiniciando, rede): vale a pena tentar de novo
+ERROS_TRANSITORIOS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+def espera_backoff(tentativa):
+    # "Full jitter": sorteia entre 0 e o teto exponencial para não sincronizar clientes
+    return random.uniform(0, min(BACKOFF_TETO, BACKOFF_BASE * 2 ** tentativa))
+
+
+class Banco:
+    def __init__(self, config=None, minconn=POOL_MIN, maxconn=POOL_MAX):
+        self.config = config or DB_CONFIG
+        self._preparadas = {}
+        # conexão -> nomes já preparados na sessão dela; some junto com a conexão
+        # (um backend_pid pode ser reaproveitado por uma sessão nova, sem os PREPARE)
+        self._sessoes_preparadas = weakref.WeakKeyDictionary()
+        self._tempos = {}
+        self._tempos_lock = threading.Lock()
+        self._pool = self._criar_pool(minconn, maxconn)
+
+    def _criar_pool(self, minconn, maxconn):
+        for tentativa in range(TENTATIVAS_MAX):
+            try:
+                pool = ThreadedConnectionPool(minconn, maxconn, **self.config)
+                print("[OK] Conectado ao banco de dados RPG!")
+                return pool
+            except psycopg2.OperationalError:
+                espera = espera_backoff(tentativa)
+                print(f"[AGUARDANDO] Banco inicializando... (tentativa {tentativa + 1}/{TENTATIVAS_MAX}, "
+                      f"nova tentativa em {espera:.1f}s)")
+                time.sleep(espera)
+        raise psycopg2.OperationalError(f"Não foi possível conectar ao banco após {TENTATIVAS_MAX} tentativas")
+
+    def fechar(self):
+        self._pool.closeall()
+
+    def preparar(self, nome, sql):
+        # `sql` usa parâmetros posicionais do PostgreSQL ($1, $2, ...).
+        # O PREPARE roda uma vez por sessão, na primeira vez que a conexão executa `nome`:
+        # um objeto ausente no banco só falha os comandos que o usam.
+        self._preparadas[nome] = sql
+        self._sessoes_preparadas.clear()
+
+    def _garantir_preparada(self, conn, nome):
+        preparadas = self._sessoes_preparadas.setdefault(conn, set())
+        if nome in preparadas:
+            return
+        cursor = conn.cursor()
+        cursor.execute(f"PREPARE {nome} AS {self._preparadas[nome]}")
+        cursor.close()
+        preparadas.add(nome)
+
+    @contextmanager
+    def conexao(self):
+        conn = self._pool.getconn()
+        descartar = False
+        try:
+            yield conn
+            conn.commit()
+        except ERROS_TRANSITORIOS:
+            descartar = True
+            self._sessoes_preparadas.pop(conn, None)
+            raise
+        except BaseException:
+            # BaseException: inclui GeneratorExit de um cursor_servidor abandonado no meio
+            conn.rollback()
+            raise
+        finally:
+            # Conexões quebradas são fechadas em vez de voltar para o pool
+            self._pool.putconn(conn, close=descartar or conn.closed != 0)
+
+    @contextmanager
+    def cronometrar(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._registrar_tempo(nome, (time.perf_counter() - inicio) * 1000)
+
+    def _registrar_tempo(self, nome, ms):
+        with self._tempos_lock:
+            tempo = self._tempos.setdefault(nome, {'chamadas': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            tempo['chamadas'] += 1
+            tempo['total_ms'] += ms
+            tempo['max_ms'] = max(tempo['max_ms'], ms)
+
+    def estatisticas(self):
+        with self._tempos_lock:
+            return {
+                nome: dict(t, media_ms=t['total_ms'] / t['chamadas'])
+                for nome, t in self._tempos.items()
+            }
+
+    def executar(self, nome, sql=None, params=(), buscar=None, idempotente=True):
+        # Sem `sql`, executa o prepared statement `nome`.
+        # buscar: None (só executa), 'um' (fetchone) ou 'todos' (fetchall)
+        preparada = sql is None
+        if preparada:
+            sql = f"EXECUTE {nome} ({', '.join(['%s'] * len(params))})" if params else f"EXECUTE {nome}"
+
+        tentativas = TENTATIVAS_MAX if idempotente else 1
+        for tentativa in range(tentativas):
+            try:
+                with self.cronometrar(nome), self.conexao() as conn:
+                    if preparada:
+                        self._garantir_preparada(conn, nome)
+                    cursor = conn.cursor()
+                    cursor.execute(sql, params)
+                    if buscar == 'um':
+                        resultado = cursor.fetchone()
+                    elif buscar == 'todos':
+                        resultado = cursor.fetchall()
+                    else:
+                        resultado = cursor.rowcount
+                    cursor.close()
+                    return resultado
+            except ERROS_TRANSITORIOS:
+                if tentativa + 1 == tentativas:
+                    raise
+                espera = espera_backoff(tentativa)
+                print(f"[AVISO] Conexão perdida em '{nome}', nova tentativa em {espera:.1f}s")
+                time.sleep(espera)
+
+    def executar_lote(self, nome, sql, linhas, page_size=1000):
+        # `sql` no formato do execute_values: "INSERT ... VALUES %s"
+        with self.cronometrar(nome), self.conexao() as conn:
+            cursor = conn.cursor()
+            execute_values(cursor, sql, linhas, page_size=page_size)
+            cursor.close()
+
+    def cursor_servidor(self, nome, sql, params=(), itersize=2000):
+        # Cursor nomeado: a conexão fica reservada até o gerador terminar
+        with self.cronometrar(nome), self.conexao() as conn:
+            cursor = conn.cursor(name=nome)
+            cursor.itersize = itersize
+            cursor.execute(sql, params)
+            try:
+                yield from cursor
+            finally:
+                cursor.close()
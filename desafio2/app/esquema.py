@@ -0,0 +1,115 @@
+"""
+Estruturas criadas depois da tabela `personagens` (índice da listagem, resumo
+mantido por triggers), aplicadas a cada inicialização da aplicação.
+
+O `rpg_db.sql` só roda quando o volume `dados_postgres` está vazio; instalações
+que já tinham dados nunca o reexecutam. Por isso tudo aqui é idempotente
+(`IF NOT EXISTS`, `CREATE OR REPLACE`) e roda em uma única transação, sob um
+advisory lock para que dois containers subindo juntos não disputem o DDL.
+Quando `resumo_personagens` acaba de ser criada (ou está vazia) e já existem
+personagens, os totais são preenchidos a partir da tabela.
+"""
+
+# Chave arbitrária do pg_advisory_xact_lock que serializa a migração
+TRAVA_ESQUEMA = 7_240_033
+
+ESQUEMA_SQL = """
+-- Índice da listagem ordenada e da paginação por keyset em (COALESCE(nivel, 0) DESC, id).
+-- Substitui o idx_personagens_nivel_id de versões anteriores, em `nivel` puro,
+-- que não cobria personagens sem nível.
+DROP INDEX IF EXISTS idx_personagens_nivel_id;
+CREATE INDEX IF NOT EXISTS idx_personagens_listagem ON personagens ((COALESCE(nivel, 0)) DESC, id);
+
+-- Resumo mantido por triggers: total geral e totais por classe, raça e faixa de nível.
+-- Contagens viram leitura de poucas linhas em vez de COUNT(*) na tabela inteira.
+CREATE TABLE IF NOT EXISTS resumo_personagens (
+    dimensao VARCHAR(20) NOT NULL,   -- 'total', 'classe', 'raca' ou 'faixa_nivel'
+    valor VARCHAR(50) NOT NULL,      -- '' para 'total'
+    total BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (dimensao, valor)
+);
+
+-- Faixas de 5 níveis: 1-5, 6-10, 11-15, ...
+CREATE OR REPLACE FUNCTION faixa_nivel(nivel INTEGER) RETURNS VARCHAR AS $$
+    SELECT COALESCE(((nivel - 1) / 5 * 5 + 1) || '-' || ((nivel - 1) / 5 * 5 + 5), 'sem nível')
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Triggers por comando (não por linha) com tabelas de transição: um COPY de
+-- milhões de linhas gera um único UPSERT agregado no resumo
+CREATE OR REPLACE FUNCTION atualizar_resumo_personagens() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        UPDATE resumo_personagens SET total = 0;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        INSERT INTO resumo_personagens (dimensao, valor, total)
+        SELECT d.dimensao, d.valor, -COUNT(*)
+        FROM antigos,
+             LATERAL (VALUES ('total', ''), ('classe', antigos.classe), ('raca', antigos.raca),
+                             ('faixa_nivel', faixa_nivel(antigos.nivel))) AS d (dimensao, valor)
+        GROUP BY d.dimensao, d.valor
+        ON CONFLICT (dimensao, valor) DO UPDATE SET total = resumo_personagens.total + EXCLUDED.total;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO resumo_personagens (dimensao, valor, total)
+        SELECT d.dimensao, d.valor, COUNT(*)
+        FROM novos,
+             LATERAL (VALUES ('total', ''), ('classe', novos.classe), ('raca', novos.raca),
+                             ('faixa_nivel', faixa_nivel(novos.nivel))) AS d (dimensao, valor)
+        GROUP BY d.dimensao, d.valor
+        ON CONFLICT (dimensao, valor) DO UPDATE SET total = resumo_personagens.total + EXCLUDED.total;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_resumo_personagens_insert
+    AFTER INSERT ON personagens REFERENCING NEW TABLE AS novos
+    FOR EACH STATEMENT EXECUTE FUNCTION atualizar_resumo_personagens();
+
+CREATE OR REPLACE TRIGGER trg_resumo_personagens_update
+    AFTER UPDATE ON personagens REFERENCING OLD TABLE AS antigos NEW TABLE AS novos
+    FOR EACH STATEMENT EXECUTE FUNCTION atualizar_resumo_personagens();
+
+CREATE OR REPLACE TRIGGER trg_resumo_personagens_delete
+    AFTER DELETE ON personagens REFERENCING OLD TABLE AS antigos
+    FOR EACH STATEMENT EXECUTE FUNCTION atualizar_resumo_personagens();
+
+CREATE OR REPLACE TRIGGER trg_resumo_personagens_truncate
+    AFTER TRUNCATE ON personagens
+    FOR EACH STATEMENT EXECUTE FUNCTION atualizar_resumo_personagens();
+"""
+
+# Resumo vazio com personagens na tabela: instalação anterior aos triggers.
+# Os CREATE TRIGGER acima seguram um lock que bloqueia escritas em `personagens`
+# até o commit, então a contagem não perde nenhuma linha inserida no meio.
+PREENCHER_RESUMO_SQL = """
+    INSERT INTO resumo_personagens (dimensao, valor, total)
+    SELECT d.dimensao, d.valor, COUNT(*)
+    FROM personagens,
+         LATERAL (VALUES ('total', ''), ('classe', classe), ('raca', raca),
+                         ('faixa_nivel', faixa_nivel(nivel))) AS d (dimensao, valor)
+    GROUP BY d.dimensao, d.valor
+"""
+
+
+def garantir_esquema(banco):
+    # Devolve quantos contadores foram preenchidos a partir de `personagens` (0 se o resumo já existia)
+    with banco.cronometrar('garantir_esquema'), banco.conexao() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (TRAVA_ESQUEMA,))
+        cursor.execute(ESQUEMA_SQL)
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM resumo_personagens)")
+        preenchidos = 0
+        if not cursor.fetchone()[0]:
+            cursor.execute(PREENCHER_RESUMO_SQL)
+            preenchidos = cursor.rowcount
+        cursor.close()
+
+    if preenchidos:
+        print(f"[MIGRAÇÃO] resumo_personagens preenchido com {preenchidos} contadores")
+    return preenchidos
@@ -14,6 +14,10 @@ CREATE TABLE IF NOT EXISTS personagens (
     data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Índice da listagem, resumo_personagens e seus triggers ficam em app/esquema.py:
+-- a aplicação os cria a cada inicialização, inclusive em volumes que já tinham
+-- dados (onde este script não roda mais) e preenche o resumo a partir da tabela.
+
 -- Insere alguns personagens iniciais
 INSERT INTO
     personagens (
@@ -1,12 +1,24 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response, stream_with_context
 import psycopg2
 import redis
 import json
+import base64
 import uuid
 import os
-import sys
+import time
+import socket
 import logging
+import threading
+import click
+from collections import OrderedDict
 from datetime import datetime
+from psycopg2.extras import execute_values
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+from metricas import instrumentar
+from logs import configurar_logs
+from profiling import configurar_profiling
+from esquema import garantir_esquema
 
 app = Flask(__name__)
 
@@ -16,9 +28,7 @@ app.config['JSONIFY_MIMETYPE'] = 'application/json; charset=utf-8'
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
 
-def log_info(message):
-    print(message, flush=True)
-    sys.stdout.flush()
+logger = configurar_logs('pokemon-api')
 
 # Configurações do banco de dados PostgreSQL
 DB_CONFIG = {
@@ -27,16 +37,371 @@ DB_CONFIG = {
     'user': os.getenv('DB_USER', 'trainer'),
     'password': os.getenv('DB_PASSWORD', 'pokeball')
 }
+# Tentativas de aplicar a migração na subida (o PostgreSQL pode ainda não aceitar conexões)
+DB_STARTUP_ATTEMPTS = int(os.getenv('DB_STARTUP_ATTEMPTS', 30))
 
 # Configurações do Redis
 REDIS_HOST = os.getenv('REDIS_HOST', 'cache')
 REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
 
-redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+# Timeout curto no caminho das requisições: Redis fora do ar vira fallback rápido, não 500
+REDIS_TIMEOUT = float(os.getenv('REDIS_TIMEOUT', 0.5))
+
+redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True,
+                           socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT,
+                           retry=Retry(NoBackoff(), 0))
+# Threads de background (pub/sub, write-behind) fazem leituras bloqueantes longas
+redis_background = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+
+# Circuit breaker do Redis: abre após N falhas seguidas e testa de novo depois de um tempo
+REDIS_BREAKER_FAILURES = int(os.getenv('REDIS_BREAKER_FAILURES', 3))
+REDIS_BREAKER_RESET = float(os.getenv('REDIS_BREAKER_RESET', 10))
+
+# Proteção contra stampede: só quem pega o lock da chave recarrega do PostgreSQL
+CACHE_LOCK_TTL_MS = int(os.getenv('CACHE_LOCK_TTL_MS', 5000))
+CACHE_LOCK_WAIT = float(os.getenv('CACHE_LOCK_WAIT', 1.0))
+# Locks de recarga dentro do processo: número fixo de faixas, escolhidas por hash da chave
+RELOAD_LOCK_STRIPES = int(os.getenv('RELOAD_LOCK_STRIPES', 64))
+
+# Cache de Pokémon em dois níveis: L1 em memória do processo, L2 no Redis
+POKEMON_CACHE_TTL = int(os.getenv('POKEMON_CACHE_TTL', 300))
+L1_CACHE_TTL = float(os.getenv('L1_CACHE_TTL', 60))
+L1_CACHE_SIZE = int(os.getenv('L1_CACHE_SIZE', 256))
+POKEMON_LIST_KEY = 'pokemon:todos'
+CACHE_INVALIDATION_CHANNEL = 'pokemon:invalidate'
+
+# Modo de persistência das batalhas: 'sync' (INSERT na requisição) ou 'write-behind'
+# (resultado vai para um Redis Stream e um consumidor grava em lote no PostgreSQL)
+BATTLE_WRITE_MODE = os.getenv('BATTLE_WRITE_MODE', 'sync')
+WRITE_BEHIND_STREAM = os.getenv('WRITE_BEHIND_STREAM', 'batalhas:stream')
+WRITE_BEHIND_GROUP = os.getenv('WRITE_BEHIND_GROUP', 'batalhas-writer')
+WRITE_BEHIND_CONSUMER = os.getenv('HOSTNAME', socket.gethostname())
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv('WRITE_BEHIND_BATCH_SIZE', 100))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv('WRITE_BEHIND_FLUSH_INTERVAL', 1.0))
+# Mensagens pendentes de outro consumidor há mais que isso são assumidas por este
+WRITE_BEHIND_CLAIM_IDLE_MS = int(os.getenv('WRITE_BEHIND_CLAIM_IDLE_MS', 60000))
+# Entregas de uma mesma mensagem antes de ela ir para o dead-letter stream
+WRITE_BEHIND_MAX_DELIVERIES = int(os.getenv('WRITE_BEHIND_MAX_DELIVERIES', 5))
+WRITE_BEHIND_DEAD_LETTER_STREAM = os.getenv('WRITE_BEHIND_DEAD_LETTER_STREAM', 'batalhas:stream:dead-letter')
+
+CAMPOS_BATALHA = (
+    'battle_uuid', 'pokemon1_id', 'pokemon1_nome', 'pokemon2_id', 'pokemon2_nome',
+    'vencedor_id', 'vencedor_nome', 'turnos', 'data_batalha'
+)
+
+# Histórico recente e ranking mantidos no Redis (lidos sem tocar no PostgreSQL)
+RECENT_HISTORY_KEY = 'batalhas:recentes'
+RECENT_HISTORY_SIZE = int(os.getenv('RECENT_HISTORY_SIZE', 100))
+LEADERBOARD_WINS_KEY = 'leaderboard:vitorias'
+LEADERBOARD_LOSSES_KEY = 'leaderboard:derrotas'
+LEADERBOARD_NAMES_KEY = 'leaderboard:nomes'
+LEADERBOARD_MAX_SIZE = 100
+
+# Paginação por keyset em (data_batalha, id)
+BATTLES_PAGE_SIZE = 20
+BATTLES_MAX_PAGE_SIZE = 100
+EXPORT_ITERSIZE = int(os.getenv('EXPORT_ITERSIZE', 2000))
+
+CAMPOS_CONSULTA_BATALHA = (
+    'id, battle_uuid, pokemon1_id, pokemon1_nome, pokemon2_id, pokemon2_nome, '
+    'vencedor_id, vencedor_nome, turnos, data_batalha'
+)
+
+INSERT_BATALHAS_SQL = f"""INSERT INTO batalhas ({', '.join(CAMPOS_BATALHA)})
+    VALUES %s
+    ON CONFLICT (battle_uuid) DO NOTHING"""
+
+# Falhas de infraestrutura no write-behind: repetem o lote, não contam como entrega ruim
+ERROS_TRANSITORIOS_WRITE_BEHIND = (redis.exceptions.RedisError, psycopg2.OperationalError, psycopg2.InterfaceError)
 
 def get_db_connection():
     return psycopg2.connect(**DB_CONFIG)
 
+def aplicar_esquema():
+    """Aplica esquema.py antes de servir: sem battle_uuid o INSERT ... ON CONFLICT falha."""
+    for tentativa in range(1, DB_STARTUP_ATTEMPTS + 1):
+        try:
+            conn = get_db_connection()
+        except psycopg2.OperationalError as e:
+            if tentativa == DB_STARTUP_ATTEMPTS:
+                raise
+            logger.warning("[POSTGRES] Banco indisponível (tentativa %s/%s): %s", tentativa, DB_STARTUP_ATTEMPTS, e)
+            time.sleep(min(2 ** tentativa * 0.1, 2))
+            continue
+        try:
+            garantir_esquema(conn)
+        finally:
+            conn.close()
+        logger.info("[POSTGRES] Esquema de batalhas verificado")
+        return
+
+class CacheL1:
+    """LRU em memória com TTL por entrada, seguro entre threads."""
+    
+    def __init__(self, max_itens, ttl):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            valor, expira_em = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+    
+    def set(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = (valor, time.monotonic() + self.ttl)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+    
+    def invalidar(self, *chaves):
+        with self._lock:
+            if not chaves:
+                self._itens.clear()
+            for chave in chaves:
+                self._itens.pop(chave, None)
+    
+    def __len__(self):
+        return len(self._itens)
+
+cache_l1 = CacheL1(L1_CACHE_SIZE, L1_CACHE_TTL)
+
+cache_stats = {
+    'l1': {'hits': 0, 'misses': 0},
+    'l2': {'hits': 0, 'misses': 0, 'erros': 0, 'bypass': 0},
+    'stampede': {'coalescidas': 0, 'recargas': 0, 'esperas': 0, 'timeouts': 0},
+    'postgres': {'consultas': 0}
+}
+cache_stats_lock = threading.Lock()
+
+def _contar(tier, evento):
+    with cache_stats_lock:
+        cache_stats[tier][evento] += 1
+
+class RedisIndisponivel(Exception):
+    pass
+
+class CircuitBreaker:
+    """Fechado → aberto após `limite_falhas` erros seguidos; após `tempo_reset` s
+    libera uma única chamada de teste (meio-aberto) que fecha ou reabre o circuito."""
+    
+    def __init__(self, limite_falhas, tempo_reset):
+        self.limite_falhas = limite_falhas
+        self.tempo_reset = tempo_reset
+        self.estado = 'fechado'
+        self.falhas = 0
+        self.aberturas = 0
+        self._aberto_em = 0.0
+        self._lock = threading.Lock()
+    
+    def permite(self):
+        with self._lock:
+            if self.estado == 'fechado':
+                return True
+            if self.estado == 'aberto' and time.monotonic() - self._aberto_em >= self.tempo_reset:
+                self.estado = 'meio-aberto'
+                return True
+            return False
+    
+    def sucesso(self):
+        with self._lock:
+            self.estado = 'fechado'
+            self.falhas = 0
+    
+    def falha(self):
+        with self._lock:
+            self.falhas += 1
+            if self.estado == 'meio-aberto' or self.falhas >= self.limite_falhas:
+                if self.estado != 'aberto':
+                    self.aberturas += 1
+                    logger.warning("[REDIS] Circuito ABERTO após %s falhas, modo degradado", self.falhas)
+                self.estado = 'aberto'
+                self._aberto_em = time.monotonic()
+
+redis_breaker = CircuitBreaker(REDIS_BREAKER_FAILURES, REDIS_BREAKER_RESET)
+
+def chamar_redis(funcao, *args, **kwargs):
+    if not redis_breaker.permite():
+        raise RedisIndisponivel()
+    try:
+        resultado = funcao(*args, **kwargs)
+    except redis.exceptions.RedisError as e:
+        _contar('l2', 'erros')
+        redis_breaker.falha()
+        raise RedisIndisponivel() from e
+    redis_breaker.sucesso()
+    return resultado
+
+def _linha_para_pokemon(p):
+    return {
+        'id': p[0],
+        'nome': p[1],
+        'tipo': p[2],
+        'hp': p[3],
+        'ataque': p[4],
+        'defesa': p[5],
+        'ataque_especial': p[6],
+        'defesa_especial': p[7],
+        'velocidade': p[8]
+    }
+
+def _carregar_pokemon(pokemon_id):
+    logger.info("[BATTLE-API] Consultando PostgreSQL...")
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM pokemon WHERE id = %s", (pokemon_id,))
+    p = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    return _linha_para_pokemon(p) if p else None
+
+def _carregar_todos_pokemon():
+    logger.info("[BATTLE-API] Consultando PostgreSQL...")
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM pokemon ORDER BY id")
+    pokemons = [_linha_para_pokemon(p) for p in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    return pokemons
+
+# As chaves vêm de ids enviados pelo cliente: um lock por chave cresceria sem limite.
+# Chaves diferentes na mesma faixa só recarregam uma de cada vez.
+_locks_recarga = [threading.Lock() for _ in range(RELOAD_LOCK_STRIPES)]
+
+def _lock_da_chave(chave):
+    return _locks_recarga[hash(chave) % len(_locks_recarga)]
+
+# Apaga o lock do Redis só se ele ainda for nosso: depois do TTL, outro processo pode tê-lo pego
+LIBERAR_LOCK_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+liberar_lock_redis = redis_client.register_script(LIBERAR_LOCK_LUA)
+
+def _consultar_postgres(carregar):
+    _contar('postgres', 'consultas')
+    return carregar()
+
+def _buscar_l2(chave, carregar):
+    cached = chamar_redis(redis_client.get, chave)
+    if cached:
+        logger.info("[REDIS] Cache HIT para %s", chave)
+        _contar('l2', 'hits')
+        return json.loads(cached)
+    logger.info("[REDIS] Cache MISS para %s", chave)
+    _contar('l2', 'misses')
+    
+    # Entre réplicas: só quem consegue o lock recarrega, os demais esperam o valor aparecer
+    lock_key = f"{chave}:lock"
+    token = uuid.uuid4().hex
+    if chamar_redis(redis_client.set, lock_key, token, nx=True, px=CACHE_LOCK_TTL_MS):
+        _contar('stampede', 'recargas')
+        try:
+            valor = _consultar_postgres(carregar)
+            if valor is not None:
+                logger.info("[REDIS] Salvando %s no cache", chave)
+                chamar_redis(redis_client.setex, chave, POKEMON_CACHE_TTL, json.dumps(valor))
+            return valor
+        finally:
+            try:
+                chamar_redis(liberar_lock_redis, keys=[lock_key], args=[token])
+            except RedisIndisponivel:
+                pass  # o lock expira sozinho em CACHE_LOCK_TTL_MS
+    
+    _contar('stampede', 'esperas')
+    prazo = time.monotonic() + CACHE_LOCK_WAIT
+    while time.monotonic() < prazo:
+        time.sleep(0.02)
+        cached = chamar_redis(redis_client.get, chave)
+        if cached:
+            return json.loads(cached)
+    
+    _contar('stampede', 'timeouts')
+    return _consultar_postgres(carregar)
+
+def buscar_cache(chave, carregar):
+    valor = cache_l1.get(chave)
+    if valor is not None:
+        _contar('l1', 'hits')
+        return valor
+    _contar('l1', 'misses')
+    
+    # Dentro do processo: threads que erraram a mesma chave esperam a primeira recarregar
+    with _lock_da_chave(chave):
+        valor = cache_l1.get(chave)
+        if valor is not None:
+            _contar('stampede', 'coalescidas')
+            return valor
+        
+        try:
+            valor = _buscar_l2(chave, carregar)
+        except RedisIndisponivel:
+            # Modo degradado: ignora o Redis e vai direto ao PostgreSQL
+            logger.warning("[REDIS] Indisponível, buscando %s direto no PostgreSQL", chave)
+            _contar('l2', 'bypass')
+            valor = _consultar_postgres(carregar)
+        
+        if valor is not None:
+            cache_l1.set(chave, valor)
+        return valor
+
+def obter_pokemon_cache(pokemon_id):
+    return buscar_cache(f"pokemon:{pokemon_id}", lambda: _carregar_pokemon(pokemon_id))
+
+def listar_pokemon_cache():
+    return buscar_cache(POKEMON_LIST_KEY, _carregar_todos_pokemon)
+
+def invalidar_pokemon(pokemon_id=None):
+    # Remove do L2 e avisa todas as réplicas (inclusive esta) para limparem o L1
+    if pokemon_id is None:
+        chaves = list(redis_client.scan_iter('pokemon:[0-9]*')) + [POKEMON_LIST_KEY]
+    else:
+        chaves = [f"pokemon:{pokemon_id}", POKEMON_LIST_KEY]
+    redis_client.delete(*chaves)
+    redis_client.publish(CACHE_INVALIDATION_CHANNEL, '*' if pokemon_id is None else str(pokemon_id))
+
+def ouvir_invalidacoes():
+    while True:
+        try:
+            pubsub = redis_background.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+            # Invalidações publicadas enquanto estávamos desconectados foram perdidas
+            cache_l1.invalidar()
+            for mensagem in pubsub.listen():
+                alvo = mensagem['data']
+                if alvo == '*':
+                    cache_l1.invalidar()
+                else:
+                    cache_l1.invalidar(f"pokemon:{alvo}", POKEMON_LIST_KEY)
+                logger.info("[CACHE-L1] Invalidação recebida: %s", alvo)
+        except redis.exceptions.RedisError as e:
+            logger.warning("[CACHE-L1] Canal de invalidação indisponível, reconectando: %s", e)
+            cache_l1.invalidar()
+            time.sleep(1)
+
+def iniciar_invalidacao_l1():
+    thread = threading.Thread(target=ouvir_invalidacoes, name='l1-invalidation', daemon=True)
+    thread.start()
+    return thread
+
+@app.cli.command('invalidate-pokemon')
+@click.argument('pokemon_id', type=int, required=False)
+def invalidate_pokemon_command(pokemon_id):
+    """Invalida o cache (L1 de todas as réplicas e L2) de um Pokémon, ou de todos."""
+    invalidar_pokemon(pokemon_id)
+
 def calcular_dano(atacante, defensor):
     atk = max(atacante['ataque'], atacante['ataque_especial'])
     defe = max(defensor['defesa'], defensor['defesa_especial'])
@@ -44,6 +409,317 @@ def calcular_dano(atacante, defensor):
     dano = max(5, int((atk * 2) / (defe * 0.5)))
     return dano
 
+# Write-behind: publica o resultado no stream e retorna sem esperar o PostgreSQL
+def enfileirar_batalha(batalha):
+    chamar_redis(redis_client.xadd, WRITE_BEHIND_STREAM,
+                 {campo: str(batalha[campo]) for campo in CAMPOS_BATALHA})
+
+def _mensagem_para_linha(campos):
+    return (
+        campos['battle_uuid'],
+        int(campos['pokemon1_id']), campos['pokemon1_nome'],
+        int(campos['pokemon2_id']), campos['pokemon2_nome'],
+        int(campos['vencedor_id']), campos['vencedor_nome'],
+        int(campos['turnos']),
+        campos['data_batalha']
+    )
+
+def _confirmar(ids):
+    redis_background.xack(WRITE_BEHIND_STREAM, WRITE_BEHIND_GROUP, *ids)
+    redis_background.xdel(WRITE_BEHIND_STREAM, *ids)
+
+def gravar_lote(mensagens):
+    # ON CONFLICT em battle_uuid descarta reentregas (entrega at-least-once)
+    linhas = [_mensagem_para_linha(campos) for _, campos in mensagens]
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        execute_values(cursor, INSERT_BATALHAS_SQL, linhas, page_size=WRITE_BEHIND_BATCH_SIZE)
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+
+    # Só confirma depois do commit: se o processo cair antes, as mensagens são reentregues
+    _confirmar([msg_id for msg_id, _ in mensagens])
+    logger.info("[WRITE-BEHIND] %s batalhas gravadas no PostgreSQL", len(linhas))
+
+def gravar_isolando(mensagens):
+    # Lote recusado pelo PostgreSQL (ou mensagem malformada): grava uma a uma para
+    # que só a mensagem com problema fique pendente; ela volta em _coletar_lote
+    try:
+        gravar_lote(mensagens)
+    except ERROS_TRANSITORIOS_WRITE_BEHIND:
+        raise
+    except (psycopg2.Error, KeyError, ValueError) as e:
+        if len(mensagens) == 1:
+            logger.warning("[WRITE-BEHIND] Mensagem %s recusada, fica pendente para nova tentativa: %s",
+                           mensagens[0][0], e)
+            return
+        for mensagem in mensagens:
+            gravar_isolando([mensagem])
+
+def _mover_para_dead_letter(pendentes):
+    # Tira do stream principal as mensagens que esgotaram WRITE_BEHIND_MAX_DELIVERIES
+    pipe = redis_background.pipeline(transaction=False)
+    for pendente in pendentes:
+        pipe.xrange(WRITE_BEHIND_STREAM, pendente['message_id'], pendente['message_id'])
+    entradas = pipe.execute()
+
+    pipe = redis_background.pipeline(transaction=True)
+    for pendente, entrada in zip(pendentes, entradas):
+        if entrada:
+            pipe.xadd(WRITE_BEHIND_DEAD_LETTER_STREAM, {
+                **entrada[0][1],
+                'origem_id': pendente['message_id'],
+                'entregas': pendente['times_delivered']
+            })
+    ids = [pendente['message_id'] for pendente in pendentes]
+    pipe.xack(WRITE_BEHIND_STREAM, WRITE_BEHIND_GROUP, *ids)
+    pipe.xdel(WRITE_BEHIND_STREAM, *ids)
+    pipe.execute()
+    logger.error("[WRITE-BEHIND] %s mensagens movidas para %s após %s entregas: %s",
+                 len(ids), WRITE_BEHIND_DEAD_LETTER_STREAM, WRITE_BEHIND_MAX_DELIVERIES, ids)
+
+def _reentregar_pendentes():
+    # Mensagens deste consumidor que falharam (ou sobraram de um processo anterior),
+    # paradas há pelo menos um intervalo de flush para não repetir a falha em sequência.
+    # XCLAIM para si mesmo incrementa o contador de entregas que o XPENDING informa.
+    pendentes = redis_background.xpending_range(
+        WRITE_BEHIND_STREAM, WRITE_BEHIND_GROUP, '-', '+', WRITE_BEHIND_BATCH_SIZE,
+        consumername=WRITE_BEHIND_CONSUMER, idle=int(WRITE_BEHIND_FLUSH_INTERVAL * 1000)
+    )
+    esgotadas = [p for p in pendentes if p['times_delivered'] >= WRITE_BEHIND_MAX_DELIVERIES]
+    if esgotadas:
+        _mover_para_dead_letter(esgotadas)
+
+    ids = [p['message_id'] for p in pendentes if p['times_delivered'] < WRITE_BEHIND_MAX_DELIVERIES]
+    if not ids:
+        return []
+    mensagens = redis_background.xclaim(WRITE_BEHIND_STREAM, WRITE_BEHIND_GROUP,
+                                        WRITE_BEHIND_CONSUMER, 0, ids)
+    # Entradas apagadas do stream voltam sem campos: não há o que gravar
+    apagadas = [msg_id for msg_id, campos in mensagens if not campos]
+    if apagadas:
+        _confirmar(apagadas)
+    return [(msg_id, campos) for msg_id, campos in mensagens if campos]
+
+def _ler_stream(count, block=None):
+    resposta = redis_background.xreadgroup(
+        WRITE_BEHIND_GROUP, WRITE_BEHIND_CONSUMER,
+        {WRITE_BEHIND_STREAM: '>'}, count=count, block=block
+    )
+    mensagens = []
+    for _, entradas in resposta or []:
+        mensagens.extend(entradas)
+    return mensagens
+
+def _coletar_lote():
+    # Primeiro as mensagens já entregues a este consumidor e não confirmadas
+    pendentes = _reentregar_pendentes()
+    if pendentes:
+        return pendentes
+
+    # Depois, as de consumidores que morreram sem confirmar
+    _, assumidas, *_ = redis_background.xautoclaim(
+        WRITE_BEHIND_STREAM, WRITE_BEHIND_GROUP, WRITE_BEHIND_CONSUMER,
+        WRITE_BEHIND_CLAIM_IDLE_MS, count=WRITE_BEHIND_BATCH_SIZE
+    )
+    if assumidas:
+        return assumidas
+
+    # Acumula novas mensagens até encher o lote ou estourar o intervalo de flush
+    lote = []
+    prazo = time.monotonic() + WRITE_BEHIND_FLUSH_INTERVAL
+    while len(lote) < WRITE_BEHIND_BATCH_SIZE:
+        restante = prazo - time.monotonic()
+        if restante <= 0:
+            break
+        lote.extend(_ler_stream(WRITE_BEHIND_BATCH_SIZE - len(lote), max(1, int(restante * 1000))))
+    return lote
+
+def consumidor_write_behind():
+    try:
+        redis_background.xgroup_create(WRITE_BEHIND_STREAM, WRITE_BEHIND_GROUP, id='0', mkstream=True)
+    except redis.exceptions.ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+    logger.info("[WRITE-BEHIND] Consumidor '%s' ativo (lote: %s, flush: %ss)",
+                WRITE_BEHIND_CONSUMER, WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_FLUSH_INTERVAL)
+
+    lote = []
+    while True:
+        try:
+            if not lote:
+                lote = _coletar_lote()
+            if lote:
+                gravar_isolando(lote)
+            lote = []
+        except ERROS_TRANSITORIOS_WRITE_BEHIND as e:
+            # Banco ou Redis fora do ar: o mesmo lote é tentado de novo sem ser reentregue,
+            # então uma queda não gasta as entregas que levam ao dead-letter
+            logger.error("[WRITE-BEHIND] ERRO ao gravar lote, nova tentativa em %ss: %s",
+                         WRITE_BEHIND_FLUSH_INTERVAL, e)
+            time.sleep(WRITE_BEHIND_FLUSH_INTERVAL)
+
+def iniciar_write_behind():
+    thread = threading.Thread(target=consumidor_write_behind, name='write-behind', daemon=True)
+    thread.start()
+    return thread
+
+def _entrada_historico(battle_id, batalha):
+    # No write-behind o id do PostgreSQL ainda não existe: a entrada fica só com o battle_uuid
+    entrada = {} if battle_id is None else {'id': battle_id}
+    entrada.update({
+        'battle_uuid': batalha['battle_uuid'],
+        'pokemon1': batalha['pokemon1_nome'],
+        'pokemon2': batalha['pokemon2_nome'],
+        'vencedor': batalha['vencedor_nome'],
+        'turnos': batalha['turnos'],
+        'data': datetime.fromisoformat(batalha['data_batalha']).strftime('%Y-%m-%d %H:%M:%S')
+    })
+    return json.dumps(entrada)
+
+def registrar_ranking(battle_id, batalha, perdedor):
+    # MULTI/EXEC: histórico e placar mudam juntos ou não mudam
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.lpush(RECENT_HISTORY_KEY, _entrada_historico(battle_id, batalha))
+    pipe.ltrim(RECENT_HISTORY_KEY, 0, RECENT_HISTORY_SIZE - 1)
+    pipe.zincrby(LEADERBOARD_WINS_KEY, 1, batalha['vencedor_id'])
+    # Incremento 0: o perdedor entra no ranking com 0 vitórias se ainda não estava
+    pipe.zincrby(LEADERBOARD_WINS_KEY, 0, perdedor['id'])
+    pipe.zincrby(LEADERBOARD_LOSSES_KEY, 1, perdedor['id'])
+    pipe.hset(LEADERBOARD_NAMES_KEY, mapping={
+        batalha['vencedor_id']: batalha['vencedor_nome'],
+        perdedor['id']: perdedor['nome']
+    })
+    chamar_redis(pipe.execute)
+
+def reconstruir_ranking():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        SELECT id, battle_uuid, pokemon1_nome, pokemon2_nome, vencedor_nome, turnos, data_batalha
+        FROM batalhas
+        ORDER BY data_batalha DESC, id DESC
+        LIMIT %s
+    """, (RECENT_HISTORY_SIZE,))
+    recentes = cursor.fetchall()
+    
+    cursor.execute("""
+        SELECT vencedor_id, vencedor_nome, COUNT(*) FROM batalhas GROUP BY vencedor_id, vencedor_nome
+    """)
+    vitorias = cursor.fetchall()
+    
+    cursor.execute("""
+        SELECT CASE WHEN vencedor_id = pokemon1_id THEN pokemon2_id ELSE pokemon1_id END,
+               CASE WHEN vencedor_id = pokemon1_id THEN pokemon2_nome ELSE pokemon1_nome END,
+               COUNT(*)
+        FROM batalhas
+        GROUP BY 1, 2
+    """)
+    derrotas = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    
+    # Monta em chaves temporárias e troca com RENAME para os leitores nunca verem um ranking pela metade
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(f"{RECENT_HISTORY_KEY}:tmp", f"{LEADERBOARD_WINS_KEY}:tmp",
+                f"{LEADERBOARD_LOSSES_KEY}:tmp", f"{LEADERBOARD_NAMES_KEY}:tmp")
+    for b in recentes:
+        pipe.rpush(f"{RECENT_HISTORY_KEY}:tmp", json.dumps({
+            'id': b[0], 'battle_uuid': str(b[1]),
+            'pokemon1': b[2], 'pokemon2': b[3], 'vencedor': b[4], 'turnos': b[5],
+            'data': b[6].strftime('%Y-%m-%d %H:%M:%S')
+        }))
+    for pokemon_id, nome, total in vitorias:
+        pipe.zadd(f"{LEADERBOARD_WINS_KEY}:tmp", {pokemon_id: total})
+        pipe.hset(f"{LEADERBOARD_NAMES_KEY}:tmp", pokemon_id, nome)
+    for pokemon_id, nome, total in derrotas:
+        pipe.zadd(f"{LEADERBOARD_LOSSES_KEY}:tmp", {pokemon_id: total})
+        pipe.zadd(f"{LEADERBOARD_WINS_KEY}:tmp", {pokemon_id: 0}, nx=True)
+        pipe.hset(f"{LEADERBOARD_NAMES_KEY}:tmp", pokemon_id, nome)
+    for chave, conteudo in ((RECENT_HISTORY_KEY, recentes), (LEADERBOARD_WINS_KEY, vitorias or derrotas),
+                            (LEADERBOARD_LOSSES_KEY, derrotas), (LEADERBOARD_NAMES_KEY, vitorias or derrotas)):
+        if conteudo:
+            pipe.rename(f"{chave}:tmp", chave)
+        else:
+            pipe.delete(chave)
+    pipe.execute()
+    
+    logger.info("[REDIS] Ranking reconstruído: %s batalhas recentes, %s vencedores, %s perdedores",
+                len(recentes), len(vitorias), len(derrotas))
+
+@app.cli.command('rebuild-ranking')
+def rebuild_ranking_command():
+    """Reconstrói histórico recente e leaderboard do Redis a partir do PostgreSQL."""
+    reconstruir_ranking()
+
+def _batalha_para_dict(b):
+    return {
+        'id': b[0],
+        'battle_uuid': str(b[1]),
+        'pokemon1': {'id': b[2], 'nome': b[3]},
+        'pokemon2': {'id': b[4], 'nome': b[5]},
+        'vencedor': {'id': b[6], 'nome': b[7]},
+        'turnos': b[8],
+        'data': b[9].strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+def _codificar_cursor(data_batalha, battle_id):
+    bruto = f"{data_batalha.isoformat()}|{battle_id}".encode()
+    return base64.urlsafe_b64encode(bruto).decode()
+
+def _decodificar_cursor(cursor):
+    # Levanta ValueError para cursores malformados
+    data_iso, battle_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(data_iso), int(battle_id)
+
+def _consulta_batalhas(pokemon_id=None, vencedor_id=None, cursor=None, limite=None):
+    # Cada ramo da consulta casa com um índice (<filtro>, data_batalha DESC, id DESC),
+    # então o PostgreSQL percorre só as entradas da página, sem OFFSET nem sort
+    condicoes = []
+    params = []
+    if vencedor_id is not None:
+        condicoes.append("vencedor_id = %s")
+        params.append(vencedor_id)
+    if cursor is not None:
+        condicoes.append("(data_batalha, id) < (%s, %s)")
+        params.extend(cursor)
+    
+    ordem = "ORDER BY data_batalha DESC, id DESC"
+    clausula_limite = "LIMIT %s" if limite is not None else ""
+    params_limite = [limite] if limite is not None else []
+    
+    if pokemon_id is None:
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        sql = f"SELECT {CAMPOS_CONSULTA_BATALHA} FROM batalhas {where} {ordem} {clausula_limite}"
+        return sql, params + params_limite
+    
+    # Participante em qualquer lado: UNION ALL de dois ramos indexados (evita OR sem índice)
+    ramo1 = ' AND '.join(["pokemon1_id = %s"] + condicoes)
+    ramo2 = ' AND '.join(["pokemon2_id = %s", "pokemon1_id <> %s"] + condicoes)
+    sql = f"""
+        SELECT * FROM (
+            (SELECT {CAMPOS_CONSULTA_BATALHA} FROM batalhas WHERE {ramo1} {ordem} {clausula_limite})
+            UNION ALL
+            (SELECT {CAMPOS_CONSULTA_BATALHA} FROM batalhas WHERE {ramo2} {ordem} {clausula_limite})
+        ) AS b
+        {ordem} {clausula_limite}
+    """
+    params_completos = ([pokemon_id] + params + params_limite
+                        + [pokemon_id, pokemon_id] + params + params_limite
+                        + params_limite)
+    return sql, params_completos
+
+def _filtros_batalhas():
+    return {
+        'pokemon_id': request.args.get('pokemon_id', type=int),
+        'vencedor_id': request.args.get('vencedor_id', type=int)
+    }
+
 @app.route('/')
 def home():
     return jsonify({
@@ -52,85 +728,54 @@ def home():
         'endpoints': {
             'GET /pokemon': 'Lista todos os Pokemon',
             'GET /pokemon/id': 'Detalhes de um Pokemon (com cache)',
+            'GET /cache/stats': 'Metricas do cache L1/L2, stampede e circuit breaker',
             'POST /battle/start': 'Inicia e executa batalha completa {pokemon1_id, pokemon2_id}',
-            'GET /history': 'Historico de batalhas'
+            'GET /history': 'Historico das batalhas recentes (Redis)',
+            'GET /leaderboard': 'Ranking de vitorias e derrotas por Pokemon (Redis)',
+            'GET /battles': 'Historico completo paginado {limit, cursor, pokemon_id, vencedor_id}',
+            'GET /battles/export': 'Exportacao NDJSON em streaming {pokemon_id, vencedor_id}'
         }
     })
 
 # Listar todos os pokemo
 @app.route('/pokemon', methods=['GET'])
 def listar_pokemon():
-    log_info("[BATTLE-API] Listando Pokemon...")
+    logger.info("[BATTLE-API] Listando Pokemon...")
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    resultado = listar_pokemon_cache()
     
-    log_info("[BATTLE-API] Consultando PostgreSQL...")
-    cursor.execute("SELECT * FROM pokemon ORDER BY id")
-    pokemons = cursor.fetchall()
-    
-    resultado = []
-    for p in pokemons:
-        resultado.append({
-            'id': p[0],
-            'nome': p[1],
-            'tipo': p[2],
-            'hp': p[3],
-            'ataque': p[4],
-            'defesa': p[5],
-            'ataque_especial': p[6],
-            'defesa_especial': p[7],
-            'velocidade': p[8]
-        })
-    
-    cursor.close()
-    conn.close()
-    
-    log_info(f"[BATTLE-API] {len(resultado)} Pokemon encontrados")
+    logger.info("[BATTLE-API] %s Pokemon encontrados", len(resultado))
     return jsonify(resultado)
 
 # Get Pokemon pelo id
 @app.route('/pokemon/<int:pokemon_id>', methods=['GET'])
 def obter_pokemon(pokemon_id):
-    log_info(f"[BATTLE-API] Buscando Pokemon ID: {pokemon_id}")
-    
-    cache_key = f"pokemon:{pokemon_id}"
-    cached = redis_client.get(cache_key)
-    
-    if cached:
-        log_info(f"[REDIS] Cache HIT para Pokemon {pokemon_id}")
-        return jsonify(json.loads(cached))
-    
-    log_info(f"[REDIS] Cache MISS para Pokemon {pokemon_id}")
-    log_info("[BATTLE-API] Consultando PostgreSQL...")
+    logger.info("[BATTLE-API] Buscando Pokemon ID: %s", pokemon_id)
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM pokemon WHERE id = %s", (pokemon_id,))
-    p = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    pokemon = obter_pokemon_cache(pokemon_id)
     
-    if not p:
+    if not pokemon:
         return jsonify({'error': 'Pokemon não encontrado'}), 404
     
-    pokemon = {
-        'id': p[0],
-        'nome': p[1],
-        'tipo': p[2],
-        'hp': p[3],
-        'ataque': p[4],
-        'defesa': p[5],
-        'ataque_especial': p[6],
-        'defesa_especial': p[7],
-        'velocidade': p[8]
-    }
-    
-    log_info(f"[REDIS] Salvando Pokemon {pokemon_id} no cache")
-    redis_client.setex(cache_key, 300, json.dumps(pokemon))
-    
     return jsonify(pokemon)
 
+# Taxa de acerto por nível de cache
+@app.route('/cache/stats', methods=['GET'])
+def estatisticas_cache():
+    with cache_stats_lock:
+        stats = {tier: dict(valores) for tier, valores in cache_stats.items()}
+    for tier in ('l1', 'l2'):
+        total = stats[tier]['hits'] + stats[tier]['misses']
+        stats[tier]['hit_rate'] = round(stats[tier]['hits'] / total, 4) if total else None
+    stats['l1']['itens'] = len(cache_l1)
+    stats['l1']['max_itens'] = cache_l1.max_itens
+    stats['circuit_breaker'] = {
+        'estado': redis_breaker.estado,
+        'falhas_consecutivas': redis_breaker.falhas,
+        'aberturas': redis_breaker.aberturas
+    }
+    return jsonify(stats)
+
 # Iniciar Batalha Automatica
 @app.route('/battle/start', methods=['POST'])
 def iniciar_batalha():
@@ -138,38 +783,32 @@ def iniciar_batalha():
     pokemon1_id = data.get('pokemon1_id')
     pokemon2_id = data.get('pokemon2_id')
     
-    log_info(f"[BATTLE-API] Iniciando batalha: {pokemon1_id} vs {pokemon2_id}")
+    logger.info("[BATTLE-API] Iniciando batalha: %s vs %s", pokemon1_id, pokemon2_id)
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    log_info("[BATTLE-API] Consultando PostgreSQL para Pokemon 1...")
-    cursor.execute("SELECT * FROM pokemon WHERE id = %s", (pokemon1_id,))
-    p1 = cursor.fetchone()
+    logger.info("[BATTLE-API] Buscando Pokemon 1 no cache...")
+    p1 = obter_pokemon_cache(pokemon1_id)
     
-    log_info("[BATTLE-API] Consultando PostgreSQL para Pokemon 2...")
-    cursor.execute("SELECT * FROM pokemon WHERE id = %s", (pokemon2_id,))
-    p2 = cursor.fetchone()
+    logger.info("[BATTLE-API] Buscando Pokemon 2 no cache...")
+    p2 = obter_pokemon_cache(pokemon2_id)
     
     if not p1 or not p2:
-        cursor.close()
-        conn.close()
         return jsonify({'error': 'Um ou ambos os Pokemon não encontrados'}), 404
     
+    # Cópias: os dicts do cache L1 são compartilhados e não podem ser alterados
     pokemon1 = {
-        'id': p1[0], 'nome': p1[1], 'tipo': p1[2],
-        'hp_atual': p1[3], 'hp_max': p1[3],
-        'ataque': p1[4], 'defesa': p1[5],
-        'ataque_especial': p1[6], 'defesa_especial': p1[7],
-        'velocidade': p1[8]
+        'id': p1['id'], 'nome': p1['nome'], 'tipo': p1['tipo'],
+        'hp_atual': p1['hp'], 'hp_max': p1['hp'],
+        'ataque': p1['ataque'], 'defesa': p1['defesa'],
+        'ataque_especial': p1['ataque_especial'], 'defesa_especial': p1['defesa_especial'],
+        'velocidade': p1['velocidade']
     }
     
     pokemon2 = {
-        'id': p2[0], 'nome': p2[1], 'tipo': p2[2],
-        'hp_atual': p2[3], 'hp_max': p2[3],
-        'ataque': p2[4], 'defesa': p2[5],
-        'ataque_especial': p2[6], 'defesa_especial': p2[7],
-        'velocidade': p2[8]
+        'id': p2['id'], 'nome': p2['nome'], 'tipo': p2['tipo'],
+        'hp_atual': p2['hp'], 'hp_max': p2['hp'],
+        'ataque': p2['ataque'], 'defesa': p2['defesa'],
+        'ataque_especial': p2['ataque_especial'], 'defesa_especial': p2['defesa_especial'],
+        'velocidade': p2['velocidade']
     }
     
     if pokemon1['velocidade'] >= pokemon2['velocidade']:
@@ -179,7 +818,7 @@ def iniciar_batalha():
         atacante = pokemon2
         defensor = pokemon1
     
-    log_info(f"[BATTLE-API] {atacante['nome']} (Speed: {atacante['velocidade']}) ataca primeiro!")
+    logger.debug("[BATTLE-API] %s (Speed: %s) ataca primeiro!", atacante['nome'], atacante['velocidade'])
     
     turno = 0
     log_batalha = []
@@ -192,7 +831,7 @@ def iniciar_batalha():
         
         log_entry = f"Turno {turno}: {atacante['nome']} ataca {defensor['nome']} causando {dano} de dano! HP restante: {defensor['hp_atual']}/{defensor['hp_max']}"
         log_batalha.append(log_entry)
-        log_info(f"[BATTLE-API] {log_entry}")
+        logger.debug("[BATTLE-API] %s", log_entry)
         
         if defensor['hp_atual'] <= 0:
             vencedor = atacante
@@ -201,27 +840,58 @@ def iniciar_batalha():
         
         atacante, defensor = defensor, atacante
     
-    log_info(f"[BATTLE-API] {vencedor['nome']} venceu após {turno} turnos!")
-    
-    log_info("[BATTLE-API] Salvando resultado no PostgreSQL...")
-    cursor.execute(
-        """INSERT INTO batalhas 
-           (pokemon1_id, pokemon1_nome, pokemon2_id, pokemon2_nome, 
-            vencedor_id, vencedor_nome, turnos)
-           VALUES (%s, %s, %s, %s, %s, %s, %s)
-           RETURNING id""",
-        (pokemon1['id'], pokemon1['nome'],
-         pokemon2['id'], pokemon2['nome'],
-         vencedor['id'], vencedor['nome'], turno)
-    )
-    battle_id = cursor.fetchone()[0]
-    conn.commit()
-    cursor.close()
-    conn.close()
-    log_info("[POSTGRES] Batalha salva no historico")
+    logger.info("[BATTLE-API] %s venceu após %s turnos!", vencedor['nome'], turno)
+    
+    batalha = {
+        'battle_uuid': str(uuid.uuid4()),
+        'pokemon1_id': pokemon1['id'], 'pokemon1_nome': pokemon1['nome'],
+        'pokemon2_id': pokemon2['id'], 'pokemon2_nome': pokemon2['nome'],
+        'vencedor_id': vencedor['id'], 'vencedor_nome': vencedor['nome'],
+        'turnos': turno,
+        'data_batalha': datetime.now().isoformat()
+    }
+    
+    battle_id = None
+    enfileirada = False
+    if BATTLE_WRITE_MODE == 'write-behind':
+        logger.info("[BATTLE-API] Enfileirando resultado no Redis Stream...")
+        try:
+            enfileirar_batalha(batalha)
+            enfileirada = True
+            logger.info("[REDIS] Batalha enfileirada para gravação em lote")
+        except RedisIndisponivel:
+            logger.warning("[REDIS] Indisponível, gravando batalha direto no PostgreSQL")
+    
+    if not enfileirada:
+        logger.info("[BATTLE-API] Salvando resultado no PostgreSQL...")
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""INSERT INTO batalhas ({', '.join(CAMPOS_BATALHA)})
+               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+               ON CONFLICT (battle_uuid) DO NOTHING
+               RETURNING id""",
+            tuple(batalha[campo] for campo in CAMPOS_BATALHA)
+        )
+        linha = cursor.fetchone()
+        if linha is None:
+            # Já gravada (ex.: o write-behind entregou antes): devolve o id existente
+            cursor.execute("SELECT id FROM batalhas WHERE battle_uuid = %s", (batalha['battle_uuid'],))
+            linha = cursor.fetchone()
+        battle_id = linha[0]
+        conn.commit()
+        cursor.close()
+        conn.close()
+        logger.info("[POSTGRES] Batalha salva no historico")
+    
+    try:
+        registrar_ranking(battle_id, batalha, perdedor)
+    except RedisIndisponivel:
+        logger.warning("[REDIS] Indisponível, histórico recente e leaderboard não atualizados")
     
     return jsonify({
         'battle_id': battle_id,
+        'battle_uuid': batalha['battle_uuid'],
         'pokemon1': pokemon1['nome'],
         'pokemon2': pokemon2['nome'],
         'vencedor': vencedor['nome'],
@@ -231,44 +901,136 @@ def iniciar_batalha():
         'status': 'finalizada'
     })
 
-# Historico de Batalhas
+# Historico de Batalhas (lido apenas do Redis)
 @app.route('/history', methods=['GET'])
 def historico():
-    log_info("[BATTLE-API] Consultando historico de batalhas no PostgreSQL...")
+    limite = max(1, min(request.args.get('limit', 10, type=int), RECENT_HISTORY_SIZE))
+    logger.info("[BATTLE-API] Consultando historico de batalhas no Redis...")
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, pokemon1_nome, pokemon2_nome, vencedor_nome, turnos, data_batalha
-        FROM batalhas 
-        ORDER BY data_batalha DESC 
-        LIMIT 10
-    """)
-    batalhas = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    try:
+        recentes = chamar_redis(redis_client.lrange, RECENT_HISTORY_KEY, 0, limite - 1)
+    except RedisIndisponivel:
+        return jsonify({'error': 'Redis indisponível'}), 503
+    resultado = [json.loads(b) for b in recentes]
+    
+    logger.info("[BATTLE-API] %s batalhas no historico", len(resultado))
+    return jsonify(resultado)
+
+# Ranking de vitorias e derrotas por Pokemon (lido apenas do Redis).
+# Todo Pokémon que já batalhou aparece, inclusive os que só perderam (0 vitórias).
+@app.route('/leaderboard', methods=['GET'])
+def leaderboard():
+    limite = max(1, min(request.args.get('limit', 10, type=int), LEADERBOARD_MAX_SIZE))
+    logger.info("[BATTLE-API] Consultando leaderboard no Redis...")
+    
+    try:
+        ranking = chamar_redis(redis_client.zrevrange, LEADERBOARD_WINS_KEY, 0, limite - 1, withscores=True)
+        if not ranking:
+            return jsonify([])
+        
+        ids = [pokemon_id for pokemon_id, _ in ranking]
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zmscore(LEADERBOARD_LOSSES_KEY, ids)
+        pipe.hmget(LEADERBOARD_NAMES_KEY, ids)
+        derrotas, nomes = chamar_redis(pipe.execute)
+    except RedisIndisponivel:
+        return jsonify({'error': 'Redis indisponível'}), 503
     
     resultado = []
-    for b in batalhas:
+    for posicao, ((pokemon_id, vitorias), perdas, nome) in enumerate(zip(ranking, derrotas, nomes), start=1):
+        vitorias = int(vitorias)
+        perdas = int(perdas or 0)
         resultado.append({
-            'id': b[0],
-            'pokemon1': b[1],
-            'pokemon2': b[2],
-            'vencedor': b[3],
-            'turnos': b[4],
-            'data': b[5].strftime('%Y-%m-%d %H:%M:%S')
+            'posicao': posicao,
+            'id': int(pokemon_id),
+            'nome': nome,
+            'vitorias': vitorias,
+            'derrotas': perdas,
+            'taxa_vitoria': round(vitorias / (vitorias + perdas), 3)
         })
     
-    log_info(f"[BATTLE-API] {len(resultado)} batalhas no historico")
     return jsonify(resultado)
 
+# Historico completo paginado por cursor (PostgreSQL)
+@app.route('/battles', methods=['GET'])
+def listar_batalhas():
+    limite = max(1, min(request.args.get('limit', BATTLES_PAGE_SIZE, type=int), BATTLES_MAX_PAGE_SIZE))
+    filtros = _filtros_batalhas()
+    
+    cursor_param = request.args.get('cursor')
+    try:
+        posicao = _decodificar_cursor(cursor_param) if cursor_param else None
+    except ValueError:
+        return jsonify({'error': 'Cursor inválido'}), 400
+    
+    logger.info("[BATTLE-API] Paginando batalhas (limit=%s, filtros=%s)", limite, filtros)
+    
+    # Busca uma linha a mais para saber se existe próxima página
+    sql, params = _consulta_batalhas(cursor=posicao, limite=limite + 1, **filtros)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    linhas = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    
+    tem_mais = len(linhas) > limite
+    linhas = linhas[:limite]
+    proximo = _codificar_cursor(linhas[-1][9], linhas[-1][0]) if tem_mais else None
+    
+    return jsonify({
+        'batalhas': [_batalha_para_dict(b) for b in linhas],
+        'total_pagina': len(linhas),
+        'next_cursor': proximo
+    })
+
+# Exportação NDJSON em streaming (cursor do lado do servidor)
+@app.route('/battles/export', methods=['GET'])
+def exportar_batalhas():
+    filtros = _filtros_batalhas()
+    sql, params = _consulta_batalhas(**filtros)
+    
+    logger.info("[BATTLE-API] Exportando batalhas em NDJSON (filtros=%s)", filtros)
+    
+    def gerar():
+        conn = get_db_connection()
+        try:
+            # Cursor nomeado: o PostgreSQL entrega EXPORT_ITERSIZE linhas por vez
+            cursor = conn.cursor(name=f"export_{uuid.uuid4().hex}")
+            cursor.itersize = EXPORT_ITERSIZE
+            cursor.execute(sql, params)
+            for b in cursor:
+                yield json.dumps(_batalha_para_dict(b), ensure_ascii=False) + '\n'
+            cursor.close()
+        finally:
+            conn.close()
+    
+    return Response(stream_with_context(gerar()), mimetype='application/x-ndjson')
+
+
+# Profiling sob demanda em /debug/profiles (comum/profiling.py)
+configurar_profiling(app, 'pokemon-api')
+
+# Métricas HTTP em /metrics (comum/metricas.py)
+instrumentar(app, 'pokemon-api')
 
 if __name__ == '__main__':
-    log_info("="*60)
-    log_info("Iniciando Battle API - Sistema de Batalha Pokemon")
-    log_info("="*60)
-    log_info(f"Conectando ao PostgreSQL: {DB_CONFIG['host']}")
-    log_info(f"Conectando ao Redis: {REDIS_HOST}:{REDIS_PORT}")
-    log_info("API rodando em http://0.0.0.0:5000")
-    log_info("="*60)
+    logger.info("="*60)
+    logger.info("Iniciando Battle API - Sistema de Batalha Pokemon")
+    logger.info("="*60)
+    logger.info("Conectando ao PostgreSQL: %s", DB_CONFIG['host'])
+    logger.info("Conectando ao Redis: %s:%s", REDIS_HOST, REDIS_PORT)
+    logger.info("Persistência de batalhas: %s", BATTLE_WRITE_MODE)
+    logger.info("API rodando em http://0.0.0.0:5000")
+    logger.info("="*60)
+    aplicar_esquema()
+    iniciar_invalidacao_l1()
+    try:
+        if not redis_client.exists(RECENT_HISTORY_KEY, LEADERBOARD_WINS_KEY):
+            logger.info("[REDIS] Ranking vazio, reconstruindo a partir do PostgreSQL...")
+            reconstruir_ranking()
+    except (redis.exceptions.RedisError, psycopg2.OperationalError) as e:
+        logger.warning("[REDIS] Não foi possível reconstruir o ranking agora: %s", e)
+    if BATTLE_WRITE_MODE == 'write-behind':
+        iniciar_write_behind()
     app.run(host='0.0.0.0', port=5000, debug=False)
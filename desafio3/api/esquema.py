@@ -0,0 +1,56 @@
+"""
+Colunas e índices de `batalhas` acrescentados depois do `init.sql` original,
+aplicados a cada inicialização da API.
+
+O PostgreSQL só roda o `init.sql` com o diretório de dados vazio: bancos que
+já existiam nunca recebem o que foi adicionado a ele depois. Por isso tudo
+aqui é idempotente (`IF NOT EXISTS`) e roda em uma única transação, sob um
+advisory lock para que duas réplicas subindo juntas não disputem o DDL.
+
+- `battle_uuid`: identificador gerado pela API, alvo do `ON CONFLICT` que
+  descarta reentregas do write-behind; batalhas antigas recebem um
+  `gen_random_uuid()`.
+- `data_batalha NOT NULL`: a paginação por keyset compara (data_batalha, id).
+- Índices do keyset, com e sem os filtros `pokemon_id` e `vencedor_id`.
+"""
+
+# Chave arbitrária do pg_advisory_xact_lock que serializa a migração
+TRAVA_ESQUEMA = 7_240_026
+
+ESQUEMA_SQL = """
+ALTER TABLE batalhas ADD COLUMN IF NOT EXISTS battle_uuid UUID;
+UPDATE batalhas SET battle_uuid = gen_random_uuid() WHERE battle_uuid IS NULL;
+ALTER TABLE batalhas ALTER COLUMN battle_uuid SET NOT NULL;
+
+-- Bancos criados por uma versão anterior do init.sql já têm a constraint UNIQUE
+-- (batalhas_battle_uuid_key): não cria um segundo índice igual
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'batalhas'::regclass AND conname = 'batalhas_battle_uuid_key'
+    ) THEN
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_batalhas_battle_uuid ON batalhas (battle_uuid);
+    END IF;
+END;
+$$;
+
+-- Sem data não há posição no keyset: linhas antigas sem data vão para o fim do histórico
+UPDATE batalhas SET data_batalha = TIMESTAMP 'epoch' WHERE data_batalha IS NULL;
+ALTER TABLE batalhas ALTER COLUMN data_batalha SET NOT NULL;
+
+-- Índices da paginação por keyset em (data_batalha, id)
+CREATE INDEX IF NOT EXISTS idx_batalhas_data_id ON batalhas (data_batalha DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_batalhas_pokemon1_data_id ON batalhas (pokemon1_id, data_batalha DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_batalhas_pokemon2_data_id ON batalhas (pokemon2_id, data_batalha DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_batalhas_vencedor_data_id ON batalhas (vencedor_id, data_batalha DESC, id DESC);
+"""
+
+
+def garantir_esquema(conn):
+    # Aplica a migração e faz o commit; quem chama abre e fecha a conexão
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (TRAVA_ESQUEMA,))
+    cursor.execute(ESQUEMA_SQL)
+    cursor.close()
+    conn.commit()
@@ -14,6 +14,7 @@ CREATE TABLE IF NOT EXISTS pokemon (
 );
 
 -- Tabela de histórico de batalhas
+-- (battle_uuid, data_batalha NOT NULL e os índices do keyset são aplicados pela API na inicialização: api/esquema.py)
 CREATE TABLE IF NOT EXISTS batalhas (
     id SERIAL PRIMARY KEY,
     pokemon1_id INTEGER NOT NULL,
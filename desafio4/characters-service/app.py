@@ -1,7 +1,14 @@
 from flask import Flask, jsonify, request
-import sys
 import json
 from datetime import datetime
+from metricas import instrumentar
+from logs import configurar_logs
+from profiling import configurar_profiling
+from compressao import configurar_compressao
+from formatos import configurar_formatos
+from cache_respostas import CacheRespostas
+from paginacao import Paginador, paginacao_solicitada
+from ndjson import ndjson_solicitado, responder_ndjson
 
 app = Flask(__name__)
 
@@ -12,9 +19,7 @@ import logging
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
 
-def log_info(message):
-    print(message, flush=True)
-    sys.stdout.flush()
+logger = configurar_logs('characters-service')
 
 def load_characters():
     with open('characters_data.json', 'r', encoding='utf-8') as f:
@@ -22,21 +27,27 @@ def load_characters():
 
 characters_db = load_characters()
 
+# Listagens já serializadas, invalidadas a cada escrita (comum/cache_respostas.py)
+cache = CacheRespostas()
+
+# Índices para paginação por cursor, ordenação e projeção (comum/paginacao.py)
+characters_paginados = Paginador(characters_db, ('id', 'name', 'health', 'hunger', 'sanity', 'survival_odds', 'joined_at'))
+
 # Retorna todos os endpoints disponiveis
 @app.route('/')
 def home():
-    return jsonify({
+    return cache.responder('home', lambda: {
         'service': 'Characters Service',
         'description': "Don't Starve Together - Character Management",
         'version': '1.0',
         'endpoints': {
-            'GET /characters': 'Lista todos os personagens do servidor',
+            'GET /characters': 'Lista todos os personagens do servidor (limit, after, sort, fields)',
             'GET /characters/<id>': 'Detalhes de um personagem específico',
             'GET /characters/odds/<level>': 'Filtra personagens por survival odds (Slim, Grim, None)',
             'POST /characters': 'Adiciona novo personagem ao servidor',
             'GET /health': 'Health check do serviço'
         }
-    })
+    }, versionado=False)
 
 @app.route('/health')
 def health():
@@ -50,10 +61,15 @@ def health():
 # Listar Personagens
 @app.route('/characters', methods=['GET'])
 def list_characters():
-    log_info("[CHARACTERS] Listando todos os personagens...")
-    log_info(f"[CHARACTERS] Total de personagens no servidor: {len(characters_db)}")
+    logger.info("[CHARACTERS] Listando todos os personagens...")
+    logger.info("[CHARACTERS] Total de personagens no servidor: %s", len(characters_db))
     
-    return jsonify({
+    if paginacao_solicitada():
+        return characters_paginados.responder('characters')
+    if ndjson_solicitado():
+        return responder_ndjson(characters_db)
+    
+    return cache.responder('characters', lambda: {
         'total': len(characters_db),
         'characters': characters_db
     })
@@ -61,21 +77,21 @@ def list_characters():
 # Listar Detalhes do Personagem pelo ID
 @app.route('/characters/<int:character_id>', methods=['GET'])
 def get_character(character_id):
-    log_info(f"[CHARACTERS] Buscando personagem ID: {character_id}")
+    logger.info("[CHARACTERS] Buscando personagem ID: %s", character_id)
     
     character = next((c for c in characters_db if c['id'] == character_id), None)
     
     if not character:
-        log_info(f"[CHARACTERS] Personagem {character_id} nao encontrado")
+        logger.info("[CHARACTERS] Personagem %s nao encontrado", character_id)
         return jsonify({'error': 'Personagem nao encontrado'}), 404
     
-    log_info(f"[CHARACTERS] Retornando dados: {character['name']} - {character['title']}")
+    logger.info("[CHARACTERS] Retornando dados: %s - %s", character['name'], character['title'])
     return jsonify(character)
 
 # Filtrando personagens pelas odds
 @app.route('/characters/odds/<odds>', methods=['GET'])
 def get_by_survival_odds(odds):
-    log_info(f"[CHARACTERS] Filtrando por survival odds: {odds}")
+    logger.info("[CHARACTERS] Filtrando por survival odds: %s", odds)
     
     odds = odds.capitalize()
     
@@ -84,7 +100,7 @@ def get_by_survival_odds(odds):
     
     filtered = [c for c in characters_db if c['survival_odds'] == odds]
     
-    log_info(f"[CHARACTERS] Encontrados {len(filtered)} personagens com survival odds {odds}")
+    logger.info("[CHARACTERS] Encontrados %s personagens com survival odds %s", len(filtered), odds)
     
     return jsonify({
         'survival_odds': odds,
@@ -97,7 +113,7 @@ def get_by_survival_odds(odds):
 def add_character():
     data = request.get_json()
     
-    log_info(f"[CHARACTERS] Adicionando novo personagem: {data.get('name', 'Unknown')}")
+    logger.info("[CHARACTERS] Adicionando novo personagem: %s", data.get('name', 'Unknown'))
     
     required_fields = ['name', 'title', 'health', 'hunger', 'sanity', 'special_ability', 'survival_odds']
     for field in required_fields:
@@ -119,20 +135,34 @@ def add_character():
     }
     
     characters_db.append(new_character)
+    characters_paginados.adicionar(new_character)
+    cache.invalidar()
     
-    log_info(f"[CHARACTERS] Personagem adicionado com ID: {new_id}")
-    log_info(f"[CHARACTERS] {new_character['name']} - {new_character['title']}")
+    logger.info("[CHARACTERS] Personagem adicionado com ID: %s", new_id)
+    logger.info("[CHARACTERS] %s - %s", new_character['name'], new_character['title'])
     
     return jsonify({
         'message': 'Personagem adicionado com sucesso',
         'character': new_character
     }), 201
 
+# JSON ou MessagePack conforme o Accept (comum/formatos.py)
+configurar_formatos(app)
+
+# Compressão gzip/br/zstd negociada pelo Accept-Encoding (comum/compressao.py)
+configurar_compressao(app)
+
+# Profiling sob demanda em /debug/profiles (comum/profiling.py)
+configurar_profiling(app, 'characters-service')
+
+# Métricas HTTP em /metrics (comum/metricas.py)
+instrumentar(app, 'characters-service')
+
 if __name__ == '__main__':
-    log_info("="*60)
-    log_info("Iniciando Characters Service - Don't Starve Together")
-    log_info("="*60)
-    log_info(f"Total de personagens carregados: {len(characters_db)}")
-    log_info("API rodando em http://0.0.0.0:5001")
-    log_info("="*60)
+    logger.info("="*60)
+    logger.info("Iniciando Characters Service - Don't Starve Together")
+    logger.info("="*60)
+    logger.info("Total de personagens carregados: %s", len(characters_db))
+    logger.info("API rodando em http://0.0.0.0:5001")
+    logger.info("="*60)
     app.run(host='0.0.0.0', port=5001, debug=False)
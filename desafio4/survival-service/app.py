@@ -1,7 +1,12 @@
-from flask import Flask, jsonify, request
-import sys
+from flask import Flask, jsonify
 import requests
 from datetime import datetime
+from metricas import instrumentar
+from logs import configurar_logs
+from profiling import configurar_profiling
+from compressao import configurar_compressao, ACEITA_CODIFICACAO
+from formatos import configurar_formatos, decodificar, ACEITA_FORMATO
+from ndjson import MIMETYPE_NDJSON, ler_ndjson, ndjson_solicitado, responder_ndjson
 
 app = Flask(__name__)
 
@@ -12,12 +17,15 @@ import logging
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
 
-def log_info(message):
-    print(message, flush=True)
-    sys.stdout.flush()
+logger = configurar_logs('survival-service')
 
 CHARACTERS_SERVICE_URL = "http://characters-service:5001"
 
+# Sessão com keep-alive que pede ao Characters Service as respostas em MessagePack e comprimidas
+http = requests.Session()
+http.headers['Accept-Encoding'] = ACEITA_CODIFICACAO
+http.headers['Accept'] = ACEITA_FORMATO
+
 def calculate_days_survived(joined_at):
     try:
         joined_date = datetime.strptime(joined_at, '%Y-%m-%d')
@@ -138,6 +146,18 @@ def generate_recommendations(character, risks):
     
     return recommendations
 
+def build_survival_stat(char):
+    days = calculate_days_survived(char['joined_at'])
+    return {
+        'id': char['id'],
+        'name': char['name'],
+        'title': char['title'],
+        'days_survived': days,
+        'survival_rating': calculate_survival_rating(days),
+        'survivability_score': calculate_survivability_score(char['health'], char['hunger'], char['sanity']),
+        'status': f"Surviving for {days} days in The Constant"
+    }
+
 # Retorna uma lista com os endpoints disponíveis
 @app.route('/')
 def home():
@@ -146,7 +166,7 @@ def home():
         'description': "Don't Starve Together - Survival Analysis & Statistics",
         'version': '1.0',
         'endpoints': {
-            'GET /survival-stats': 'Estatísticas de sobrevivência de todos os personagens',
+            'GET /survival-stats': 'Estatísticas de sobrevivência de todos os personagens (NDJSON com Accept: application/x-ndjson)',
             'GET /survival-stats/<id>': 'Análise detalhada de sobrevivência de um personagem',
             'GET /server-overview': 'Visão geral do servidor com estatísticas agregadas',
             'GET /health': 'Health check do serviço'
@@ -164,39 +184,41 @@ def health():
 # Lista os status de sobrevivencia de todos os perosnagens
 @app.route('/survival-stats', methods=['GET'])
 def list_survival_stats():
-    log_info("[SURVIVAL-STATS] Listando survival stats de todos os personagens...")
-    log_info("[SURVIVAL-STATS] Consultando Characters Service...")
+    logger.info("[SURVIVAL-STATS] Listando survival stats de todos os personagens...")
+    logger.info("[SURVIVAL-STATS] Consultando Characters Service...")
     
     try:
         url = f"{CHARACTERS_SERVICE_URL}/characters"
-        log_info(f"[SURVIVAL-STATS] HTTP GET → {url}")
+        logger.info("[SURVIVAL-STATS] HTTP GET → %s", url)
         
-        response = requests.get(url, timeout=5)
+        # Streaming: lê os personagens do Characters Service linha a linha e
+        # devolve cada survival stat assim que é calculado
+        if ndjson_solicitado():
+            response = http.get(url, headers={'Accept': MIMETYPE_NDJSON}, stream=True, timeout=5)
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError:
+                # Com stream=True a conexão só volta ao pool depois do close()
+                response.close()
+                raise
+            total = response.headers.get('X-Total-Count')
+            logger.info("[SURVIVAL-STATS] Enviando survival stats em streaming (NDJSON)")
+            resposta = responder_ndjson((build_survival_stat(char) for char in ler_ndjson(response)), total=total)
+            # Cliente que desiste antes do primeiro item: o gerador nem começa, então fecha aqui
+            resposta.call_on_close(response.close)
+            return resposta
+        
+        response = http.get(url, timeout=5)
         response.raise_for_status()
         
-        data = response.json()
+        data = decodificar(response)
         characters = data.get('characters', [])
         
-        log_info(f"[SURVIVAL-STATS] Recebidos {len(characters)} personagens")
+        logger.info("[SURVIVAL-STATS] Recebidos %s personagens", len(characters))
         
-        survival_stats = []
+        survival_stats = [build_survival_stat(char) for char in characters]
         
-        for char in characters:
-            days = calculate_days_survived(char['joined_at'])
-            rating = calculate_survival_rating(days)
-            score = calculate_survivability_score(char['health'], char['hunger'], char['sanity'])
-            
-            survival_stats.append({
-                'id': char['id'],
-                'name': char['name'],
-                'title': char['title'],
-                'days_survived': days,
-                'survival_rating': rating,
-                'survivability_score': score,
-                'status': f"Surviving for {days} days in The Constant"
-            })
-        
-        log_info(f"[SURVIVAL-STATS] Processados {len(survival_stats)} survival stats")
+        logger.info("[SURVIVAL-STATS] Processados %s survival stats", len(survival_stats))
         
         return jsonify({
             'total': len(survival_stats),
@@ -205,7 +227,7 @@ def list_survival_stats():
         })
         
     except requests.exceptions.RequestException as e:
-        log_info(f"[SURVIVAL-STATS] ERRO ao conectar com Characters Service: {str(e)}")
+        logger.error("[SURVIVAL-STATS] ERRO ao conectar com Characters Service: %s", e)
         return jsonify({
             'error': 'Characters Service indisponivel',
             'message': 'Não foi possível obter dados dos personagens',
@@ -215,23 +237,23 @@ def list_survival_stats():
 # Lista dados detalhados de um perosnagem pelo ID
 @app.route('/survival-stats/<int:character_id>', methods=['GET'])
 def get_survival_stats(character_id):
-    log_info(f"[SURVIVAL-STATS] Consultando survival stats para personagem ID: {character_id}")
-    log_info("[SURVIVAL-STATS] Consultando Characters Service...")
+    logger.info("[SURVIVAL-STATS] Consultando survival stats para personagem ID: %s", character_id)
+    logger.info("[SURVIVAL-STATS] Consultando Characters Service...")
     
     try:
         url = f"{CHARACTERS_SERVICE_URL}/characters/{character_id}"
-        log_info(f"[SURVIVAL-STATS] HTTP GET → {url}")
+        logger.info("[SURVIVAL-STATS] HTTP GET → %s", url)
         
-        response = requests.get(url, timeout=5)
+        response = http.get(url, timeout=5)
         
         if response.status_code == 404:
-            log_info(f"[SURVIVAL-STATS] Personagem {character_id} não encontrado")
+            logger.info("[SURVIVAL-STATS] Personagem %s não encontrado", character_id)
             return jsonify({'error': 'Personagem não encontrado'}), 404
         
         response.raise_for_status()
-        character = response.json()
+        character = decodificar(response)
         
-        log_info(f"[SURVIVAL-STATS] Recebidos dados de: {character['name']}")
+        logger.info("[SURVIVAL-STATS] Recebidos dados de: %s", character['name'])
         
         days = calculate_days_survived(character['joined_at'])
         rating = calculate_survival_rating(days)
@@ -239,10 +261,10 @@ def get_survival_stats(character_id):
         risks = assess_risks(character['health'], character['hunger'], character['sanity'])
         recommendations = generate_recommendations(character, risks)
         
-        log_info(f"[SURVIVAL-STATS] Calculando dias sobrevividos: {days} dias")
-        log_info(f"[SURVIVAL-STATS] Survival rating: {rating}")
-        log_info(f"[SURVIVAL-STATS] Survivability score: {score}/10")
-        log_info(f"[SURVIVAL-STATS] Avaliando riscos... Status: {risks['overall_risk']}")
+        logger.info("[SURVIVAL-STATS] Calculando dias sobrevividos: %s dias", days)
+        logger.info("[SURVIVAL-STATS] Survival rating: %s", rating)
+        logger.info("[SURVIVAL-STATS] Survivability score: %s/10", score)
+        logger.info("[SURVIVAL-STATS] Avaliando riscos... Status: %s", risks['overall_risk'])
         
         result = {
             'id': character['id'],
@@ -269,12 +291,12 @@ def get_survival_stats(character_id):
             'calculated_at': datetime.now().isoformat()
         }
         
-        log_info("[SURVIVAL-STATS] Retornando survival stats completo")
+        logger.info("[SURVIVAL-STATS] Retornando survival stats completo")
         
         return jsonify(result)
         
     except requests.exceptions.RequestException as e:
-        log_info(f"[SURVIVAL-STATS] ERRO ao conectar com Characters Service: {str(e)}")
+        logger.error("[SURVIVAL-STATS] ERRO ao conectar com Characters Service: %s", e)
         return jsonify({
             'error': 'Characters Service indisponivel',
             'message': 'Não foi possível obter dados do personagem',
@@ -284,17 +306,17 @@ def get_survival_stats(character_id):
 # Visão geral do servidor
 @app.route('/server-overview', methods=['GET'])
 def server_overview():
-    log_info("[SURVIVAL-STATS] Gerando visão geral do servidor...")
-    log_info("[SURVIVAL-STATS] Consultando Characters Service...")
+    logger.info("[SURVIVAL-STATS] Gerando visão geral do servidor...")
+    logger.info("[SURVIVAL-STATS] Consultando Characters Service...")
     
     try:
         url = f"{CHARACTERS_SERVICE_URL}/characters"
-        log_info(f"[SURVIVAL-STATS] HTTP GET → {url}")
+        logger.info("[SURVIVAL-STATS] HTTP GET → %s", url)
         
-        response = requests.get(url, timeout=5)
+        response = http.get(url, timeout=5)
         response.raise_for_status()
         
-        data = response.json()
+        data = decodificar(response)
         characters = data.get('characters', [])
         
         if not characters:
@@ -315,8 +337,8 @@ def server_overview():
         
         total_days = sum(calculate_days_survived(c['joined_at']) for c in characters)
         
-        log_info(f"[SURVIVAL-STATS] Servidor com {total_chars} personagens")
-        log_info(f"[SURVIVAL-STATS] Total acumulado: {total_days} dias sobrevividos")
+        logger.info("[SURVIVAL-STATS] Servidor com %s personagens", total_chars)
+        logger.info("[SURVIVAL-STATS] Total acumulado: %s dias sobrevividos", total_days)
         
         return jsonify({
             'server_statistics': {
@@ -335,17 +357,29 @@ def server_overview():
         })
         
     except requests.exceptions.RequestException as e:
-        log_info(f"[SURVIVAL-STATS] ERRO ao conectar com Characters Service: {str(e)}")
+        logger.error("[SURVIVAL-STATS] ERRO ao conectar com Characters Service: %s", e)
         return jsonify({
             'error': 'Characters Service indisponivel',
             'message': 'Não foi possível gerar visão geral do servidor'
         }), 503
 
+# JSON ou MessagePack conforme o Accept (comum/formatos.py)
+configurar_formatos(app)
+
+# Compressão gzip/br/zstd negociada pelo Accept-Encoding (comum/compressao.py)
+configurar_compressao(app)
+
+# Profiling sob demanda em /debug/profiles (comum/profiling.py)
+configurar_profiling(app, 'survival-service')
+
+# Métricas HTTP em /metrics (comum/metricas.py)
+instrumentar(app, 'survival-service')
+
 if __name__ == '__main__':
-    log_info("="*60)
-    log_info("Iniciando Survival Stats Service")
-    log_info("="*60)
-    log_info(f"Characters Service URL: {CHARACTERS_SERVICE_URL}")
-    log_info("API rodando em http://0.0.0.0:5002")
-    log_info("="*60)
+    logger.info("="*60)
+    logger.info("Iniciando Survival Stats Service")
+    logger.info("="*60)
+    logger.info("Characters Service URL: %s", CHARACTERS_SERVICE_URL)
+    logger.info("API rodando em http://0.0.0.0:5002")
+    logger.info("="*60)
     app.run(host='0.0.0.0', port=5002, debug=False)
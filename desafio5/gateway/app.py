@@ -1,7 +1,12 @@
 from flask import Flask, jsonify, request
-import sys
 import requests
 from datetime import datetime
+from metricas import instrumentar
+from logs import configurar_logs
+from profiling import configurar_profiling
+from compressao import configurar_compressao, cabecalhos_repasse, repassar, ACEITA_CODIFICACAO
+from formatos import configurar_formatos, decodificar, ACEITA_FORMATO
+from rastreamento import configurar_rastreamento, SessaoRastreada
 
 app = Flask(__name__)
 
@@ -12,13 +17,23 @@ import logging
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
 
-def log_info(message):
-    print(message, flush=True)
-    sys.stdout.flush()
+logger = configurar_logs('gateway')
+
+# Trace id entre os serviços, Server-Timing e spans (comum/rastreamento.py)
+configurar_rastreamento(app, 'gateway')
+
+# Sessão com keep-alive que propaga o trace para os serviços e pede as respostas
+# em MessagePack e comprimidas
+http = SessaoRastreada()
+http.headers['Accept-Encoding'] = ACEITA_CODIFICACAO
+http.headers['Accept'] = ACEITA_FORMATO
 
 RECORDS_SERVICE_URL = "http://records-service:5001"
 RENTALS_SERVICE_URL = "http://rentals-service:5002"
 
+# Discos pedidos ao rentals-service por recomendação antes de filtrar os sem estoque
+RECOMENDACOES_CANDIDATOS = 20
+
 @app.route('/')
 def home():
     return jsonify({
@@ -27,34 +42,37 @@ def home():
         'version': '1.0',
         'architecture': 'API Gateway Pattern',
         'endpoints': {
-            'GET /records': 'Lista catálogo de discos',
+            'GET /records': 'Lista catálogo de discos (limit, after, sort, fields)',
             'GET /records/<id>': 'Detalhes de um disco',
             'GET /records/genre/<genre>': 'Filtra por gênero',
-            'GET /customers': 'Lista clientes',
-            'GET /rentals': 'Lista aluguéis',
-            'GET /rentals/active': 'Aluguéis ativos',
+            'GET /records/search?q=': 'Busca por título, artista ou gênero (limit)',
+            'GET /customers': 'Lista clientes (limit, after, sort, fields)',
+            'GET /rentals': 'Lista aluguéis (limit, after, sort, fields)',
+            'GET /rentals/active': 'Aluguéis ativos (limit, after, sort, fields)',
+            'GET /rentals/overdue': 'Aluguéis atrasados com a multa acumulada',
             'GET /records/<id>/availability': 'Disco + disponibilidade',
             'GET /customers/<id>/profile': 'Perfil completo + histórico',
             'POST /rent': 'Criar aluguel + atualizar estoque',
             'PUT /return/<rental_id>': 'Devolver + liberar estoque',
-            'GET /recommendations/<customer_id>': 'Recomendações baseadas em histórico'
+            'GET /analytics/...': 'Agregados por hora/dia: totals, genres, genres/<genre>, records, records/<id>',
+            'GET /recommendations/<customer_id>': 'Recomendações por co-aluguel (quem alugou o mesmo também alugou)'
         }
     })
 
 @app.route('/health')
 def health():
-    log_info("[GATEWAY] Verificando saúde dos microsserviços...")
+    logger.info("[GATEWAY] Verificando saúde dos microsserviços...")
     
     services_health = {}
     
     try:
-        response = requests.get(f"{RECORDS_SERVICE_URL}/health", timeout=2)
+        response = http.get(f"{RECORDS_SERVICE_URL}/health", timeout=2)
         services_health['records_service'] = 'healthy' if response.status_code == 200 else 'unhealthy'
     except:
         services_health['records_service'] = 'unavailable'
     
     try:
-        response = requests.get(f"{RENTALS_SERVICE_URL}/health", timeout=2)
+        response = http.get(f"{RENTALS_SERVICE_URL}/health", timeout=2)
         services_health['rentals_service'] = 'healthy' if response.status_code == 200 else 'unhealthy'
     except:
         services_health['rentals_service'] = 'unavailable'
@@ -71,17 +89,22 @@ def health():
 
 @app.route('/records', methods=['GET'])
 def list_records():
-    log_info("[GATEWAY] Buscando catálogo de discos...")
+    logger.info("[GATEWAY] Buscando catálogo de discos...")
     
     try:
-        response = requests.get(f"{RECORDS_SERVICE_URL}/records", timeout=5)
+        # Repassa limit/after/sort/fields e devolve os bytes do serviço como vieram (já comprimidos ou 304)
+        response = http.get(f"{RECORDS_SERVICE_URL}/records", params=request.args,
+                            headers=cabecalhos_repasse(), stream=True, timeout=5)
+        # Parâmetro de paginação inválido: o 400 do serviço volta como veio
+        if response.status_code == 400:
+            return repassar(response)
         response.raise_for_status()
         
-        log_info(f"[GATEWAY] Pronto! Catálogo carregado")
-        return jsonify(response.json())
+        logger.info("[GATEWAY] Pronto! Catálogo carregado")
+        return repassar(response)
         
     except requests.exceptions.RequestException as e:
-        log_info(f"[GATEWAY] ERRO: Serviço de Records indisponivel")
+        logger.error("[GATEWAY] ERRO: Serviço de Records indisponivel")
         return jsonify({
             'error': 'Serviço de discos está indisponivel',
             'details': str(e)
@@ -89,66 +112,121 @@ def list_records():
 
 @app.route('/records/<int:record_id>', methods=['GET'])
 def get_record(record_id):
-    log_info(f"[GATEWAY] Procurando disco #{record_id}...")
+    logger.info("[GATEWAY] Procurando disco #%s...", record_id)
     
     try:
-        response = requests.get(f"{RECORDS_SERVICE_URL}/records/{record_id}", timeout=5)
+        response = http.get(f"{RECORDS_SERVICE_URL}/records/{record_id}", timeout=5)
         
         if response.status_code == 404:
             return jsonify({'error': 'Disco não encontrado'}), 404
         
         response.raise_for_status()
-        return jsonify(response.json())
+        return jsonify(decodificar(response))
         
     except requests.exceptions.RequestException as e:
-        log_info(f"[GATEWAY] ERRO: {str(e)}")
+        logger.error("[GATEWAY] ERRO: %s", e)
         return jsonify({'error': 'Records Service indisponível'}), 503
 
 @app.route('/records/genre/<genre>', methods=['GET'])
 def get_records_by_genre(genre):
-    log_info(f"[GATEWAY] Roteando GET /records/genre/{genre}")
+    logger.info("[GATEWAY] Roteando GET /records/genre/%s", genre)
+    
+    try:
+        response = http.get(f"{RECORDS_SERVICE_URL}/records/genre/{genre}", headers=cabecalhos_repasse(), stream=True, timeout=5)
+        response.raise_for_status()
+        return repassar(response)
+        
+    except requests.exceptions.RequestException as e:
+        return jsonify({'error': 'Records Service indisponível'}), 503
+
+@app.route('/records/search', methods=['GET'])
+def search_records():
+    logger.info("[GATEWAY] Roteando GET /records/search?q=%s", request.args.get('q', ''))
     
     try:
-        response = requests.get(f"{RECORDS_SERVICE_URL}/records/genre/{genre}", timeout=5)
+        response = http.get(f"{RECORDS_SERVICE_URL}/records/search", params=request.args,
+                            headers=cabecalhos_repasse(), stream=True, timeout=5)
+        if response.status_code == 400:
+            return repassar(response)
         response.raise_for_status()
-        return jsonify(response.json())
+        return repassar(response)
         
     except requests.exceptions.RequestException as e:
         return jsonify({'error': 'Records Service indisponível'}), 503
 
 
+
+# Agregados do rentals-service (/analytics/totals, /genres, /records...)
+@app.route('/analytics/<path:caminho>', methods=['GET'])
+def get_analytics(caminho):
+    logger.info("[GATEWAY] Roteando GET /analytics/%s", caminho)
+    
+    try:
+        response = http.get(f"{RENTALS_SERVICE_URL}/analytics/{caminho}", params=request.args,
+                            headers=cabecalhos_repasse(), stream=True, timeout=5)
+        if response.status_code in (400, 404):
+            return repassar(response)
+        response.raise_for_status()
+        return repassar(response)
+        
+    except requests.exceptions.RequestException as e:
+        return jsonify({'error': 'Rentals Service indisponível'}), 503
+
 @app.route('/customers', methods=['GET'])
 def list_customers():
-    log_info("[GATEWAY] Roteando GET /customers")
+    logger.info("[GATEWAY] Roteando GET /customers")
     
     try:
-        response = requests.get(f"{RENTALS_SERVICE_URL}/customers", timeout=5)
+        response = http.get(f"{RENTALS_SERVICE_URL}/customers", params=request.args,
+                            headers=cabecalhos_repasse(), stream=True, timeout=5)
+        if response.status_code == 400:
+            return repassar(response)
         response.raise_for_status()
-        return jsonify(response.json())
+        return repassar(response)
         
     except requests.exceptions.RequestException as e:
         return jsonify({'error': 'Rentals Service indisponível'}), 503
 
 @app.route('/rentals', methods=['GET'])
 def list_rentals():
-    log_info("[GATEWAY] Roteando GET /rentals")
+    logger.info("[GATEWAY] Roteando GET /rentals")
     
     try:
-        response = requests.get(f"{RENTALS_SERVICE_URL}/rentals", timeout=5)
+        response = http.get(f"{RENTALS_SERVICE_URL}/rentals", params=request.args,
+                            headers=cabecalhos_repasse(), stream=True, timeout=5)
+        if response.status_code == 400:
+            return repassar(response)
         response.raise_for_status()
-        return jsonify(response.json())
+        return repassar(response)
         
     except requests.exceptions.RequestException as e:
         return jsonify({'error': 'Rentals Service indisponível'}), 503
 
 @app.route('/rentals/active', methods=['GET'])
 def get_active_rentals():
-    log_info("[GATEWAY] Roteando GET /rentals/active")
+    logger.info("[GATEWAY] Roteando GET /rentals/active")
+    
+    try:
+        response = http.get(f"{RENTALS_SERVICE_URL}/rentals/active", params=request.args,
+                            headers=cabecalhos_repasse(), stream=True, timeout=5)
+        if response.status_code == 400:
+            return repassar(response)
+        response.raise_for_status()
+        return repassar(response)
+        
+    except requests.exceptions.RequestException as e:
+        return jsonify({'error': 'Rentals Service indisponível'}), 503
+
+
+
+@app.route('/rentals/overdue', methods=['GET'])
+def get_overdue_rentals():
+    logger.info("[GATEWAY] Roteando GET /rentals/overdue")
     
     try:
-        response = requests.get(f"{RENTALS_SERVICE_URL}/rentals/active", timeout=5)
+        response = http.get(f"{RENTALS_SERVICE_URL}/rentals/overdue", headers=cabecalhos_repasse(), stream=True, timeout=5)
         response.raise_for_status()
-        return jsonify(response.json())
+        return repassar(response)
         
     except requests.exceptions.RequestException as e:
         return jsonify({'error': 'Rentals Service indisponível'}), 503
@@ -159,19 +237,19 @@ def get_active_rentals():
 def get_record_availability(record_id):
     
     try:
-        log_info(f"[GATEWAY] → GET {RECORDS_SERVICE_URL}/records/{record_id}")
-        record_response = requests.get(f"{RECORDS_SERVICE_URL}/records/{record_id}", timeout=5)
+        logger.info("[GATEWAY] → GET %s/records/%s", RECORDS_SERVICE_URL, record_id)
+        record_response = http.get(f"{RECORDS_SERVICE_URL}/records/{record_id}", timeout=5)
         
         if record_response.status_code == 404:
             return jsonify({'error': 'Disco não encontrado'}), 404
         
         record_response.raise_for_status()
-        record = record_response.json()
+        record = decodificar(record_response)
         
-        log_info(f"[GATEWAY] → GET {RENTALS_SERVICE_URL}/rentals/active")
-        rentals_response = requests.get(f"{RENTALS_SERVICE_URL}/rentals/active", timeout=5)
+        logger.info("[GATEWAY] → GET %s/rentals/active", RENTALS_SERVICE_URL)
+        rentals_response = http.get(f"{RENTALS_SERVICE_URL}/rentals/active", timeout=5)
         rentals_response.raise_for_status()
-        active_rentals = rentals_response.json()['rentals']
+        active_rentals = decodificar(rentals_response)['rentals']
         
         currently_rented_by = [
             r['customer_name'] for r in active_rentals 
@@ -184,7 +262,7 @@ def get_record_availability(record_id):
             if due_dates:
                 next_available = min(due_dates)
         
-        log_info("[GATEWAY] Agregação completa!")
+        logger.info("[GATEWAY] Agregação completa!")
         
         result = {
             'record': {
@@ -206,56 +284,45 @@ def get_record_availability(record_id):
         return jsonify(result)
         
     except requests.exceptions.RequestException as e:
-        log_info(f"[GATEWAY] ERRO na agregação: {str(e)}")
+        logger.error("[GATEWAY] ERRO na agregação: %s", e)
         return jsonify({'error': 'Erro ao agregar dados dos serviços'}), 503
 
 @app.route('/customers/<int:customer_id>/profile', methods=['GET'])
 def get_customer_profile(customer_id):
-    log_info("[GATEWAY] Montando perfil completo do cliente...")
+    logger.info("[GATEWAY] Montando perfil completo do cliente...")
     
     try:
-        log_info(f"[GATEWAY] → GET {RENTALS_SERVICE_URL}/customers/{customer_id}")
-        customer_response = requests.get(f"{RENTALS_SERVICE_URL}/customers/{customer_id}", timeout=5)
+        # Totais já acumulados pelo rentals-service: o histórico não trafega
+        logger.info("[GATEWAY] → GET %s/customers/%s/summary", RENTALS_SERVICE_URL, customer_id)
+        summary_response = http.get(f"{RENTALS_SERVICE_URL}/customers/{customer_id}/summary", timeout=5)
         
-        if customer_response.status_code == 404:
+        if summary_response.status_code == 404:
             return jsonify({'error': 'Cliente não encontrado'}), 404
         
-        customer_response.raise_for_status()
-        customer = customer_response.json()
-        
-        log_info(f"[GATEWAY] → GET {RENTALS_SERVICE_URL}/rentals/customer/{customer_id}")
-        rentals_response = requests.get(f"{RENTALS_SERVICE_URL}/rentals/customer/{customer_id}", timeout=5)
-        rentals_response.raise_for_status()
-        rentals_data = rentals_response.json()
-        
-        active_rentals = [r for r in rentals_data['rentals'] if r['status'] == 'active']
-        total_spent = sum(r['total_cost'] + r['late_fee'] for r in rentals_data['rentals'])
+        summary_response.raise_for_status()
+        summary = decodificar(summary_response)
+        customer = summary['customer']
         
-        log_info("[GATEWAY] Perfil agregado com sucesso!")
+        logger.info("[GATEWAY] Perfil agregado com sucesso!")
         
         result = {
             'customer': customer,
-            'active_rentals': active_rentals,
-            'statistics': {
-                'total_rentals': rentals_data['total_rentals'],
-                'active_count': len(active_rentals),
-                'total_spent': round(total_spent, 2),
-                'favorite_genre': customer['favorite_genre']
-            },
+            'active_rentals': summary['active_rentals'],
+            'statistics': dict(summary['statistics'], favorite_genre=customer['favorite_genre']),
             'fetched_from': ['rentals-service']
         }
         
         return jsonify(result)
         
     except requests.exceptions.RequestException as e:
-        log_info(f"[GATEWAY] ERRO: {str(e)}")
+        logger.error("[GATEWAY] ERRO: %s", e)
         return jsonify({'error': 'Erro ao montar perfil do cliente'}), 503
 
 @app.route('/rent', methods=['POST'])
 def create_rental():
     data = request.get_json()
     
-    log_info("[GATEWAY] Iniciando processo de aluguel...")
+    logger.info("[GATEWAY] Iniciando processo de aluguel...")
     
     required_fields = ['customer_id', 'record_id', 'rental_days']
     for field in required_fields:
@@ -263,64 +330,65 @@ def create_rental():
             return jsonify({'error': f'Campo obrigatório: {field}'}), 400
     
     try:
-        log_info(f"[GATEWAY] → GET {RECORDS_SERVICE_URL}/records/{data['record_id']}")
-        record_response = requests.get(f"{RECORDS_SERVICE_URL}/records/{data['record_id']}", timeout=5)
+        logger.info("[GATEWAY] → GET %s/records/%s", RECORDS_SERVICE_URL, data['record_id'])
+        record_response = http.get(f"{RECORDS_SERVICE_URL}/records/{data['record_id']}", timeout=5)
         
         if record_response.status_code == 404:
             return jsonify({'error': 'Disco não encontrado'}), 404
         
         record_response.raise_for_status()
-        record = record_response.json()
+        record = decodificar(record_response)
         
         if record['available_copies'] <= 0:
-            log_info(f"[GATEWAY] ERRO: Disco '{record['title']}' sem cópias disponíveis")
+            logger.error("[GATEWAY] ERRO: Disco '%s' sem cópias disponíveis", record['title'])
             return jsonify({
                 'error': 'Disco indisponível',
                 'record': record['title'],
                 'available_copies': 0
             }), 400
         
-        log_info(f"[GATEWAY] → GET {RENTALS_SERVICE_URL}/customers/{data['customer_id']}")
-        customer_response = requests.get(f"{RENTALS_SERVICE_URL}/customers/{data['customer_id']}", timeout=5)
+        logger.info("[GATEWAY] → GET %s/customers/%s", RENTALS_SERVICE_URL, data['customer_id'])
+        customer_response = http.get(f"{RENTALS_SERVICE_URL}/customers/{data['customer_id']}", timeout=5)
         
         if customer_response.status_code == 404:
             return jsonify({'error': 'Cliente não encontrado'}), 404
         
         customer_response.raise_for_status()
-        customer = customer_response.json()
+        customer = decodificar(customer_response)
         
-        log_info(f"[GATEWAY] Validações OK! Cliente: {customer['name']}, Disco: {record['title']}")
+        logger.info("[GATEWAY] Validações OK! Cliente: %s, Disco: %s", customer['name'], record['title'])
         
         rental_data = {
             'customer_id': data['customer_id'],
             'record_id': data['record_id'],
             'record_title': record['title'],
+            'record_genre': record['genre'],
             'daily_price': record['daily_rental_price'],
             'rental_days': data['rental_days']
         }
         
-        log_info(f"[GATEWAY] → POST {RENTALS_SERVICE_URL}/rentals")
-        rental_response = requests.post(
+        logger.info("[GATEWAY] → POST %s/rentals", RENTALS_SERVICE_URL)
+        rental_response = http.post(
             f"{RENTALS_SERVICE_URL}/rentals",
             json=rental_data,
             timeout=5
         )
         
         if rental_response.status_code != 201:
-            error_data = rental_response.json()
+            error_data = decodificar(rental_response)
             return jsonify(error_data), rental_response.status_code
         
-        rental_result = rental_response.json()
+        rental_result = decodificar(rental_response)
         
-        log_info(f"[GATEWAY] → PUT {RECORDS_SERVICE_URL}/records/{data['record_id']}/decrease")
-        decrease_response = requests.put(
+        logger.info("[GATEWAY] → PUT %s/records/%s/decrease", RECORDS_SERVICE_URL, data['record_id'])
+        decrease_response = http.put(
             f"{RECORDS_SERVICE_URL}/records/{data['record_id']}/decrease",
             timeout=5
         )
         decrease_response.raise_for_status()
         
-        log_info("[GATEWAY] Aluguel concluído")
-        log_info(f"[GATEWAY] Aluguel #{rental_result['rental']['id']} registrado")
+        logger.info("[GATEWAY] Aluguel concluído")
+        logger.info("[GATEWAY] Aluguel #%s registrado", rental_result['rental']['id'])
         
         return jsonify({
             'message': 'Aluguel realizado com sucesso',
@@ -336,38 +404,38 @@ def create_rental():
 
 @app.route('/return/<int:rental_id>', methods=['PUT'])
 def return_rental(rental_id):
-    log_info("[GATEWAY] Processando devolução...")
+    logger.info("[GATEWAY] Processando devolução...")
     
     try:
-        log_info(f"[GATEWAY] → GET {RENTALS_SERVICE_URL}/rentals/{rental_id}")
-        rental_response = requests.get(f"{RENTALS_SERVICE_URL}/rentals/{rental_id}", timeout=5)
+        logger.info("[GATEWAY] → GET %s/rentals/%s", RENTALS_SERVICE_URL, rental_id)
+        rental_response = http.get(f"{RENTALS_SERVICE_URL}/rentals/{rental_id}", timeout=5)
         
         if rental_response.status_code == 404:
             return jsonify({'error': 'Aluguel não encontrado'}), 404
         
         rental_response.raise_for_status()
-        rental = rental_response.json()
+        rental = decodificar(rental_response)
         
         if rental['status'] == 'returned':
             return jsonify({'error': 'Aluguel já foi devolvido'}), 400
         
-        log_info(f"[GATEWAY] → PUT {RENTALS_SERVICE_URL}/rentals/{rental_id}/return")
-        return_response = requests.put(
+        logger.info("[GATEWAY] → PUT %s/rentals/%s/return", RENTALS_SERVICE_URL, rental_id)
+        return_response = http.put(
             f"{RENTALS_SERVICE_URL}/rentals/{rental_id}/return",
             timeout=5
         )
         return_response.raise_for_status()
-        return_result = return_response.json()
+        return_result = decodificar(return_response)
         
-        log_info(f"[GATEWAY] → PUT {RECORDS_SERVICE_URL}/records/{rental['record_id']}/increase")
-        increase_response = requests.put(
+        logger.info("[GATEWAY] → PUT %s/records/%s/increase", RECORDS_SERVICE_URL, rental['record_id'])
+        increase_response = http.put(
             f"{RECORDS_SERVICE_URL}/records/{rental['record_id']}/increase",
             timeout=5
         )
         increase_response.raise_for_status()
         
-        log_info("[GATEWAY] Devolução concluída!")
-        log_info(f"[GATEWAY] '{rental['record_title']}' devolvido ao estoque")
+        logger.info("[GATEWAY] Devolução concluída!")
+        logger.info("[GATEWAY] '%s' devolvido ao estoque", rental['record_title'])
         
         return jsonify({
             'message': 'Devolução processada com sucesso',
@@ -384,29 +452,46 @@ def return_rental(rental_id):
 
 @app.route('/recommendations/<int:customer_id>', methods=['GET'])
 def get_recommendations(customer_id):
-    log_info("[GATEWAY] Preparando recomendações baseadas em historico...")
+    logger.info("[GATEWAY] Preparando recomendações baseadas em historico...")
     
     try:
-        log_info(f"[GATEWAY] → GET {RENTALS_SERVICE_URL}/customers/{customer_id}")
-        customer_response = requests.get(f"{RENTALS_SERVICE_URL}/customers/{customer_id}", timeout=5)
+        logger.info("[GATEWAY] → GET %s/customers/%s", RENTALS_SERVICE_URL, customer_id)
+        customer_response = http.get(f"{RENTALS_SERVICE_URL}/customers/{customer_id}", timeout=5)
         
         if customer_response.status_code == 404:
             return jsonify({'error': 'Cliente não encontrado'}), 404
         
         customer_response.raise_for_status()
-        customer = customer_response.json()
-        
+        customer = decodificar(customer_response)
         favorite_genre = customer['favorite_genre']
-        log_info(f"[GATEWAY] Gênero favorito: {favorite_genre}")
-        log_info(f"[GATEWAY] → GET {RECORDS_SERVICE_URL}/records/genre/{favorite_genre}")
-        
-        records_response = requests.get(f"{RECORDS_SERVICE_URL}/records/genre/{favorite_genre}", timeout=5)
-        records_response.raise_for_status()
-        genre_records = records_response.json()['records']
         
-        available_recommendations = [r for r in genre_records if r['available_copies'] > 0]
-        
-        log_info(f"[GATEWAY] {len(available_recommendations)} recomendações encontradas")
+        # Candidatos a mais que os 5 devolvidos: parte pode estar sem estoque
+        logger.info("[GATEWAY] → GET %s/customers/%s/recommendations", RENTALS_SERVICE_URL, customer_id)
+        similar_response = http.get(f"{RENTALS_SERVICE_URL}/customers/{customer_id}/recommendations",
+                                    params={'limit': RECOMENDACOES_CANDIDATOS}, timeout=5)
+        similar_response.raise_for_status()
+        scores = {r['record_id']: r['score'] for r in decodificar(similar_response)['recommendations']}
+        
+        if scores:
+            # Disponibilidade de todos os candidatos em uma chamada só
+            logger.info("[GATEWAY] → GET %s/records/batch (%s discos)", RECORDS_SERVICE_URL, len(scores))
+            records_response = http.get(f"{RECORDS_SERVICE_URL}/records/batch",
+                                        params={'ids': ','.join(map(str, scores))}, timeout=5)
+            records_response.raise_for_status()
+            candidates = [dict(r, score=scores[r['id']]) for r in decodificar(records_response)['records']]
+            generated_by = 'co-rental'
+        else:
+            # Cliente sem histórico: não há com o que comparar, vale o gênero favorito
+            logger.info("[GATEWAY] Sem histórico, usando gênero favorito: %s", favorite_genre)
+            logger.info("[GATEWAY] → GET %s/records/genre/%s", RECORDS_SERVICE_URL, favorite_genre)
+            records_response = http.get(f"{RECORDS_SERVICE_URL}/records/genre/{favorite_genre}", timeout=5)
+            records_response.raise_for_status()
+            candidates = decodificar(records_response)['records']
+            generated_by = 'favorite_genre'
+        
+        available_recommendations = [r for r in candidates if r['available_copies'] > 0]
+        
+        logger.info("[GATEWAY] %s recomendações encontradas", len(available_recommendations))
         
         return jsonify({
             'customer': {
@@ -416,19 +501,31 @@ def get_recommendations(customer_id):
             },
             'recommendations': available_recommendations[:5],
             'total_available': len(available_recommendations),
-            'generated_by': 'gateway'
+            'generated_by': generated_by
         })
         
     except requests.exceptions.RequestException as e:
-        log_info(f"[GATEWAY] ERRO: {str(e)}")
+        logger.error("[GATEWAY] ERRO: %s", e)
         return jsonify({'error': 'Falha ao gerar recomendações'}), 503
 
+# JSON ou MessagePack conforme o Accept (comum/formatos.py)
+configurar_formatos(app)
+
+# Compressão gzip/br/zstd negociada pelo Accept-Encoding (comum/compressao.py)
+configurar_compressao(app)
+
+# Profiling sob demanda em /debug/profiles (comum/profiling.py)
+configurar_profiling(app, 'gateway')
+
+# Métricas HTTP em /metrics (comum/metricas.py)
+instrumentar(app, 'gateway')
+
 if __name__ == '__main__':
-    log_info("="*60)
-    log_info("Iniciando API Gateway - Locadora de Discos de Vinil")
-    log_info("="*60)
-    log_info(f"Records Service: {RECORDS_SERVICE_URL}")
-    log_info(f"Rentals Service: {RENTALS_SERVICE_URL}")
-    log_info("Gateway rodando em http://0.0.0.0:8080")
-    log_info("="*60)
+    logger.info("="*60)
+    logger.info("Iniciando API Gateway - Locadora de Discos de Vinil")
+    logger.info("="*60)
+    logger.info("Records Service: %s", RECORDS_SERVICE_URL)
+    logger.info("Rentals Service: %s", RENTALS_SERVICE_URL)
+    logger.info("Gateway rodando em http://0.0.0.0:8080")
+    logger.info("="*60)
     app.run(host='0.0.0.0', port=8080, debug=False)
@@ -1,7 +1,16 @@
 from flask import Flask, jsonify, request
-import sys
 import json
 from datetime import datetime
+from metricas import instrumentar
+from logs import configurar_logs
+from profiling import configurar_profiling
+from compressao import configurar_compressao
+from formatos import configurar_formatos
+from cache_respostas import CacheRespostas
+from paginacao import Paginador, paginacao_solicitada
+from ndjson import ndjson_solicitado, responder_ndjson
+from rastreamento import configurar_rastreamento
+from busca import BUSCA_LIMITE_MAXIMO, BUSCA_LIMITE_PADRAO, IndiceBusca
 
 app = Flask(__name__)
 
@@ -12,9 +21,10 @@ import logging
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
 
-def log_info(message):
-    print(message, flush=True)
-    sys.stdout.flush()
+logger = configurar_logs('records-service')
+
+# Trace id entre os serviços, Server-Timing e spans (comum/rastreamento.py)
+configurar_rastreamento(app, 'records-service')
 
 def load_records():
     with open('records_data.json', 'r', encoding='utf-8') as f:
@@ -22,14 +32,25 @@ def load_records():
 
 records_db = load_records()
 
+# Listagens já serializadas, invalidadas a cada escrita (comum/cache_respostas.py)
+cache = CacheRespostas()
+
+# Índices para paginação por cursor, ordenação e projeção (comum/paginacao.py)
+records_paginados = Paginador(records_db, ('id', 'title', 'artist', 'genre', 'year', 'daily_rental_price'))
+
+# Índice invertido de título, artista e gênero para /records/search (busca.py)
+indice_busca = IndiceBusca(records_db)
+
 @app.route('/')
 def home():
-    return jsonify({
+    return cache.responder('home', lambda: {
         'service': 'Records Service',
         'description': 'Vinyl Records Catalog Management',
         'version': '1.0',
         'endpoints': {
-            'GET /records': 'Lista todos os discos do catálogo',
+            'GET /records': 'Lista todos os discos do catálogo (limit, after, sort, fields)',
+            'GET /records/search?q=': 'Busca por título, artista ou gênero, com prefixo e erros de digitação (limit)',
+            'GET /records/batch?ids=': 'Vários discos pelo id em uma chamada, na ordem pedida',
             'GET /records/<id>': 'Detalhes de um disco específico',
             'GET /records/genre/<genre>': 'Filtra discos por gênero',
             'GET /records/available': 'Lista apenas discos disponíveis',
@@ -37,7 +58,7 @@ def home():
             'PUT /records/<id>/increase': 'Incrementa cópias disponíveis (devolução)',
             'GET /health': 'Health check do serviço'
         }
-    })
+    }, versionado=False)
 
 @app.route('/health')
 def health():
@@ -51,34 +72,83 @@ def health():
 # Lista o catálogo de vinis
 @app.route('/records', methods=['GET'])
 def list_records():
-    log_info("[RECORDS] Listando todo o catálogo de vinis...")
-    log_info(f"[RECORDS] Total de discos no catálogo: {len(records_db)}")
+    logger.info("[RECORDS] Listando todo o catálogo de vinis...")
+    logger.info("[RECORDS] Total de discos no catálogo: %s", len(records_db))
     
-    return jsonify({
+    if paginacao_solicitada():
+        return records_paginados.responder('records')
+    if ndjson_solicitado():
+        return responder_ndjson(records_db)
+    
+    return cache.responder('records', lambda: {
         'total': len(records_db),
         'records': records_db
     })
 
+# Busca no catálogo, resultados mais relevantes primeiro
+@app.route('/records/search', methods=['GET'])
+def search_records():
+    consulta = request.args.get('q', '').strip()
+    logger.info("[RECORDS] Buscando no catálogo: %s", consulta)
+    
+    if not consulta:
+        return jsonify({'error': 'Parâmetro q é obrigatório'}), 400
+    try:
+        limite = int(request.args.get('limit', BUSCA_LIMITE_PADRAO))
+    except ValueError:
+        return jsonify({'error': 'limit deve ser um número inteiro'}), 400
+    if not 1 <= limite <= BUSCA_LIMITE_MAXIMO:
+        return jsonify({'error': f'limit deve estar entre 1 e {BUSCA_LIMITE_MAXIMO}'}), 400
+    
+    resultados = indice_busca.buscar(consulta, limite)
+    
+    logger.info("[RECORDS] %s discos encontrados para '%s'", len(resultados), consulta)
+    
+    return jsonify({
+        'query': consulta,
+        'total': len(resultados),
+        'records': [dict(record, score=pontuacao) for pontuacao, record in resultados]
+    })
+
+# Vários discos de uma vez, para o gateway não fazer uma chamada por disco
+@app.route('/records/batch', methods=['GET'])
+def get_records_batch():
+    try:
+        ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()]
+    except ValueError:
+        return jsonify({'error': 'ids deve ser uma lista de números separados por vírgula'}), 400
+    
+    logger.info("[RECORDS] Buscando %s discos em lote...", len(ids))
+    
+    por_id = records_paginados.por_id
+    encontrados = [por_id[i] for i in ids if i in por_id]
+    
+    return jsonify({
+        'total': len(encontrados),
+        'records': encontrados,
+        'missing': [i for i in ids if i not in por_id]
+    })
+
 @app.route('/records/<int:record_id>', methods=['GET'])
 def get_record(record_id):
-    log_info(f"[RECORDS] Procurando disco #{record_id}...")
+    logger.info("[RECORDS] Procurando disco #%s...", record_id)
     
     record = next((r for r in records_db if r['id'] == record_id), None)
     
     if not record:
-        log_info(f"[RECORDS] Disco {record_id} não encontrado")
+        logger.info("[RECORDS] Disco %s não encontrado", record_id)
         return jsonify({'error': 'Disco não encontrado'}), 404
     
-    log_info(f"[RECORDS] Retornando: {record['title']} - {record['artist']}")
+    logger.info("[RECORDS] Retornando: %s - %s", record['title'], record['artist'])
     return jsonify(record)
 
 @app.route('/records/genre/<genre>', methods=['GET'])
 def get_by_genre(genre):
-    log_info(f"[RECORDS] Filtrando por gênero: {genre}")
+    logger.info("[RECORDS] Filtrando por gênero: %s", genre)
     
     filtered = [r for r in records_db if r['genre'].lower() == genre.lower()]
     
-    log_info(f"[RECORDS] Encontrados {len(filtered)} discos de {genre}")
+    logger.info("[RECORDS] Encontrados %s discos de %s", len(filtered), genre)
     
     return jsonify({
         'genre': genre,
@@ -88,11 +158,11 @@ def get_by_genre(genre):
 
 @app.route('/records/available', methods=['GET'])
 def get_available():
-    log_info("[RECORDS] Filtrando discos disponíveis...")
+    logger.info("[RECORDS] Filtrando discos disponíveis...")
     
     available = [r for r in records_db if r['available_copies'] > 0]
     
-    log_info(f"[RECORDS] {len(available)} discos disponíveis para aluguel")
+    logger.info("[RECORDS] %s discos disponíveis para aluguel", len(available))
     
     return jsonify({
         'total': len(available),
@@ -101,7 +171,7 @@ def get_available():
 
 @app.route('/records/<int:record_id>/decrease', methods=['PUT'])
 def decrease_copies(record_id):
-    log_info(f"[RECORDS] Alocando cópia do disco {record_id}...")
+    logger.info("[RECORDS] Alocando cópia do disco %s...", record_id)
     
     record = next((r for r in records_db if r['id'] == record_id), None)
     
@@ -109,12 +179,14 @@ def decrease_copies(record_id):
         return jsonify({'error': 'Disco não encontrado'}), 404
     
     if record['available_copies'] <= 0:
-        log_info(f"[RECORDS] ERRO: Nenhuma cópia disponível de '{record['title']}'")
+        logger.error("[RECORDS] ERRO: Nenhuma cópia disponível de '%s'", record['title'])
         return jsonify({'error': 'Nenhuma cópia disponível'}), 400
     
     record['available_copies'] -= 1
+    indice_busca.atualizar(record)
+    cache.invalidar()
     
-    log_info(f"[RECORDS] {record['title']}: {record['available_copies']}/{record['total_copies']} em estoque")
+    logger.info("[RECORDS] %s: %s/%s em estoque", record['title'], record['available_copies'], record['total_copies'])
     
     return jsonify({
         'message': 'Cópia alocada para aluguel',
@@ -124,7 +196,7 @@ def decrease_copies(record_id):
 
 @app.route('/records/<int:record_id>/increase', methods=['PUT'])
 def increase_copies(record_id):
-    log_info(f"[RECORDS] Devolvendo cópia do disco {record_id}...")
+    logger.info("[RECORDS] Devolvendo cópia do disco %s...", record_id)
     
     record = next((r for r in records_db if r['id'] == record_id), None)
     
@@ -132,12 +204,14 @@ def increase_copies(record_id):
         return jsonify({'error': 'Disco não encontrado'}), 404
     
     if record['available_copies'] >= record['total_copies']:
-        log_info(f"[RECORDS] AVISO: Todas as cópias já estão disponíveis")
+        logger.warning("[RECORDS] AVISO: Todas as cópias já estão disponíveis")
         return jsonify({'error': 'Todas as cópias já disponíveis'}), 400
     
     record['available_copies'] += 1
+    indice_busca.atualizar(record)
+    cache.invalidar()
     
-    log_info(f"[RECORDS] {record['title']}: {record['available_copies']}/{record['total_copies']} em estoque")
+    logger.info("[RECORDS] %s: %s/%s em estoque", record['title'], record['available_copies'], record['total_copies'])
     
     return jsonify({
         'message': 'Cópia devolvida ao estoque',
@@ -145,11 +219,23 @@ def increase_copies(record_id):
         'available_copies': record['available_copies']
     })
 
+# JSON ou MessagePack conforme o Accept (comum/formatos.py)
+configurar_formatos(app)
+
+# Compressão gzip/br/zstd negociada pelo Accept-Encoding (comum/compressao.py)
+configurar_compressao(app)
+
+# Profiling sob demanda em /debug/profiles (comum/profiling.py)
+configurar_profiling(app, 'records-service')
+
+# Métricas HTTP em /metrics (comum/metricas.py)
+instrumentar(app, 'records-service')
+
 if __name__ == '__main__':
-    log_info("="*60)
-    log_info("Iniciando Records Service - Catálogo de Vinis")
-    log_info("="*60)
-    log_info(f"Total de discos no catálogo: {len(records_db)}")
-    log_info("API rodando em http://0.0.0.0:5001")
-    log_info("="*60)
+    logger.info("="*60)
+    logger.info("Iniciando Records Service - Catálogo de Vinis")
+    logger.info("="*60)
+    logger.info("Total de discos no catálogo: %s", len(records_db))
+    logger.info("API rodando em http://0.0.0.0:5001")
+    logger.info("="*60)
     app.run(host='0.0.0.0', port=5001, debug=False)
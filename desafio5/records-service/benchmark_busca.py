@@ -0,0 +1,91 @@
+"""
+Benchmark de latência do índice de busca (`busca.py`) com catálogos grandes.
+
+Gera N discos sintéticos com títulos e artistas montados a partir de um
+vocabulário de palavras com frequência de Zipf (algumas muito comuns, a maioria
+rara), mais os 10 discos reais do catálogo, e mede a latência de
+`IndiceBusca.buscar()` para consultas exatas, por prefixo, com erro de
+digitação e com vários termos.
+
+    python benchmark_busca.py --discos 100000 1000000
+"""
+import argparse
+import gc
+import itertools
+import json
+import random
+import statistics
+import time
+
+from busca import IndiceBusca
+
+GENEROS = ('Rock', 'Pop', 'Indie', 'Jazz', 'Samba', 'MPB', 'Shoegaze', 'Electropop', 'Musical', 'Metal', 'Soul', 'Funk')
+SILABAS = ('ba', 'ca', 'da', 'fe', 'go', 'hu', 'ja', 'ki', 'lo', 'ma', 'ne', 'pi', 'ro', 'sa', 'te', 'vi', 'xo', 'ze',
+           'bra', 'cre', 'dri', 'flo', 'gra', 'pre', 'tra', 'ster', 'lin', 'mor', 'son', 'ven')
+
+CONSULTAS = {
+    'exata rara': 'hamilton',
+    'exata comum': 'love',
+    'prefixo': 'meteo',
+    'prefixo curto': 'li',
+    'erro de digitação': 'hamiltn',
+    'dois termos': 'linkin park',
+    'dois termos comuns': 'love night',
+    'termo comum + raro': 'love paramore',
+    'três termos': 'rise fall princess',
+}
+
+
+def gerar_registros(caminho, discos):
+    with open(caminho, 'r', encoding='utf-8') as f:
+        reais = json.load(f)
+    sorteio = random.Random(42)
+    palavras = ['love', 'night', 'the', 'of', 'heart', 'light', 'dream', 'live', 'blue', 'fire']
+    while len(palavras) < 60000:
+        palavras.append(''.join(sorteio.choice(SILABAS) for _ in range(sorteio.randint(2, 4))))
+    # Pesos acumulados calculados uma vez: choices() com `weights` refaz a soma a cada chamada
+    acumulados = list(itertools.accumulate(1 / (posicao + 1) for posicao in range(len(palavras))))
+    artistas = [' '.join(sorteio.choices(palavras, cum_weights=acumulados, k=sorteio.randint(1, 3))).title() for _ in range(discos // 10 or 1)]
+
+    registros = [dict(r) for r in reais]
+    for i in range(len(registros), discos):
+        registros.append({
+            'id': i + 1,
+            'title': ' '.join(sorteio.choices(palavras, cum_weights=acumulados, k=sorteio.randint(1, 4))).title(),
+            'artist': sorteio.choice(artistas),
+            'genre': sorteio.choice(GENEROS),
+        })
+    return registros
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência de GET /records/search em catálogos grandes")
+    parser.add_argument('--discos', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--catalogo', default='records_data.json')
+    parser.add_argument('--repeticoes', type=int, default=1000)
+    args = parser.parse_args()
+
+    for discos in args.discos:
+        registros = gerar_registros(args.catalogo, discos)
+        inicio = time.perf_counter()
+        indice = IndiceBusca(registros)
+        construcao = time.perf_counter() - inicio
+        # Como no app: o índice vai para a geração permanente do coletor
+        gc.freeze()
+
+        print(f"\n{discos:,} discos: {len(indice.vocabulario):,} tokens, índice construído em {construcao:.1f} s\n")
+        print(f"{'consulta':>20} {'q':>20} {'resultados':>11} {'p50 (ms)':>9} {'p99 (ms)':>9}  primeiro")
+        print("-" * 100)
+        for nome, consulta in CONSULTAS.items():
+            tempos = []
+            for _ in range(args.repeticoes):
+                inicio = time.perf_counter()
+                resultados = indice.buscar(consulta)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            p99 = statistics.quantiles(tempos, n=100)[98]
+            primeiro = f"{resultados[0][1]['title']} - {resultados[0][1]['artist']}" if resultados else '-'
+            print(f"{nome:>20} {consulta:>20} {len(resultados):>11} {statistics.median(tempos):>9.3f} {p99:>9.3f}  {primeiro[:40]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""
+Índice invertido em memória para a busca do catálogo (GET /records/search).
+
+Título, artista e gênero são quebrados em tokens normalizados (minúsculas, sem
+acentos). Para cada token o índice guarda os discos em que aparece, com um peso
+por campo (título 3, artista 2, gênero 1), em uma lista já ordenada por peso.
+
+Cada termo da busca casa de três formas:
+- exato: o próprio token;
+- prefixo: só no último termo, que o usuário ainda está digitando, tokens que
+  começam com ele ("meteo" -> "meteora"), por busca binária no vocabulário
+  ordenado;
+- aproximado: quando não há exato nem prefixo, tokens com trigramas em comum
+  ("hamiltn" -> "hamilton"), por similaridade de Jaccard.
+
+Todos os termos precisam casar (E). Com um termo só, o resultado sai direto
+do topo das listas já ordenadas. Com vários, os candidatos vêm do termo mais
+raro, em ordem de peso, e a varredura para em BUSCA_MAX_CANDIDATOS para manter
+a latência abaixo de 1 ms mesmo com um milhão de discos
+(`benchmark_busca.py`).
+
+O índice guarda referências aos próprios dicts do catálogo: estoque alterado
+por aluguel ou devolução aparece na busca sem reindexar. Toda escrita no
+catálogo chama `atualizar()`, que só mexe nas listas quando título, artista
+ou gênero mudaram. Os tokens indexados de cada disco ficam guardados: o dict
+já chega alterado, e é com eles que as entradas antigas são removidas.
+"""
+import bisect
+import heapq
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+CAMPOS = (('title', 3.0), ('artist', 2.0), ('genre', 1.0))
+
+FATOR_EXATO = 1.0
+FATOR_PREFIXO = 0.8
+FATOR_APROXIMADO = 0.6
+
+BUSCA_LIMITE_PADRAO = int(os.getenv('BUSCA_LIMITE_PADRAO', 20))
+BUSCA_LIMITE_MAXIMO = int(os.getenv('BUSCA_LIMITE_MAXIMO', 100))
+
+BUSCA_MAX_CANDIDATOS = int(os.getenv('BUSCA_MAX_CANDIDATOS', 1000))
+BUSCA_FOLGA_RESULTADOS = 4
+# Expansões por termo: tokens de prefixo e tokens aproximados considerados
+BUSCA_MAX_PREFIXOS = int(os.getenv('BUSCA_MAX_PREFIXOS', 8))
+BUSCA_MAX_APROXIMADOS = int(os.getenv('BUSCA_MAX_APROXIMADOS', 4))
+BUSCA_SIMILARIDADE_MINIMA = float(os.getenv('BUSCA_SIMILARIDADE_MINIMA', 0.35))
+# Trigramas muito comuns ("ing", "the") não ajudam a achar candidatos e custam caro
+BUSCA_MAX_TOKENS_TRIGRAMA = 2000
+
+NAO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+
+def tokenizar(texto):
+    sem_acentos = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii')
+    return [token for token in NAO_ALFANUMERICO.split(sem_acentos.lower()) if token]
+
+
+def trigramas(token):
+    marcado = f'  {token} '
+    return {marcado[i:i + 3] for i in range(len(marcado) - 2)}
+
+
+class IndiceBusca:
+    def __init__(self, registros=()):
+        self.registros = {}
+        # id -> {token: peso} com que o disco foi indexado
+        self.indexados = {}
+        # token -> {id: peso} para consulta e token -> [(-peso, id)] em ordem de relevância
+        self.pesos = {}
+        self.postings = {}
+        self.vocabulario = []
+        self.por_trigrama = {}
+        self._trava = threading.Lock()
+        for registro in registros:
+            self._indexar(registro, ordenar=False)
+        for lista in self.postings.values():
+            lista.sort()
+        self.vocabulario.sort()
+
+    def _pesos_do_registro(self, registro):
+        pesos = Counter()
+        for campo, peso in CAMPOS:
+            for token in set(tokenizar(registro.get(campo, ''))):
+                pesos[token] += peso
+        return pesos
+
+    def _indexar(self, registro, ordenar=True):
+        registro_id = registro['id']
+        self.registros[registro_id] = registro
+        pesos = self._pesos_do_registro(registro)
+        self.indexados[registro_id] = pesos
+        for token, peso in pesos.items():
+            if token not in self.pesos:
+                self.pesos[token] = {}
+                self.postings[token] = []
+                if ordenar:
+                    bisect.insort(self.vocabulario, token)
+                else:
+                    self.vocabulario.append(token)
+                for trigrama in trigramas(token):
+                    self.por_trigrama.setdefault(trigrama, set()).add(token)
+            self.pesos[token][registro_id] = peso
+            if ordenar:
+                bisect.insort(self.postings[token], (-peso, registro_id))
+            else:
+                self.postings[token].append((-peso, registro_id))
+
+    def _desindexar(self, registro_id):
+        self.registros.pop(registro_id, None)
+        for token, peso in self.indexados.pop(registro_id, {}).items():
+            self.pesos[token].pop(registro_id, None)
+            lista = self.postings[token]
+            posicao = bisect.bisect_left(lista, (-peso, registro_id))
+            if posicao < len(lista) and lista[posicao] == (-peso, registro_id):
+                del lista[posicao]
+            if not lista:
+                del self.pesos[token], self.postings[token]
+                del self.vocabulario[bisect.bisect_left(self.vocabulario, token)]
+                for trigrama in trigramas(token):
+                    self.por_trigrama[trigrama].discard(token)
+
+    def atualizar(self, registro):
+        # Inclui um disco novo ou reindexa um que teve título, artista ou gênero alterado
+        with self._trava:
+            if self.indexados.get(registro['id']) == self._pesos_do_registro(registro):
+                # Só estoque ou outros campos fora da busca mudaram
+                self.registros[registro['id']] = registro
+                return
+            self._desindexar(registro['id'])
+            self._indexar(registro)
+
+    def remover(self, registro_id):
+        with self._trava:
+            self._desindexar(registro_id)
+
+    def _prefixos(self, termo):
+        inicio = bisect.bisect_right(self.vocabulario, termo)
+        candidatos = []
+        for token in self.vocabulario[inicio:inicio + BUSCA_MAX_PREFIXOS * 4]:
+            if not token.startswith(termo):
+                break
+            candidatos.append(token)
+        # Os mais frequentes primeiro: "lo" -> "love" antes de "lomography"
+        return heapq.nlargest(BUSCA_MAX_PREFIXOS, candidatos, key=lambda token: len(self.postings[token]))
+
+    def _aproximados(self, termo):
+        do_termo = trigramas(termo)
+        compartilhados = Counter()
+        for trigrama in do_termo:
+            tokens = self.por_trigrama.get(trigrama, ())
+            if len(tokens) <= BUSCA_MAX_TOKENS_TRIGRAMA:
+                compartilhados.update(tokens)
+        similares = []
+        for token, comuns in compartilhados.items():
+            # Um token de n letras tem n + 1 trigramas com as marcas de início e fim
+            similaridade = comuns / (len(do_termo) + len(token) + 1 - comuns)
+            if similaridade >= BUSCA_SIMILARIDADE_MINIMA:
+                similares.append((similaridade, token))
+        return heapq.nlargest(BUSCA_MAX_APROXIMADOS, similares)
+
+    def _expandir(self, termo, prefixo):
+        # [(token, fator)] que casam com um termo da busca
+        expansoes = []
+        if termo in self.pesos:
+            expansoes.append((termo, FATOR_EXATO))
+        if prefixo:
+            expansoes.extend((token, FATOR_PREFIXO) for token in self._prefixos(termo))
+        if not expansoes and len(termo) >= 3:
+            expansoes.extend((token, FATOR_APROXIMADO * similaridade) for similaridade, token in self._aproximados(termo))
+        return expansoes
+
+    @staticmethod
+    def _pontuar(registro_id, expansoes):
+        melhor = 0.0
+        for pesos, fator in expansoes:
+            peso = pesos.get(registro_id)
+            if peso is not None and peso * fator > melhor:
+                melhor = peso * fator
+        return melhor
+
+    def buscar(self, consulta, limite=BUSCA_LIMITE_PADRAO):
+        # [(pontuação, registro)] do mais relevante para o menos relevante
+        termos = list(dict.fromkeys(tokenizar(consulta)))
+        if not termos:
+            return []
+
+        with self._trava:
+            por_termo = [self._expandir(termo, prefixo=posicao == len(termos) - 1) for posicao, termo in enumerate(termos)]
+            if not all(por_termo):
+                return []
+
+            if len(por_termo) == 1:
+                # O topo de cada lista já contém os `limite` melhores daquela expansão
+                resultados = {}
+                for token, fator in por_termo[0]:
+                    for peso, registro_id in self.postings[token][:limite]:
+                        resultados[registro_id] = max(resultados.get(registro_id, 0.0), round(-peso * fator, 3))
+                melhores = heapq.nlargest(limite, ((p, -registro_id) for registro_id, p in resultados.items()))
+                return [(pontuacao, self.registros[-negativo]) for pontuacao, negativo in melhores]
+
+            # Candidatos do termo mais raro, mais relevantes primeiro; os outros termos só são consultados
+            por_termo.sort(key=lambda expansoes: sum(len(self.postings[token]) for token, _ in expansoes))
+            mais_raro = por_termo[0]
+            restantes = [[(self.pesos[token], fator) for token, fator in expansoes] for expansoes in por_termo[1:]]
+            vistos = set()
+            resultados = []
+            for token, fator in mais_raro:
+                for peso, registro_id in self.postings[token][:BUSCA_MAX_CANDIDATOS - len(vistos)]:
+                    if registro_id in vistos:
+                        continue
+                    vistos.add(registro_id)
+                    pontuacao = -peso * fator
+                    for expansoes in restantes:
+                        parcial = self._pontuar(registro_id, expansoes)
+                        if not parcial:
+                            break
+                        pontuacao += parcial
+                    else:
+                        resultados.append((round(pontuacao, 3), -registro_id))
+                        # Os candidatos vêm em ordem de peso: com folga sobre o limite, os próximos pouco mudariam o topo
+                        if len(resultados) >= limite * BUSCA_FOLGA_RESULTADOS:
+                            break
+                if len(vistos) >= BUSCA_MAX_CANDIDATOS or len(resultados) >= limite * BUSCA_FOLGA_RESULTADOS:
+                    break
+
+            melhores = heapq.nlargest(limite, resultados)
+            return [(pontuacao, self.registros[-negativo]) for pontuacao, negativo in melhores]
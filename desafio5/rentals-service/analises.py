@@ -0,0 +1,163 @@
+"""
+Agregados por hora e por dia de aluguéis, devoluções, receita e multas (GET /analytics/...).
+
+Cada série (o total da loja, um gênero ou um disco) guarda seus períodos em
+baldes circulares de tamanho fixo: um `array` com o número do período de cada
+posição e outro com as quatro métricas, lado a lado. O período p fica na
+posição p % retenção; quando um período novo chega a uma posição ocupada por
+um antigo, a posição é zerada e reaproveitada. A memória de cada série não
+cresce com o tempo, e o que passou da retenção some sozinho.
+
+    granularidade  retenção                    séries
+    hour           ANALISES_RETENCAO_HORAS     total, por gênero
+    day            ANALISES_RETENCAO_DIAS      total, por gênero, por disco
+
+Os agregados são montados a partir de `rentals_db` na subida (aluguel no dia
+de `rented_at`, devolução no de `returned_at`) e depois atualizados em cada
+aluguel e devolução. Uma consulta de intervalo lê só as posições dos períodos
+pedidos; a receita de um aluguel entra quando ele é criado e a multa quando é
+devolvido.
+"""
+import os
+import threading
+from array import array
+from datetime import datetime
+
+from paginacao import ParametroInvalido
+
+ANALISES_RETENCAO_HORAS = int(os.getenv('ANALISES_RETENCAO_HORAS', 24 * 7))
+ANALISES_RETENCAO_DIAS = int(os.getenv('ANALISES_RETENCAO_DIAS', 365))
+
+METRICAS = ('rentals', 'returns', 'revenue', 'late_fees')
+
+# Intervalo devolvido quando a consulta não traz `start`
+PERIODOS_PADRAO = {'hour': 24, 'day': 30}
+
+
+def periodo(granularidade, momento):
+    if granularidade == 'hour':
+        return momento.toordinal() * 24 + momento.hour
+    return momento.toordinal()
+
+
+def formatar(granularidade, numero):
+    if granularidade == 'hour':
+        return datetime.fromordinal(numero // 24).replace(hour=numero % 24).strftime('%Y-%m-%dT%H:00')
+    return datetime.fromordinal(numero).strftime('%Y-%m-%d')
+
+
+class Baldes:
+    # Série circular de `retencao` períodos com as METRICAS de cada um
+    def __init__(self, retencao):
+        self.periodos = array('q', [-1]) * retencao
+        self.valores = array('d', [0.0]) * (retencao * len(METRICAS))
+
+    def somar(self, numero, incrementos):
+        posicao = numero % len(self.periodos)
+        inicio = posicao * len(METRICAS)
+        if self.periodos[posicao] != numero:
+            if self.periodos[posicao] > numero:
+                # A posição já guarda um período mais novo: este passou da retenção
+                return
+            self.periodos[posicao] = numero
+            for i in range(len(METRICAS)):
+                self.valores[inicio + i] = 0.0
+        for i, incremento in enumerate(incrementos):
+            self.valores[inicio + i] += incremento
+
+    def ler(self, numero):
+        posicao = numero % len(self.periodos)
+        if self.periodos[posicao] != numero:
+            return None
+        inicio = posicao * len(METRICAS)
+        return self.valores[inicio:inicio + len(METRICAS)]
+
+
+class Analises:
+    def __init__(self, alugueis=()):
+        self.retencao = {'hour': ANALISES_RETENCAO_HORAS, 'day': ANALISES_RETENCAO_DIAS}
+        # granularidade -> {chave: Baldes}; chave 'total', ('genre', nome) ou ('record', id)
+        self.series = {granularidade: {} for granularidade in self.retencao}
+        self._trava = threading.Lock()
+        for aluguel in alugueis:
+            self.alugar(aluguel)
+            if aluguel['status'] == 'returned':
+                self.devolver(aluguel)
+
+    def _chaves(self, granularidade, aluguel):
+        yield 'total'
+        if aluguel.get('record_genre'):
+            yield ('genre', aluguel['record_genre'])
+        if granularidade == 'day':
+            yield ('record', aluguel['record_id'])
+
+    def _registrar(self, momento, aluguel, incrementos):
+        with self._trava:
+            for granularidade, series in self.series.items():
+                numero = periodo(granularidade, momento)
+                for chave in self._chaves(granularidade, aluguel):
+                    if chave not in series:
+                        series[chave] = Baldes(self.retencao[granularidade])
+                    series[chave].somar(numero, incrementos)
+
+    def alugar(self, aluguel, momento=None):
+        momento = momento or datetime.fromisoformat(aluguel['rented_at'])
+        self._registrar(momento, aluguel, (1, 0, aluguel['total_cost'], 0.0))
+
+    def devolver(self, aluguel, momento=None):
+        momento = momento or datetime.fromisoformat(aluguel['returned_at'])
+        self._registrar(momento, aluguel, (0, 1, 0.0, aluguel['late_fee']))
+
+    def intervalo(self, args, por_disco=False, agora=None):
+        # (granularidade, primeiro período, último período) a partir de granularity, start e end
+        granularidade = args.get('granularity', 'day')
+        if granularidade not in self.retencao:
+            raise ParametroInvalido(f"granularity deve ser um de: {', '.join(self.retencao)}")
+        if por_disco and granularidade != 'day':
+            raise ParametroInvalido('Por disco só há granularidade day')
+        try:
+            fim = periodo(granularidade, datetime.fromisoformat(args['end'])) if args.get('end') \
+                else periodo(granularidade, agora or datetime.now())
+            inicio = periodo(granularidade, datetime.fromisoformat(args['start'])) if args.get('start') \
+                else fim - PERIODOS_PADRAO[granularidade] + 1
+        except ValueError:
+            raise ParametroInvalido('start e end devem estar no formato AAAA-MM-DD ou AAAA-MM-DDTHH')
+        if inicio > fim:
+            raise ParametroInvalido('start deve ser anterior a end')
+        # Mais que a retenção não cabe nos baldes: fica só o trecho mais recente
+        return granularidade, max(inicio, fim - self.retencao[granularidade] + 1), fim
+
+    def serie(self, granularidade, chave, inicio, fim):
+        # Um item por período do intervalo (zerado quando não houve movimento) e a soma deles
+        with self._trava:
+            baldes = self.series[granularidade].get(chave)
+            lidos = [(numero, baldes.ler(numero) if baldes else None) for numero in range(inicio, fim + 1)]
+
+        itens, soma = [], [0.0] * len(METRICAS)
+        for numero, valores in lidos:
+            valores = valores or (0.0,) * len(METRICAS)
+            soma = [a + b for a, b in zip(soma, valores)]
+            itens.append({'period': formatar(granularidade, numero), **self._metricas(valores)})
+        return itens, self._metricas(soma)
+
+    def ranking(self, granularidade, tipo, inicio, fim):
+        # Soma do intervalo para cada gênero ('genre') ou disco ('record'), por receita
+        with self._trava:
+            somas = {}
+            for chave, baldes in self.series[granularidade].items():
+                if not isinstance(chave, tuple) or chave[0] != tipo:
+                    continue
+                soma = [0.0] * len(METRICAS)
+                for numero in range(inicio, fim + 1):
+                    valores = baldes.ler(numero)
+                    if valores is not None:
+                        soma = [a + b for a, b in zip(soma, valores)]
+                if any(soma):
+                    somas[chave[1]] = self._metricas(soma)
+        return sorted(somas.items(), key=lambda item: (-item[1]['revenue'], str(item[0])))
+
+    @staticmethod
+    def _metricas(valores):
+        rentals, returns, revenue, late_fees = valores
+        return {'rentals': int(rentals), 'returns': int(returns),
+                'revenue': round(revenue, 2), 'late_fees': round(late_fees, 2)}
@@ -1,7 +1,19 @@
 from flask import Flask, jsonify, request
-import sys
 import json
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from metricas import instrumentar
+from logs import configurar_logs
+from profiling import configurar_profiling
+from compressao import configurar_compressao
+from formatos import configurar_formatos
+from cache_respostas import CacheRespostas
+from paginacao import Paginador, ParametroInvalido, paginacao_solicitada
+from ndjson import ndjson_solicitado, responder_ndjson
+from rastreamento import configurar_rastreamento
+from atrasos import Atrasos, hoje
+from resumos import ResumoClientes
+from analises import Analises, formatar
+from recomendacoes import RECOMENDACOES_LIMITE_MAXIMO, RECOMENDACOES_LIMITE_PADRAO, CoAluguel
 
 app = Flask(__name__)
 
@@ -12,9 +24,10 @@ import logging
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
 
-def log_info(message):
-    print(message, flush=True)
-    sys.stdout.flush()
+logger = configurar_logs('rentals-service')
+
+# Trace id entre os serviços, Server-Timing e spans (comum/rastreamento.py)
+configurar_rastreamento(app, 'rentals-service')
 
 def load_customers():
     with open('customers_data.json', 'r', encoding='utf-8') as f:
@@ -27,24 +40,53 @@ def load_rentals():
 customers_db = load_customers()
 rentals_db = load_rentals()
 
+# Listagens já serializadas, invalidadas a cada escrita (comum/cache_respostas.py)
+cache = CacheRespostas()
+
+# Índices para paginação por cursor, ordenação e projeção (comum/paginacao.py)
+customers_paginados = Paginador(customers_db, ('id', 'name', 'membership_tier', 'joined_at'))
+rentals_paginados = Paginador(rentals_db, ('id', 'customer_id', 'record_id', 'rented_at', 'due_date'))
+
+# Matriz de co-aluguel e vizinhos de cada disco para as recomendações (recomendacoes.py)
+co_aluguel = CoAluguel(rentals_db)
+
+# Totais por cliente, atualizados a cada aluguel e devolução (resumos.py)
+resumos = ResumoClientes(customers_db, rentals_db)
+
+# Agregados por hora e por dia para /analytics (analises.py)
+analises = Analises(rentals_db)
+
+# Aluguéis ativos por vencimento e multas em curso, recalculadas em segundo plano (atrasos.py)
+atrasos = Atrasos(rentals_db)
+atrasos.iniciar()
+
 @app.route('/')
 def home():
-    return jsonify({
+    return cache.responder('home', lambda: {
         'service': 'Rentals Service',
         'description': 'Vinyl Records Rental Management',
         'version': '1.0',
         'endpoints': {
-            'GET /customers': 'Lista todos os clientes',
+            'GET /customers': 'Lista todos os clientes (limit, after, sort, fields)',
             'GET /customers/<id>': 'Detalhes de um cliente',
-            'GET /rentals': 'Lista todos os alugueis',
+            'GET /customers/<id>/summary': 'Totais do cliente: gastos, multas, aluguéis, gêneros e ativos',
+            'GET /customers/<id>/balance': 'Multas em curso dos alugueis atrasados do cliente',
+            'GET /customers/<id>/recommendations': 'Discos alugados por quem alugou os mesmos discos (limit)',
+            'GET /rentals': 'Lista todos os alugueis (limit, after, sort, fields)',
             'GET /rentals/<id>': 'Detalhes de um aluguel',
-            'GET /rentals/active': 'Lista alugueis ativos',
+            'GET /rentals/active': 'Lista alugueis ativos (limit, after, sort, fields)',
+            'GET /rentals/overdue': 'Alugueis atrasados com a multa acumulada até hoje',
             'GET /rentals/customer/<customer_id>': 'Alugueis de um cliente',
             'POST /rentals': 'Criar novo aluguel',
             'PUT /rentals/<id>/return': 'Registrar devolução',
+            'GET /analytics/totals': 'Aluguéis, devoluções, receita e multas por período (granularity, start, end)',
+            'GET /analytics/genres': 'Totais do intervalo por gênero (granularity, start, end)',
+            'GET /analytics/genres/<genre>': 'Série de um gênero por período (granularity, start, end)',
+            'GET /analytics/records': 'Totais do intervalo por disco, por dia (start, end)',
+            'GET /analytics/records/<id>': 'Série de um disco por dia (start, end)',
             'GET /health': 'Health check do serviço'
         }
-    })
+    }, versionado=False)
 
 @app.route('/health')
 def health():
@@ -61,10 +103,13 @@ def health():
 # Listando todos os clientes
 @app.route('/customers', methods=['GET'])
 def list_customers():
-    log_info("[RENTALS] Listando todos os clientes...")
-    log_info(f"[RENTALS] Total de clientes cadastrados: {len(customers_db)}")
+    logger.info("[RENTALS] Listando todos os clientes...")
+    logger.info("[RENTALS] Total de clientes cadastrados: %s", len(customers_db))
     
-    return jsonify({
+    if paginacao_solicitada():
+        return customers_paginados.responder('customers')
+    
+    return cache.responder('customers', lambda: {
         'total': len(customers_db),
         'customers': customers_db
     })
@@ -72,24 +117,96 @@ def list_customers():
 # Lista cliente pelo ID
 @app.route('/customers/<int:customer_id>', methods=['GET'])
 def get_customer(customer_id):
-    log_info(f"[RENTALS] Procurando cliente #{customer_id}...")
+    logger.info("[RENTALS] Procurando cliente #%s...", customer_id)
     
     customer = next((c for c in customers_db if c['id'] == customer_id), None)
     
     if not customer:
-        log_info(f"[RENTALS] Cliente {customer_id} não encontrado")
+        logger.info("[RENTALS] Cliente %s não encontrado", customer_id)
         return jsonify({'error': 'Cliente não encontrado'}), 404
     
-    log_info(f"[RENTALS] Encontrado: {customer['name']} ({customer['membership_tier']})")
+    logger.info("[RENTALS] Encontrado: %s (%s)", customer['name'], customer['membership_tier'])
     return jsonify(customer)
 
+# Totais acumulados do cliente, sem percorrer o histórico
+@app.route('/customers/<int:customer_id>/summary', methods=['GET'])
+def get_customer_summary(customer_id):
+    logger.info("[RENTALS] Resumo do cliente #%s...", customer_id)
+    
+    customer = next((c for c in customers_db if c['id'] == customer_id), None)
+    
+    if not customer:
+        logger.info("[RENTALS] Cliente %s não encontrado", customer_id)
+        return jsonify({'error': 'Cliente não encontrado'}), 404
+    
+    statistics = resumos.resumo(customer_id)
+    active_ids = statistics.pop('active_rental_ids')
+    statistics['outstanding_late_fees'] = atrasos.resultado().saldos.get(customer_id, 0.0)
+    
+    return jsonify({
+        'customer': customer,
+        'statistics': statistics,
+        'active_rentals': [rentals_paginados.por_id[rental_id] for rental_id in active_ids]
+    })
+
+# Multas em curso do cliente (alugueis ativos já vencidos)
+@app.route('/customers/<int:customer_id>/balance', methods=['GET'])
+def get_customer_balance(customer_id):
+    logger.info("[RENTALS] Consultando multas em curso do cliente #%s...", customer_id)
+    
+    customer = next((c for c in customers_db if c['id'] == customer_id), None)
+    
+    if not customer:
+        return jsonify({'error': 'Cliente não encontrado'}), 404
+    
+    resultado = atrasos.resultado()
+    
+    return jsonify({
+        'customer_id': customer_id,
+        'customer_name': customer['name'],
+        'as_of': date.fromordinal(resultado.dia).isoformat(),
+        'overdue_rentals': resultado.quantidades.get(customer_id, 0),
+        'outstanding_late_fees': resultado.saldos.get(customer_id, 0.0)
+    })
+
+# Discos parecidos com o histórico do cliente, pelos co-aluguéis
+@app.route('/customers/<int:customer_id>/recommendations', methods=['GET'])
+def get_customer_recommendations(customer_id):
+    logger.info("[RENTALS] Calculando recomendações do cliente #%s...", customer_id)
+    
+    customer = next((c for c in customers_db if c['id'] == customer_id), None)
+    
+    if not customer:
+        return jsonify({'error': 'Cliente não encontrado'}), 404
+    try:
+        limite = int(request.args.get('limit', RECOMENDACOES_LIMITE_PADRAO))
+    except ValueError:
+        return jsonify({'error': 'limit deve ser um número inteiro'}), 400
+    if not 1 <= limite <= RECOMENDACOES_LIMITE_MAXIMO:
+        return jsonify({'error': f'limit deve estar entre 1 e {RECOMENDACOES_LIMITE_MAXIMO}'}), 400
+    
+    recomendacoes = co_aluguel.recomendar(customer_id, limite)
+    
+    logger.info("[RENTALS] %s recomendações para %s", len(recomendacoes), customer['name'])
+    
+    return jsonify({
+        'customer_id': customer_id,
+        'total': len(recomendacoes),
+        'recommendations': [{'record_id': record_id, 'score': score} for score, record_id in recomendacoes]
+    })
+
 # Lista registro de alugueis
 @app.route('/rentals', methods=['GET'])
 def list_rentals():
-    log_info("[RENTALS] Listando todos os alugueis...")
-    log_info(f"[RENTALS] Total de alugueis registrados: {len(rentals_db)}")
+    logger.info("[RENTALS] Listando todos os alugueis...")
+    logger.info("[RENTALS] Total de alugueis registrados: %s", len(rentals_db))
     
-    return jsonify({
+    if paginacao_solicitada():
+        return rentals_paginados.responder('rentals')
+    if ndjson_solicitado():
+        return responder_ndjson(rentals_db)
+    
+    return cache.responder('rentals', lambda: {
         'total': len(rentals_db),
         'rentals': rentals_db
     })
@@ -97,35 +214,57 @@ def list_rentals():
 # Lista aluguel pelo ID
 @app.route('/rentals/<int:rental_id>', methods=['GET'])
 def get_rental(rental_id):
-    log_info(f"[RENTALS] Buscando aluguel ID: {rental_id}")
+    logger.info("[RENTALS] Buscando aluguel ID: %s", rental_id)
     
     rental = next((r for r in rentals_db if r['id'] == rental_id), None)
     
     if not rental:
-        log_info(f"[RENTALS] Aluguel {rental_id} não encontrado")
+        logger.info("[RENTALS] Aluguel %s não encontrado", rental_id)
         return jsonify({'error': 'Aluguel não encontrado'}), 404
     
-    log_info(f"[RENTALS] Retornando: {rental['record_title']} alugado por {rental['customer_name']}")
+    logger.info("[RENTALS] Retornando: %s alugado por %s", rental['record_title'], rental['customer_name'])
     return jsonify(rental)
 
 # Filtra pelos alugueis ativos 
 @app.route('/rentals/active', methods=['GET'])
 def get_active_rentals():
-    log_info("[RENTALS] Filtrando alugueis ativos...")
+    logger.info("[RENTALS] Filtrando alugueis ativos...")
+    
+    if paginacao_solicitada():
+        return rentals_paginados.responder('rentals', filtro=lambda r: r['status'] == 'active')
     
     active = [r for r in rentals_db if r['status'] == 'active']
     
-    log_info(f"[RENTALS] {len(active)} alugueis ativos no momento")
+    logger.info("[RENTALS] %s alugueis ativos no momento", len(active))
     
     return jsonify({
         'total': len(active),
         'rentals': active
     })
 
+# Alugueis ativos vencidos, do mais atrasado ao menos
+@app.route('/rentals/overdue', methods=['GET'])
+def get_overdue_rentals():
+    logger.info("[RENTALS] Listando alugueis atrasados...")
+    
+    resultado = atrasos.resultado()
+    por_id = rentals_paginados.por_id
+    overdue = [dict(por_id[rental_id], days_late=dias, accrued_fee=multa) for rental_id, dias, multa
+               in zip(resultado.ids.tolist(), resultado.dias.tolist(), resultado.multas.tolist())]
+    
+    logger.info("[RENTALS] %s alugueis atrasados", len(overdue))
+    
+    return jsonify({
+        'as_of': date.fromordinal(resultado.dia).isoformat(),
+        'total': len(overdue),
+        'total_fees': round(float(resultado.multas.sum()), 2),
+        'rentals': overdue
+    })
+
 # Lista historico de alugueis pelo id do cliente
 @app.route('/rentals/customer/<int:customer_id>', methods=['GET'])
 def get_customer_rentals(customer_id):
-    log_info(f"[RENTALS] Buscando histórico de alugueis do cliente {customer_id}")
+    logger.info("[RENTALS] Buscando histórico de alugueis do cliente %s", customer_id)
     
     customer = next((c for c in customers_db if c['id'] == customer_id), None)
     
@@ -135,7 +274,7 @@ def get_customer_rentals(customer_id):
     customer_rentals = [r for r in rentals_db if r['customer_id'] == customer_id]
     active = [r for r in customer_rentals if r['status'] == 'active']
     
-    log_info(f"[RENTALS] Cliente {customer['name']}: {len(customer_rentals)} alugueis, {len(active)} ativos")
+    logger.info("[RENTALS] Cliente %s: %s alugueis, %s ativos", customer['name'], len(customer_rentals), len(active))
     
     return jsonify({
         'customer_id': customer_id,
@@ -150,7 +289,7 @@ def get_customer_rentals(customer_id):
 def create_rental():
     data = request.get_json()
     
-    log_info(f"[RENTALS] Registrando novo aluguel...")
+    logger.info("[RENTALS] Registrando novo aluguel...")
     
     required_fields = ['customer_id', 'record_id', 'record_title', 'daily_price', 'rental_days']
     for field in required_fields:
@@ -162,44 +301,53 @@ def create_rental():
     if not customer:
         return jsonify({'error': 'Cliente não encontrado'}), 404
     
-    active_count = len([r for r in rentals_db if r['customer_id'] == data['customer_id'] and r['status'] == 'active'])
-    
-    if active_count >= customer['max_rentals']:
-        log_info(f"[RENTALS] ERRO: Cliente {customer['name']} atingiu limite de {customer['max_rentals']} alugueis")
-        return jsonify({
-            'error': 'Limite de alugueis atingido',
-            'current': active_count,
-            'max': customer['max_rentals']
-        }), 400
-    
-    new_id = max([r['id'] for r in rentals_db]) + 1 if rentals_db else 1
-    
-    rented_at = datetime.now()
-    due_date = rented_at + timedelta(days=data['rental_days'])
-    total_cost = data['daily_price'] * data['rental_days']
-    
-    new_rental = {
-        'id': new_id,
-        'customer_id': data['customer_id'],
-        'customer_name': customer['name'],
-        'record_id': data['record_id'],
-        'record_title': data['record_title'],
-        'rented_at': rented_at.strftime('%Y-%m-%d'),
-        'due_date': due_date.strftime('%Y-%m-%d'),
-        'returned_at': None,
-        'daily_price': data['daily_price'],
-        'rental_days': data['rental_days'],
-        'total_cost': round(total_cost, 2),
-        'status': 'active',
-        'late_fee': 0.00
-    }
-    
-    rentals_db.append(new_rental)
-    customer['active_rentals'] += 1
-    
-    log_info(f"[RENTALS] Aluguel #{new_id} registrado com sucesso!")
-    log_info(f"[RENTALS] {customer['name']} alugou '{data['record_title']}' por {data['rental_days']} dias")
-    log_info(f"[RENTALS] Total: R$ {total_cost:.2f}")
+    # Limite, novo aluguel e totais do cliente de uma vez: dois pedidos simultâneos não passam do limite
+    with resumos.trava:
+        active_count = resumos.ativos(data['customer_id'])
+        
+        if active_count >= customer['max_rentals']:
+            logger.error("[RENTALS] ERRO: Cliente %s atingiu limite de %s alugueis",
+                         customer['name'], customer['max_rentals'])
+            return jsonify({
+                'error': 'Limite de alugueis atingido',
+                'current': active_count,
+                'max': customer['max_rentals']
+            }), 400
+        
+        new_id = max([r['id'] for r in rentals_db]) + 1 if rentals_db else 1
+        
+        rented_at = datetime.now()
+        due_date = rented_at + timedelta(days=data['rental_days'])
+        total_cost = data['daily_price'] * data['rental_days']
+        
+        new_rental = {
+            'id': new_id,
+            'customer_id': data['customer_id'],
+            'customer_name': customer['name'],
+            'record_id': data['record_id'],
+            'record_title': data['record_title'],
+            'record_genre': data.get('record_genre'),
+            'rented_at': rented_at.strftime('%Y-%m-%d'),
+            'due_date': due_date.strftime('%Y-%m-%d'),
+            'returned_at': None,
+            'daily_price': data['daily_price'],
+            'rental_days': data['rental_days'],
+            'total_cost': round(total_cost, 2),
+            'status': 'active',
+            'late_fee': 0.00
+        }
+        
+        rentals_db.append(new_rental)
+        rentals_paginados.adicionar(new_rental)
+        co_aluguel.registrar(new_rental['customer_id'], new_rental['record_id'])
+        atrasos.adicionar(new_rental)
+        resumos.alugar(new_rental)
+        analises.alugar(new_rental, rented_at)
+        cache.invalidar()
+    
+    logger.info("[RENTALS] Aluguel #%s registrado com sucesso!", new_id)
+    logger.info("[RENTALS] %s alugou '%s' por %s dias", customer['name'], data['record_title'], data['rental_days'])
+    logger.info("[RENTALS] Total: R$ %.2f", total_cost)
     
     return jsonify({
         'message': 'Aluguel criado com sucesso',
@@ -209,49 +357,121 @@ def create_rental():
 # "Retorno" do vinyl alugado
 @app.route('/rentals/<int:rental_id>/return', methods=['PUT'])
 def return_rental(rental_id):
-    log_info(f"[RENTALS] Recebendo devolução do aluguel #{rental_id}...")
+    logger.info("[RENTALS] Recebendo devolução do aluguel #%s...", rental_id)
     
     rental = next((r for r in rentals_db if r['id'] == rental_id), None)
     
     if not rental:
         return jsonify({'error': 'Aluguel não encontrado'}), 404
     
-    if rental['status'] == 'returned':
-        log_info(f"[RENTALS] AVISO: Aluguel {rental_id} já foi devolvido")
-        return jsonify({'error': 'Aluguel já foi devolvido'}), 400
+    with resumos.trava:
+        if rental['status'] == 'returned':
+            logger.warning("[RENTALS] AVISO: Aluguel %s já foi devolvido", rental_id)
+            return jsonify({'error': 'Aluguel já foi devolvido'}), 400
+        
+        returned_at = datetime.now()
+        days_late = hoje() - atrasos.remover(rental_id)
+        
+        late_fee = 0.00
+        if days_late > 0:
+            late_fee = days_late * rental['daily_price']
+            logger.info("[RENTALS] ATRASO: %s dias - Multa: R$ %.2f", days_late, late_fee)
+        
+        rental['returned_at'] = returned_at.strftime('%Y-%m-%d')
+        rental['status'] = 'returned'
+        rental['late_fee'] = round(late_fee, 2)
+        
+        resumos.devolver(rental)
+        analises.devolver(rental, returned_at)
+        cache.invalidar()
+    
+    logger.info("[RENTALS] Devolução concluída: %s", rental['record_title'])
+    logger.info("[RENTALS] Cliente: %s", rental['customer_name'])
     
-    returned_at = datetime.now()
-    due_date = datetime.strptime(rental['due_date'], '%Y-%m-%d')
-    
-    late_fee = 0.00
-    if returned_at > due_date:
-        days_late = (returned_at - due_date).days
-        late_fee = days_late * rental['daily_price']
-        log_info(f"[RENTALS] ATRASO: {days_late} dias - Multa: R$ {late_fee:.2f}")
+    return jsonify({
+        'message': 'Devolução registrada com sucesso',
+        'rental': rental,
+        'late_fee': late_fee
+    })
+
+def responder_serie(chave, por_disco=False, **identificacao):
+    try:
+        granularidade, inicio, fim = analises.intervalo(request.args, por_disco)
+    except ParametroInvalido as e:
+        return jsonify({'error': str(e)}), 400
     
-    rental['returned_at'] = returned_at.strftime('%Y-%m-%d')
-    rental['status'] = 'returned'
-    rental['late_fee'] = round(late_fee, 2)
+    buckets, totals = analises.serie(granularidade, chave, inicio, fim)
     
-    customer = next((c for c in customers_db if c['id'] == rental['customer_id']), None)
-    if customer:
-        customer['active_rentals'] -= 1
+    return jsonify({
+        **identificacao,
+        'granularity': granularidade,
+        'start': buckets[0]['period'],
+        'end': buckets[-1]['period'],
+        'totals': totals,
+        'buckets': buckets
+    })
+
+def responder_ranking(tipo, campo, chave_lista):
+    try:
+        granularidade, inicio, fim = analises.intervalo(request.args, por_disco=tipo == 'record')
+    except ParametroInvalido as e:
+        return jsonify({'error': str(e)}), 400
     
-    log_info(f"[RENTALS] Devolução concluída: {rental['record_title']}")
-    log_info(f"[RENTALS] Cliente: {rental['customer_name']}")
+    ranking = analises.ranking(granularidade, tipo, inicio, fim)
     
     return jsonify({
-        'message': 'Devolução registrada com sucesso',
-        'rental': rental,
-        'late_fee': late_fee
+        'granularity': granularidade,
+        'start': formatar(granularidade, inicio),
+        'end': formatar(granularidade, fim),
+        chave_lista: [{campo: valor, **metricas} for valor, metricas in ranking]
     })
 
+# Movimento da loja inteira por hora ou por dia
+@app.route('/analytics/totals', methods=['GET'])
+def get_analytics_totals():
+    logger.info("[RENTALS] Agregados da loja por período...")
+    return responder_serie('total')
+
+# Gêneros do intervalo, do que mais faturou ao que menos faturou
+@app.route('/analytics/genres', methods=['GET'])
+def get_analytics_genres():
+    logger.info("[RENTALS] Agregados por gênero...")
+    return responder_ranking('genre', 'genre', 'genres')
+
+@app.route('/analytics/genres/<genre>', methods=['GET'])
+def get_analytics_genre(genre):
+    logger.info("[RENTALS] Agregados do gênero %s por período...", genre)
+    return responder_serie(('genre', genre), genre=genre)
+
+# Discos do intervalo, do que mais faturou ao que menos faturou
+@app.route('/analytics/records', methods=['GET'])
+def get_analytics_records():
+    logger.info("[RENTALS] Agregados por disco...")
+    return responder_ranking('record', 'record_id', 'records')
+
+@app.route('/analytics/records/<int:record_id>', methods=['GET'])
+def get_analytics_record(record_id):
+    logger.info("[RENTALS] Agregados do disco %s por período...", record_id)
+    return responder_serie(('record', record_id), por_disco=True, record_id=record_id)
+
+# JSON ou MessagePack conforme o Accept (comum/formatos.py)
+configurar_formatos(app)
+
+# Compressão gzip/br/zstd negociada pelo Accept-Encoding (comum/compressao.py)
+configurar_compressao(app)
+
+# Profiling sob demanda em /debug/profiles (comum/profiling.py)
+configurar_profiling(app, 'rentals-service')
+
+# Métricas HTTP em /metrics (comum/metricas.py)
+instrumentar(app, 'rentals-service')
+
 if __name__ == '__main__':
-    log_info("="*60)
-    log_info("Iniciando Rentals Service - Gestão de Alugueis")
-    log_info("="*60)
-    log_info(f"Clientes cadastrados: {len(customers_db)}")
-    log_info(f"Total de alugueis: {len(rentals_db)}")
-    log_info("API rodando em http://0.0.0.0:5002")
-    log_info("="*60)
+    logger.info("="*60)
+    logger.info("Iniciando Rentals Service - Gestão de Alugueis")
+    logger.info("="*60)
+    logger.info("Clientes cadastrados: %s", len(customers_db))
+    logger.info("Total de alugueis: %s", len(rentals_db))
+    logger.info("API rodando em http://0.0.0.0:5002")
+    logger.info("="*60)
     app.run(host='0.0.0.0', port=5002, debug=False)
@@ -0,0 +1,115 @@
+"""
+Aluguéis atrasados e multas em curso (GET /rentals/overdue, GET /customers/<id>/balance).
+
+`Atrasos` guarda os aluguéis ativos em arrays paralelos (`array`) ordenados
+pelo vencimento, com a data já convertida para inteiro (dia ordinal):
+vencimento, id, cliente e diária. Os atrasados são sempre o começo dos arrays,
+até o primeiro vencimento que não passou, achado por busca binária. As multas
+e o saldo por cliente saem de operações do numpy sobre essas fatias, sem
+`strptime` nem laço Python por aluguel.
+
+Uma thread em segundo plano refaz esse cálculo a cada ATRASOS_INTERVALO
+segundos e guarda o resultado pronto (lista de atrasados e saldo por cliente),
+que é o que os endpoints devolvem. Aluguel criado ou devolvido, ou a virada do
+dia, marcam o resultado como velho; a próxima leitura recalcula na hora.
+
+A multa segue a da devolução: dias depois do vencimento x diária.
+"""
+import bisect
+import os
+import threading
+from array import array
+from collections import namedtuple
+from datetime import date
+
+import numpy
+
+ATRASOS_INTERVALO = float(os.getenv('ATRASOS_INTERVALO', 60))
+
+# ids, dias e multas: arrays do mais atrasado ao menos; saldos e quantidades: {cliente: valor}
+Resultado = namedtuple('Resultado', 'dia versao ids dias multas saldos quantidades')
+
+
+def dia(texto):
+    # 'AAAA-MM-DD' -> dia ordinal
+    return date.fromisoformat(texto).toordinal()
+
+
+def hoje():
+    return date.today().toordinal()
+
+
+class Atrasos:
+    def __init__(self, alugueis=(), intervalo=ATRASOS_INTERVALO):
+        ativos = sorted((dia(a['due_date']), a['id'], a) for a in alugueis if a['status'] == 'active')
+        self.vencimentos = array('q', (vencimento for vencimento, _, _ in ativos))
+        self.ids = array('q', (aluguel_id for _, aluguel_id, _ in ativos))
+        self.clientes = array('q', (a['customer_id'] for _, _, a in ativos))
+        self.diarias = array('d', (a['daily_price'] for _, _, a in ativos))
+        self.vencimento_por_id = {aluguel_id: vencimento for vencimento, aluguel_id, _ in ativos}
+        self.versao = 0
+        self._resultado = None
+        self._trava = threading.Lock()
+        self.intervalo = intervalo
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name='calculo-atrasos', daemon=True)
+
+    def adicionar(self, aluguel):
+        vencimento = dia(aluguel['due_date'])
+        with self._trava:
+            posicao = bisect.bisect_right(self.vencimentos, vencimento)
+            self.vencimentos.insert(posicao, vencimento)
+            self.ids.insert(posicao, aluguel['id'])
+            self.clientes.insert(posicao, aluguel['customer_id'])
+            self.diarias.insert(posicao, aluguel['daily_price'])
+            self.vencimento_por_id[aluguel['id']] = vencimento
+            self.versao += 1
+
+    def remover(self, aluguel_id):
+        # Tira um aluguel devolvido e devolve o vencimento dele (dia ordinal)
+        with self._trava:
+            vencimento = self.vencimento_por_id.pop(aluguel_id)
+            posicao = bisect.bisect_left(self.vencimentos, vencimento)
+            while self.ids[posicao] != aluguel_id:
+                posicao += 1
+            for coluna in (self.vencimentos, self.ids, self.clientes, self.diarias):
+                del coluna[posicao]
+            self.versao += 1
+            return vencimento
+
+    def calcular(self):
+        with self._trava:
+            dia_atual, versao = hoje(), self.versao
+            # Vencimento antes de hoje: pelo menos um dia de atraso
+            fim = bisect.bisect_left(self.vencimentos, dia_atual)
+            # Cópias: o `array` não pode mudar de tamanho enquanto o numpy aponta para o buffer dele
+            vencimentos = numpy.frombuffer(self.vencimentos, dtype=numpy.int64, count=fim).copy()
+            ids = numpy.frombuffer(self.ids, dtype=numpy.int64, count=fim).copy()
+            clientes = numpy.frombuffer(self.clientes, dtype=numpy.int64, count=fim).copy()
+            diarias = numpy.frombuffer(self.diarias, dtype=numpy.float64, count=fim).copy()
+
+        dias = dia_atual - vencimentos
+        multas = numpy.round(dias * diarias, 2)
+        unicos, posicoes = numpy.unique(clientes, return_inverse=True)
+        saldos = dict(zip(unicos.tolist(), numpy.round(numpy.bincount(posicoes, weights=multas), 2).tolist()))
+        quantidades = dict(zip(unicos.tolist(), numpy.bincount(posicoes).tolist()))
+        self._resultado = Resultado(dia_atual, versao, ids, dias, multas, saldos, quantidades)
+        return self._resultado
+
+    def resultado(self):
+        resultado = self._resultado
+        if resultado is None or (resultado.dia, resultado.versao) != (hoje(), self.versao):
+            resultado = self.calcular()
+        return resultado
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            self.calcular()
+
+    def iniciar(self):
+        self.calcular()
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        self._thread.join()
@@ -0,0 +1,102 @@
+"""
+Recomendações item a item a partir dos aluguéis (GET /customers/<id>/recommendations).
+
+Dois discos são parecidos quando os mesmos clientes alugaram os dois. O
+`CoAluguel` guarda uma matriz esparsa disco x disco, em dicts, com quantos
+clientes alugaram cada par, e para cada disco a lista já ordenada dos
+RECOMENDACOES_VIZINHOS discos mais parecidos (similaridade de cosseno: pares
+em comum / raiz do produto dos clientes de cada disco).
+
+Um aluguel novo só mexe na matriz se o cliente ainda não tinha alugado aquele
+disco: as células do disco com o resto do histórico do cliente sobem em 1.
+As listas são atualizadas sem varrer as linhas da matriz, que para um disco
+popular têm milhares de células:
+- a do disco alugado é reescalada: com um cliente a mais, a similaridade com
+  todos os vizinhos cai pelo mesmo fator, e a ordem não muda; os discos do
+  histórico do cliente entram ou sobem com o valor novo;
+- nas listas dos discos do histórico do cliente, o disco alugado entra ou sobe;
+- nos demais vizinhos a similaridade com o disco alugado caiu um pouco; a
+  lista deles não é reordenada até `CoAluguel` ser montado de novo na subida
+  do serviço, mas a pontuação é sempre recalculada na hora da recomendação.
+
+A recomendação de um cliente soma, para cada disco do seu histórico, a
+similaridade dos vizinhos ainda não alugados por ele; o custo depende do
+tamanho do histórico, não do catálogo.
+"""
+import heapq
+import math
+import os
+import threading
+from collections import Counter
+
+RECOMENDACOES_VIZINHOS = int(os.getenv('RECOMENDACOES_VIZINHOS', 20))
+RECOMENDACOES_LIMITE_PADRAO = 5
+RECOMENDACOES_LIMITE_MAXIMO = 50
+
+
+class CoAluguel:
+    def __init__(self, alugueis=()):
+        # cliente -> discos alugados, disco -> clientes que alugaram, disco -> {outro disco: clientes em comum}
+        self.historico = {}
+        self.clientes_por_disco = Counter()
+        self.pares = {}
+        self.vizinhos = {}
+        self._trava = threading.Lock()
+        for aluguel in alugueis:
+            self._registrar(aluguel['customer_id'], aluguel['record_id'])
+        for disco in self.pares:
+            self._recalcular(disco)
+
+    def _registrar(self, cliente_id, disco_id):
+        # Discos do histórico que passaram a dividir um cliente com `disco_id`, ou None se nada mudou
+        discos = self.historico.setdefault(cliente_id, set())
+        if disco_id in discos:
+            return None
+        self.clientes_por_disco[disco_id] += 1
+        linha = self.pares.setdefault(disco_id, Counter())
+        for outro in discos:
+            linha[outro] += 1
+            self.pares.setdefault(outro, Counter())[disco_id] += 1
+        anteriores = set(discos)
+        discos.add(disco_id)
+        return anteriores
+
+    def _similaridade(self, disco_id, outro):
+        comuns = self.pares[disco_id][outro]
+        return comuns / math.sqrt(self.clientes_por_disco[disco_id] * self.clientes_por_disco[outro])
+
+    def _recalcular(self, disco_id):
+        similares = ((self._similaridade(disco_id, outro), outro) for outro in self.pares.get(disco_id, {}))
+        self.vizinhos[disco_id] = heapq.nlargest(RECOMENDACOES_VIZINHOS, similares)
+
+    def _subir(self, disco_id, similaridade, outro):
+        # Similaridade de `outro` na lista de `disco_id` aumentou (ou ele é novo na lista)
+        lista = [(s, o) for s, o in self.vizinhos.get(disco_id, ()) if o != outro]
+        lista.append((similaridade, outro))
+        lista.sort(reverse=True)
+        self.vizinhos[disco_id] = lista[:RECOMENDACOES_VIZINHOS]
+
+    def registrar(self, cliente_id, disco_id):
+        with self._trava:
+            anteriores = self._registrar(cliente_id, disco_id)
+            if anteriores is None:
+                return
+            clientes = self.clientes_por_disco[disco_id]
+            fator = math.sqrt((clientes - 1) / clientes)
+            self.vizinhos[disco_id] = [(s * fator, o) for s, o in self.vizinhos.get(disco_id, ())]
+            for outro in anteriores:
+                similaridade = self._similaridade(disco_id, outro)
+                self._subir(disco_id, similaridade, outro)
+                self._subir(outro, similaridade, disco_id)
+
+    def recomendar(self, cliente_id, limite=RECOMENDACOES_LIMITE_PADRAO):
+        # [(pontuação, disco)] ainda não alugados pelo cliente, dos mais parecidos com o histórico
+        with self._trava:
+            discos = self.historico.get(cliente_id, set())
+            pontuacao = Counter()
+            for disco in discos:
+                for _, outro in self.vizinhos.get(disco, ()):
+                    if outro not in discos:
+                        pontuacao[outro] += self._similaridade(disco, outro)
+        melhores = heapq.nlargest(limite, pontuacao.items(), key=lambda item: (item[1], -item[0]))
+        return [(round(valor, 4), disco) for disco, valor in melhores]
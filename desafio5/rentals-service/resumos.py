@@ -0,0 +1,80 @@
+"""
+Totais acumulados por cliente (GET /customers/<id>/summary).
+
+`ResumoClientes` mantém, para cada cliente, os totais que antes o gateway
+recalculava baixando o histórico inteiro a cada perfil: aluguéis feitos, ativos
+e devolvidos, gasto em aluguéis, multas pagas, gasto total (aluguel + multa),
+quantos aluguéis por gênero e os ids dos aluguéis ativos.
+
+Os totais são montados a partir de `rentals_db` na subida e depois só
+atualizados em `alugar()` e `devolver()`. `trava` é a mesma usada pelas rotas
+para verificar o limite e registrar o aluguel ou a devolução: a verificação,
+a mudança no aluguel e a dos totais acontecem juntas, e o `active_rentals` do
+cliente sai sempre do total de ativos, sem contagem manual.
+"""
+import threading
+from collections import Counter
+
+
+class ResumoClientes:
+    def __init__(self, clientes, alugueis=()):
+        self.clientes = {cliente['id']: cliente for cliente in clientes}
+        self.resumos = {cliente_id: self._novo() for cliente_id in self.clientes}
+        self.trava = threading.RLock()
+        for aluguel in alugueis:
+            self.alugar(aluguel)
+            if aluguel['status'] == 'returned':
+                self.devolver(aluguel)
+
+    @staticmethod
+    def _novo():
+        return {
+            'total_rentals': 0,
+            'returned_rentals': 0,
+            'rental_spend': 0.0,
+            'late_fees': 0.0,
+            'genres': Counter(),
+            'active': set()
+        }
+
+    def _sincronizar(self, cliente_id):
+        cliente = self.clientes.get(cliente_id)
+        if cliente is not None:
+            cliente['active_rentals'] = len(self.resumos[cliente_id]['active'])
+
+    def ativos(self, cliente_id):
+        return len(self.resumos[cliente_id]['active'])
+
+    def alugar(self, aluguel):
+        with self.trava:
+            resumo = self.resumos.setdefault(aluguel['customer_id'], self._novo())
+            resumo['total_rentals'] += 1
+            resumo['rental_spend'] += aluguel['total_cost']
+            if aluguel.get('record_genre'):
+                resumo['genres'][aluguel['record_genre']] += 1
+            resumo['active'].add(aluguel['id'])
+            self._sincronizar(aluguel['customer_id'])
+
+    def devolver(self, aluguel):
+        # Chamado depois de o aluguel receber status 'returned' e a multa
+        with self.trava:
+            resumo = self.resumos[aluguel['customer_id']]
+            resumo['active'].discard(aluguel['id'])
+            resumo['returned_rentals'] += 1
+            resumo['late_fees'] += aluguel['late_fee']
+            self._sincronizar(aluguel['customer_id'])
+
+    def resumo(self, cliente_id):
+        # Cópia dos totais, para serializar fora da trava
+        with self.trava:
+            resumo = self.resumos[cliente_id]
+            return {
+                'total_rentals': resumo['total_rentals'],
+                'active_count': len(resumo['active']),
+                'returned_count': resumo['returned_rentals'],
+                'rental_spend': round(resumo['rental_spend'], 2),
+                'late_fees': round(resumo['late_fees'], 2),
+                'total_spent': round(resumo['rental_spend'] + resumo['late_fees'], 2),
+                'genres': dict(resumo['genres'].most_common()),
+                'active_rental_ids': sorted(resumo['active'])
+            }